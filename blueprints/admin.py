@@ -6,7 +6,9 @@ from sqlalchemy import or_
 # Modelos
 from models import db, Usuario, Rol, Log, CatalogoCiclo, Caso
 # Utilidades
-from utils import registrar_log, admin_required, enviar_credenciales_nuevo_usuario
+from utils import registrar_log, admin_required, enviar_credenciales_nuevo_usuario, paginar_por_cursor, contar_con_cache, invalidar_sesion_usuario
+from utils.metricas import resumen_metricas, reiniciar_metricas
+from replica import usa_replica
 
 admin_bp = Blueprint('admin', __name__, template_folder='../templates', url_prefix='/admin')
 
@@ -18,6 +20,7 @@ def before_request():
     pass
 
 @admin_bp.route('/panel')
+@usa_replica
 def panel():
     # --- Filtros ---
     page = request.args.get('page', 1, type=int)
@@ -151,6 +154,8 @@ def editar_usuario(id):
                 flash('Contraseña actualizada.', 'info')
 
             db.session.commit()
+            # Rol/ciclos/clave cambiaron: su sesión (y la de quien lo subroga) se recarga en la próxima petición
+            invalidar_sesion_usuario(usuario.id)
             # 🔧 LOG MEJORADO
             nombres_ciclos = ', '.join([c.nombre for c in objetos_ciclos])
             registrar_log("Edición Usuario", f"Admin editó a {usuario.nombre_completo}. Ciclos: {nombres_ciclos}")
@@ -172,22 +177,24 @@ def toggle_activo(id):
         
     usuario.activo = not usuario.activo
     db.session.commit()
+    invalidar_sesion_usuario(usuario.id)
     estado = "activado" if usuario.activo else "desactivado"
     registrar_log("Cambio Estado", f"Usuario {usuario.nombre_completo} fue {estado}.")
     flash(f'Usuario {usuario.nombre_completo} {estado}.', 'success')
     return redirect(url_for('admin.panel'))
 
 @admin_bp.route('/ver_logs')
+@usa_replica
 def ver_logs():
-    # Página actual de la paginación
-    page = request.args.get('page', 1, type=int)
+    # Posición actual (token opaco de la paginación por cursor)
+    cursor = request.args.get('cursor')
 
     # Filtros opcionales enviados por GET
     usuario_filtro = request.args.get('usuario_id')
     accion_filtro = request.args.get('accion')
 
-    # Query base: logs ordenados del más reciente al más antiguo
-    query = Log.query.order_by(Log.timestamp.desc())
+    # Query base (el orden más reciente -> más antiguo lo aplica paginar_por_cursor)
+    query = Log.query
 
     # =========================================================
     # FILTRO POR USUARIO
@@ -205,7 +212,9 @@ def ver_logs():
     # =========================================================
     # PAGINACIÓN
     # =========================================================
-    pagination = query.paginate(page=page, per_page=15, error_out=False)
+    # Keyset sobre (timestamp, id): la página 1.000 cuesta lo mismo que la primera
+    total = contar_con_cache(('logs', usuario_filtro, accion_filtro), query)
+    pagination = paginar_por_cursor(query, Log.timestamp, Log.id, cursor=cursor, per_page=15, total=total)
 
     # Lista de usuarios para poblar el select del filtro
     todos_los_usuarios = Usuario.query.order_by(Usuario.nombre_completo).all()
@@ -240,4 +249,15 @@ def ver_logs():
     return render_template('admin/ver_logs.html', pagination=pagination,
                            todos_los_usuarios=todos_los_usuarios,
                            acciones_posibles=acciones_posibles,
-                           filtros={'usuario_id': usuario_filtro, 'accion': accion_filtro})
\ No newline at end of file
+                           filtros={'usuario_id': usuario_filtro, 'accion': accion_filtro})
+
+@admin_bp.route('/metricas')
+def ver_metricas():
+    """Latencias por endpoint, SQL por petición, fases, plantillas, SMTP y PDF (de este proceso)."""
+    return render_template('admin/metricas.html', metricas=resumen_metricas())
+
+@admin_bp.route('/metricas/reiniciar', methods=['POST'])
+def reiniciar_metricas_panel():
+    reiniciar_metricas()
+    flash('Métricas reiniciadas.', 'success')
+    return redirect(url_for('admin.ver_metricas'))
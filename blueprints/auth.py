@@ -1,13 +1,12 @@
 # blueprints/auth.py
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
-from datetime import datetime, timedelta
-import pytz
+from datetime import timedelta
 import secrets
 import re
 
 from models import db, Usuario
-from utils import registrar_log, enviar_correo_reseteo
+from utils import registrar_log, enviar_correo_reseteo, invalidar_sesion_usuario, obtener_hora_chile
 
 # Definimos el Blueprint
 auth_bp = Blueprint('auth', __name__, template_folder='../templates')
@@ -119,9 +118,12 @@ def cambiar_clave():
         if not es_password_segura(nueva_password):
             flash('Error: La contraseña debe tener 8 caracteres, mayúscula y número.', 'danger')
         else:
-            current_user.set_password(nueva_password)
-            current_user.cambio_clave_requerido = False
+            # current_user es la foto cacheada: escribimos sobre el Usuario ORM
+            usuario = current_user.usuario
+            usuario.set_password(nueva_password)
+            usuario.cambio_clave_requerido = False
             db.session.commit()
+            invalidar_sesion_usuario(usuario.id)
             
             registrar_log("Cambio de Clave", "Usuario actualizó su contraseña obligatoria.")
             logout_user()
@@ -141,9 +143,8 @@ def solicitar_reseteo():
         
         if usuario:
             token = secrets.token_hex(16)
-            cl_tz = pytz.timezone('America/Santiago')
             # Expiración en 1 hora
-            expiracion = datetime.now(cl_tz).replace(tzinfo=None) + timedelta(hours=1)
+            expiracion = obtener_hora_chile().replace(tzinfo=None) + timedelta(hours=1)
             
             usuario.reset_token = token
             usuario.reset_token_expiracion = expiracion
@@ -168,8 +169,7 @@ def resetear_clave(token):
         return redirect(obtener_ruta_redireccion(current_user))
 
     usuario = Usuario.query.filter_by(reset_token=token).first()
-    cl_tz = pytz.timezone('America/Santiago')
-    ahora = datetime.now(cl_tz).replace(tzinfo=None)
+    ahora = obtener_hora_chile().replace(tzinfo=None)
     
     if not usuario or not usuario.reset_token_expiracion or usuario.reset_token_expiracion < ahora:
         flash('El enlace es inválido o ha expirado.', 'danger')
@@ -185,6 +185,7 @@ def resetear_clave(token):
             usuario.reset_token = None
             usuario.reset_token_expiracion = None
             db.session.commit()
+            invalidar_sesion_usuario(usuario.id)
             
             registrar_log("Recuperación Clave", f"Usuario {usuario.email} recuperó su clave exitosamente.")
             flash('Tu contraseña ha sido restablecida. Inicia sesión.', 'success')
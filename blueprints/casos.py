@@ -1,44 +1,28 @@
 import os
 import io
-from datetime import datetime, timedelta, date
-from flask import Blueprint, render_template, abort, request, flash, redirect, url_for, send_file
+import csv
+import tempfile
+from datetime import datetime, date
+from flask import Blueprint, render_template, abort, request, flash, redirect, url_for, send_file, Response, stream_with_context, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import case, or_, func
-from models import db, Caso, Usuario, Rol, AuditoriaCaso, CatalogoEstablecimiento, CatalogoInstitucion, CatalogoRecinto, obtener_hora_chile, CasoGestion
-from utils import check_password_change, registrar_log, enviar_aviso_asignacion, generar_acta_cierre_pdf, enviar_aviso_cierre, enviar_aviso_subrogancia, es_rut_valido, safe_int, enviar_reporte_estadistico_masivo
+from sqlalchemy import case, func
+from sqlalchemy.orm import selectinload
+from models import db, Caso, Usuario, Rol, AuditoriaCaso, CatalogoEstablecimiento, CatalogoRecinto, obtener_hora_chile, CasoGestion, CARGA_BANDEJA, CARGA_EXPORTACION, CARGA_DETALLE
+from utils import check_password_change, registrar_log, enviar_aviso_asignacion, encolar_acta, estado_acta, enviar_aviso_cierre, enviar_aviso_subrogancia, es_rut_valido, clean_rut, rut_excede_largo, safe_int, enviar_reporte_estadistico_masivo, serie_ingresos, kpis, grafico_ingresos, grafico_notificacion, grafico_inscritos, filtro_busqueda, paginar_por_cursor, contar_con_cache, obtener_alcance, invalidar_sesion_usuario, obtener_catalogos, otros_casos_paciente
+from utils.ingreso import clean
+from utils.series import normalizar_ventana, etiqueta, VENTANAS
+from utils.metricas import iniciar_fase
+from utils.cache_http import politica_cache, REVALIDAR
+from replica import lectura_replica, usa_replica
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 
 casos_bp = Blueprint('casos', __name__, template_folder='../templates', url_prefix='/casos')
 
-def clean(value):
-    """Convierte '' / espacios a None (para guardar NULL en BD)."""
-    if value is None:
-        return None
-    v = str(value).strip()
-    return v if v else None
-
-def clean_rut(value):
-    """Normaliza RUT: sin puntos/espacios y con guion (12345678-9)."""
-    v = clean(value)
-    if not v:
-        return None
-    v = v.replace(".", "").replace(" ", "").upper()
-    # Si viene con guion, lo respetamos; si no, lo armamos.
-    if "-" in v:
-        cuerpo, dv = v.split("-", 1)
-    else:
-        if len(v) < 2:
-            return None
-        cuerpo, dv = v[:-1], v[-1]
-    cuerpo = "".join(ch for ch in cuerpo if ch.isdigit())
-    dv = (dv[:1] or "").upper()
-    return f"{cuerpo}-{dv}" if cuerpo and dv else None
-
-def rut_excede_largo(rut_normalizado):
-    """Protege contra Data too long. Formato máximo esperado: 12345678-9 (10 chars)."""
-    return bool(rut_normalizado) and len(rut_normalizado) > 10
+# Prioridad de la bandeja (estado es Enum: el único restante es ANULADO, oculto por defecto)
+ORDEN_ESTADOS = ('PENDIENTE_RESCATAR', 'EN_SEGUIMIENTO', 'CERRADO')
 
 @casos_bp.before_request
 @login_required
@@ -46,22 +30,67 @@ def rut_excede_largo(rut_normalizado):
 def before_request():
     pass
 
-@casos_bp.route('/')
-def index():
+def _alcance_bandeja():
+    """Alcance de la petición: filtros SQL + ciclos permitidos (cacheados por usuario)."""
+    alcance = obtener_alcance()
+    if not alcance.permitido:
+        # Si es Solicitante y trata de entrar a la bandeja, lo pateamos
+        abort(403)
+    return alcance
+
+def _pagina_bandeja(alcance):
     """
-    Bandeja de Entrada + Dashboard Ejecutivo (Fase 3 Refinada).
+    Página de la tabla según request.args (search, estado, cursor).
+    La usan la bandeja completa y /api/tabla (paginar sin recalcular el dashboard).
     """
-    page = request.args.get('page', 1, type=int)
+    iniciar_fase('tabla')
+    cursor = request.args.get('cursor')
     search_query = request.args.get('search', '').strip()
     estado_filter = request.args.get('estado', '').strip()
 
+    tabla_query = Caso.query.filter(*alcance.filtros()) # Hereda filtros de seguridad
+
+    # Filtro Texto
+    if search_query:
+        # Índice de búsqueda: RUT exacto, folio por prefijo o nombres por texto completo
+        tabla_query = tabla_query.filter(filtro_busqueda(search_query))
+
+    # Total (cacheado por alcance + filtros): no se recuenta al avanzar de página
+    # y se descarta cuando cambia un caso de ese alcance
+    conteo_query = tabla_query.filter(Caso.estado == estado_filter) if estado_filter \
+        else tabla_query.filter(Caso.estado != 'ANULADO')
+    with lectura_replica():
+        total = contar_con_cache(('casos', alcance.clave(), search_query, estado_filter), conteo_query,
+                                 etiquetas=alcance.etiquetas())
+
+    # Ordenamiento: Prioridad Estado -> Fecha -> id
+    # Cada estado es un "tramo" que se lee con el índice (estado, fecha_ingreso, id).
+    # Si NO filtran por estado, ocultamos anulados por defecto de la bandeja principal.
+    if estado_filter:
+        tramos = [Caso.estado == estado_filter]
+    else:
+        tramos = [Caso.estado == estado for estado in ORDEN_ESTADOS]
+
+    # CARGA_BANDEJA: ciclo y equipo asignado vienen en el mismo SELECT (sin N+1 por fila)
+    return paginar_por_cursor(
+        tabla_query.options(*CARGA_BANDEJA),
+        Caso.fecha_ingreso, Caso.id,
+        cursor=cursor, per_page=15, tramos=tramos, total=total
+    )
+
+@casos_bp.route('/')
+def index():
+    """
+    Bandeja de Entrada + Dashboard Ejecutivo (Fase 3 Refinada).
+    La página trae la tabla; KPIs y gráficos los pide el navegador a /casos/api/* (ver abajo).
+    """
     rol_nombre = current_user.rol.nombre
     titulo_vista = "Vista Global"
 
     # =========================================================
     # A. FILTROS DE SEGURIDAD (RBAC) + SUBROGANCIA
     # =========================================================
-    filters = []
+    alcance = _alcance_bandeja()
 
     # Datos para UI Subrogancia (solo referentes)
     candidatos_subrogancia = []
@@ -75,35 +104,21 @@ def index():
         titulo_vista = "Vista Global (Coordinador EPI)"
 
     elif rol_nombre in ['Referente', 'Visualizador']:
-        ciclos_permitidos = []
-
         # ✅ FASE 2: Múltiples ciclos propios
-        if current_user.ciclos:
-            ciclos_permitidos.extend([c.id for c in current_user.ciclos])
-            nombres_ciclos = ", ".join([c.nombre for c in current_user.ciclos])
-            titulo_vista = f"Ciclos: {nombres_ciclos}"
+        propios = alcance.ciclos_propios
+        if propios:
+            titulo_vista = f"Ciclos: {', '.join(nombre for _, nombre in propios)}"
         else:
             titulo_vista = "Vista Global (Todos los Ciclos)"
 
-
-        # ✅ FASE 2: Múltiples ciclos subrogados
-        if current_user.subrogante_de and current_user.subrogante_de.ciclos:
-            ciclos_sub = [c.id for c in current_user.subrogante_de.ciclos]
-            for c_id in ciclos_sub:
-                if c_id not in ciclos_permitidos:
-                    ciclos_permitidos.append(c_id)
-
-            # Título más informativo
-            nombres_sub = ", ".join([c.nombre for c in current_user.subrogante_de.ciclos])
-            if current_user.ciclos:
+        # ✅ FASE 2: Múltiples ciclos subrogados (título más informativo)
+        if alcance.ciclos_subrogados:
+            nombres_sub = ", ".join(nombre for _, nombre in alcance.ciclos_subrogados)
+            if propios:
                 titulo_vista = f"Ciclos Propios + Subrogando ({nombres_sub})"
             else:
                 titulo_vista = f"Subrogando ({nombres_sub})"
 
-        # Aplicar filtro por ciclos permitidos si corresponde
-        if ciclos_permitidos:
-            filters.append(Caso.ciclo_vital_id.in_(ciclos_permitidos))
-
         # UI Subrogancia solo para Referentes
         if rol_nombre == 'Referente':
             # a) Lista de candidatos (otros referentes activos, distintos a mí)
@@ -111,7 +126,7 @@ def index():
                 Rol.nombre == 'Referente',
                 Usuario.activo == True,
                 Usuario.id != current_user.id
-            ).order_by(Usuario.nombre_completo).all()
+            ).options(selectinload(Usuario.ciclos)).order_by(Usuario.nombre_completo).all()
 
             # b) Subrogante activo (quién me está subrogando a mí)
             # OJO: subrogantes_activos es dynamic (AppenderQuery), así que usamos first()
@@ -124,255 +139,81 @@ def index():
                     subrogante_activo = current_user.subrogantes_activos[0] if current_user.subrogantes_activos else None
 
     elif rol_nombre == 'Trabajador(a) Social':
-        # NUEVO: Filtra por la columna nueva de TS o por la legacy (mientras dure la migración)
-        filters.append(or_(
-            Caso.asignado_ts_id == current_user.id,
-            Caso.asignado_a_usuario_id == current_user.id
-        ))
         titulo_vista = "Mis Casos Asignados (Gestión)"
 
     elif rol_nombre == 'Coordinador Ciclo':
-        # NUEVO: Filtra por la columna nueva de Coordinador
-        filters.append(Caso.asignado_coord_id == current_user.id)
         titulo_vista = "Mis Casos Supervisados"
 
-    else:
-        # Si es Solicitante y trata de entrar a la bandeja, lo pateamos
-        abort(403)
-
-    # Query Base (Solo Seguridad)
-    base_query = Caso.query.filter(*filters)
-
-    # =========================================================
-    # B. DASHBOARD DATA (KPIs + GRÁFICOS)
-    # Ignoran filtros de búsqueda/estado, muestran la "realidad total" del usuario
-    # =========================================================
-    
-    # 1. KPIs Generales (Excluyendo Anulados)
-    stats_query = db.session.query(
-        func.count(Caso.id).label('total'),
-        func.sum(case((Caso.estado == 'PENDIENTE_RESCATAR', 1), else_=0)).label('pendientes'),
-        func.sum(case((Caso.estado == 'EN_SEGUIMIENTO', 1), else_=0)).label('seguimiento'),
-        func.sum(case((Caso.estado == 'CERRADO', 1), else_=0)).label('cerrados')
-    ).filter(*filters, Caso.estado != 'ANULADO')  # Excluir anulados del conteo general
-    
-    stats_result = stats_query.first()
-    
-    total = stats_result.total or 0
-    pendientes = int(stats_result.pendientes or 0)
-    seguimiento = int(stats_result.seguimiento or 0)
-    cerrados = int(stats_result.cerrados or 0)
-
-    # Calculamos porcentajes para la vista (evitar división por cero)
-    pct_pendientes = round((pendientes / total * 100), 1) if total > 0 else 0
-    pct_seguimiento = round((seguimiento / total * 100), 1) if total > 0 else 0
-    pct_cerrados = round((cerrados / total * 100), 1) if total > 0 else 0
-
-    # 2. Datos Semanales (Gráfico de Barras)
-    # Obtenemos los últimos 7 días
-    hoy = obtener_hora_chile().date()
-    fecha_inicio = hoy - timedelta(days=6) # 7 días contando hoy
-    
-    # Query agrupada por fecha (versión compatible universalmente: traemos datos y procesamos en python)
-    # Filtramos por fecha >= inicio Y filtros de seguridad
-    weekly_raw = db.session.query(Caso.fecha_ingreso).filter(
-        Caso.fecha_ingreso >= fecha_inicio,
-        Caso.estado != 'ANULADO',  # Excluir anulados del gráfico semanal
-        *filters
-    ).all()
-
-    # Procesamiento en Python para llenar días vacíos con 0
-    weekly_map = {}
-    # Inicializar diccionario con los últimos 7 días en 0
-    for i in range(7):
-        d = fecha_inicio + timedelta(days=i)
-        # Guardamos como string 'YYYY-MM-DD' para comparar
-        weekly_map[d.strftime('%Y-%m-%d')] = 0
-
-    # Llenar con datos reales
-    for row in weekly_raw:
-        # Ajuste simple: si la fecha coincide (ignorando hora), sumamos
-        # Nota: fecha_ingreso en DB es DateTime. 
-        if row.fecha_ingreso:
-            d_key = row.fecha_ingreso.date().strftime('%Y-%m-%d')
-            if d_key in weekly_map:
-                weekly_map[d_key] += 1
-
-    # Preparar listas ordenadas para Chart.js
-    nombres_dias = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
-    bar_labels = []
-    bar_data = []
-
-    for i in range(7):
-        d = fecha_inicio + timedelta(days=i)
-        d_str = d.strftime('%Y-%m-%d')
-        weekday_name = nombres_dias[d.weekday()] # 0=Lun, 6=Dom
-        
-        bar_labels.append(weekday_name) # Ej: "Lun"
-        bar_data.append(weekly_map[d_str])
-
-    # 3. Recintos de Notificación (Doughnut) - Agrupar por nombre de recinto
-    notif_query = db.session.query(
-        CatalogoRecinto.nombre,
-        func.count(Caso.id).label('count')
-    ).join(Caso.recinto_notifica)\
-     .filter(*filters, Caso.estado != 'ANULADO')\
-     .group_by(CatalogoRecinto.nombre)\
-     .order_by(func.count(Caso.id).desc()).all()
-
-    notif_labels = []
-    notif_values = []
-    notif_total = 0
-    notif_data_full = [] # Para la leyenda HTML
-
-    # Calcular total para porcentajes
-    temp_total_notif = sum(row.count for row in notif_query)
-
-    # Definir colores fijos para la leyenda (ciclo de 4 colores)
-    colors = ['#3B82F6', '#FBBF24', '#22C55E', '#A855F7', '#EC4899', '#6B7280'] # Azul, Amarillo, Verde, Morado, Rosa, Gris
-
-    for idx, row in enumerate(notif_query):
-        pct = round((row.count / temp_total_notif * 100), 1) if temp_total_notif > 0 else 0
-        notif_labels.append(row.nombre)
-        notif_values.append(row.count)
-        
-        # Guardamos estructura completa para renderizar leyenda en HTML con Jinja
-        notif_data_full.append({
-            'nombre': row.nombre,
-            'count': row.count,
-            'pct': pct,
-            'color': colors[idx % len(colors)] # Asignar color cíclico
-        })
-    
-    notif_total = temp_total_notif
-
-    # 4. Recintos Inscritos (Barras Horizontales - Top 5)
-    inscritos_query = db.session.query(
-        CatalogoEstablecimiento.nombre,
-        func.count(Caso.id).label('count')
-    ).join(Caso.recinto_inscrito)\
-     .filter(*filters, Caso.estado != 'ANULADO')\
-     .group_by(CatalogoEstablecimiento.nombre)\
-     .order_by(func.count(Caso.id).desc())\
-     .limit(5).all()
-
-    inscritos_labels = [row.nombre for row in inscritos_query]
-    inscritos_values = [row.count for row in inscritos_query]
-
-    # Empaquetamos todo
-    dashboard_data = {
-        'total': total,
-        'pendientes': pendientes,
-        'seguimiento': seguimiento,
-        'cerrados': cerrados,
-        'pct_pendientes': pct_pendientes,
-        'pct_seguimiento': pct_seguimiento,
-        'pct_cerrados': pct_cerrados,
-
-        'bar_labels': bar_labels,
-        'bar_data': bar_data,
-
-        # Datos Recintos Notificación
-        'notif_labels': notif_labels,
-        'notif_values': notif_values,
-        'notif_total': notif_total,
-        'notif_data_full': notif_data_full, # Lista rica para leyenda HTML
-        
-        # Datos Recintos Inscritos
-        'inscritos_labels': inscritos_labels,
-        'inscritos_values': inscritos_values
-    }
-
     # =========================================================
+    # B. DASHBOARD: se carga aparte desde la API (cacheado por alcance)
     # C. TABLA (CON BÚSQUEDA Y FILTROS)
     # =========================================================
-    tabla_query = base_query # Hereda filtros de seguridad
-
-    # Filtro Texto
-    if search_query:
-        search_clean = search_query.replace('.', '')
-        search_pattern = f"%{search_clean}%"
-        tabla_query = tabla_query.filter(or_(
-            Caso.folio_atencion.ilike(search_pattern),
-            Caso.origen_nombres.ilike(search_pattern),
-            Caso.origen_apellidos.ilike(search_pattern),
-            Caso.paciente_doc_numero.ilike(search_pattern),
-            Caso.origen_rut.ilike(search_pattern),
-            Caso.acompanante_nombre.ilike(search_pattern)
-        ))
-
-    # Filtro Estado
-    # Si NO filtran por estado, ocultamos anulados por defecto de la bandeja principal.
-    if estado_filter:
-        tabla_query = tabla_query.filter(Caso.estado == estado_filter)
-    else:
-        tabla_query = tabla_query.filter(Caso.estado != 'ANULADO')
-
-    # Ordenamiento
-    orden_estado = case(
-        (Caso.estado == 'PENDIENTE_RESCATAR', 0),
-        (Caso.estado == 'EN_SEGUIMIENTO', 1),
-        (Caso.estado == 'CERRADO', 2),
-        else_=3
-    )
-
-    pagination = tabla_query.order_by(
-        orden_estado, 
-        Caso.fecha_ingreso.desc()
-    ).paginate(page=page, per_page=15, error_out=False)
+    ventana, _ = normalizar_ventana(request.args.get('ventana'))
+    pagination = _pagina_bandeja(alcance)
 
     return render_template(
         'casos/index.html',
         pagination=pagination,
         nombre_filtro=titulo_vista,
-        stats=dashboard_data,
+        ventana=ventana,
+        ventanas=VENTANAS,
         candidatos_subrogancia=candidatos_subrogancia,
         subrogante_activo=subrogante_activo
     )
 
+# =========================================================
+# API DEL DASHBOARD (JSON): cada parte de la bandeja por separado
+# KPIs y gráficos son agregados (sin datos de pacientes): ETag/304 y caché por alcance.
+# Ignoran filtros de búsqueda/estado: muestran la "realidad total" del usuario.
+# =========================================================
+
+@casos_bp.route('/api/kpis')
+@usa_replica
+@politica_cache(REVALIDAR)
+def api_kpis():
+    return jsonify(kpis(_alcance_bandeja()))
+
+@casos_bp.route('/api/grafico/ingresos')
+@usa_replica
+@politica_cache(REVALIDAR)
+def api_grafico_ingresos():
+    # Ventana del gráfico de ingresos (7/30/90/365 días; por día, semana o mes)
+    ventana, granularidad = normalizar_ventana(request.args.get('ventana'))
+    return jsonify(grafico_ingresos(_alcance_bandeja(), ventana, granularidad))
+
+@casos_bp.route('/api/grafico/notificacion')
+@usa_replica
+@politica_cache(REVALIDAR)
+def api_grafico_notificacion():
+    return jsonify(grafico_notificacion(_alcance_bandeja()))
+
+@casos_bp.route('/api/grafico/inscritos')
+@usa_replica
+@politica_cache(REVALIDAR)
+def api_grafico_inscritos():
+    return jsonify(grafico_inscritos(_alcance_bandeja()))
+
+@casos_bp.route('/api/tabla')
+def api_tabla():
+    """Página de la tabla (filas + paginación ya renderizadas). Datos de pacientes: no-store."""
+    pagination = _pagina_bandeja(_alcance_bandeja())
+    return jsonify({
+        'html': render_template('casos/_tabla.html', pagination=pagination),
+        'total': pagination.total,
+    })
+
 @casos_bp.route('/ver/<int:id>', methods=['GET', 'POST'])
 @login_required
 def ver_caso(id):
-    caso = Caso.query.get_or_404(id)
+    caso = Caso.query.options(*CARGA_DETALLE).get_or_404(id)
     rol_nombre = current_user.rol.nombre
 
     # =========================================================
     # 1. SEGURIDAD DE ACCESO (Permisos)
     # =========================================================
-    permitido = False
-
-    # Roles globales
-    if rol_nombre in ['Admin', 'Torre Control']:
-        permitido = True
-
-    # Referente / Visualizador (por ciclo o subrogancia)
-    elif rol_nombre in ['Referente', 'Visualizador']:
-        # ✅ FASE 2: Comprobar acceso en lista M:N
-        acceso_propio = (
-            not current_user.ciclos or 
-            caso.ciclo_vital_id in [c.id for c in current_user.ciclos]
-        )
-
-        acceso_subrogado = False
-        if current_user.subrogante_de and current_user.subrogante_de.ciclos:
-            acceso_subrogado = caso.ciclo_vital_id in [c.id for c in current_user.subrogante_de.ciclos]
-
-        permitido = acceso_propio or acceso_subrogado
-
-    # Trabajador(a) Social
-    elif rol_nombre == 'Trabajador(a) Social':
-        if (
-            caso.asignado_ts_id == current_user.id or
-            caso.asignado_a_usuario_id == current_user.id  # legacy
-        ):
-            permitido = True
-
-    # Coordinador de Ciclo
-    elif rol_nombre == 'Coordinador Ciclo':
-        if caso.asignado_coord_id == current_user.id:
-            permitido = True
-
-    if not permitido:
+    # Misma regla que la bandeja (ciclo / subrogancia / asignación), sin consultas extra.
+    # Coordinador EPI ve la bandeja completa pero no la ficha.
+    if not obtener_alcance().puede_abrir(caso):
         abort(403)
 
     # =========================================================
@@ -546,30 +387,33 @@ def ver_caso(id):
                 )
 
                 # =================================================
-                # 4. ENVÍO DE CORREOS (BEST EFFORT)
+                # 4. ENVÍO DE CORREOS (COLA EN SEGUNDO PLANO)
+                # La auditoría queda EN_COLA y el worker la actualiza a OK / ERROR_ENVIO
                 # =================================================
                 for usuario in correos_pendientes:
                     try:
-                        ok = enviar_aviso_asignacion(usuario, caso, current_user)
-
-                        estado = 'OK' if ok else 'ERROR_ENVIO'
-
-                        db.session.add(AuditoriaCaso(
+                        auditoria_email = AuditoriaCaso(
                             caso_id=caso.id,
                             usuario_id=current_user.id,
                             fecha_movimiento=obtener_hora_chile(),
                             accion='EMAIL_ASIGNACION',
                             detalles_cambio={
                                 'destino': usuario.email,
-                                'status': estado,
+                                'status': 'EN_COLA',
                                 'rol_notificado': usuario.rol.nombre
                             }
-                        ))
+                        )
+                        db.session.add(auditoria_email)
+                        db.session.flush()
+
+                        ok = enviar_aviso_asignacion(usuario, caso, current_user, auditoria_id=auditoria_email.id)
 
                         if not ok:
+                            auditoria_email.detalles_cambio = dict(auditoria_email.detalles_cambio, status='ERROR_ENVIO')
                             flash(f'Caso asignado, pero no se pudo notificar a {usuario.nombre_completo}.', 'warning')
 
                     except Exception as e_mail:
+                        db.session.rollback()
                         registrar_log("Error Email", str(e_mail))
 
                         # Auditoría del fallo técnico
@@ -595,12 +439,21 @@ def ver_caso(id):
             print(f"Error asignación dual: {e}")
             flash('Error al procesar la asignación.', 'danger')
 
+    # Otros casos del paciente: solo los del alcance del usuario; del resto, apenas la cantidad
+    alcance = obtener_alcance()
+    otros_casos, otros_fuera_alcance = otros_casos_paciente(caso, alcance.filtros())
+
     return render_template(
         'casos/ver.html',
         caso=caso,
         funcionarios_ts=funcionarios_ts,
         funcionarios_coord=funcionarios_coord,
-        puede_asignar=puede_asignar
+        puede_asignar=puede_asignar,
+        trabajo_acta=estado_acta(caso.id) if caso.estado == 'CERRADO' else None,
+        otros_casos=otros_casos,
+        otros_fuera_alcance=otros_fuera_alcance,
+        alcance=alcance,
+        catalogos=obtener_catalogos()
     )
 
 # --- NUEVA RUTA: GESTIÓN CLÍNICA (FASE 4 P2) ---
@@ -640,9 +493,10 @@ def gestionar_caso(id):
         flash('No tienes permisos para gestionar este caso.', 'danger')
         return redirect(url_for('casos.ver_caso', id=caso.id))
 
-    # Cargar catálogos necesarios para el formulario de gestión
-    establecimientos = CatalogoEstablecimiento.query.filter_by(activo=True).order_by(CatalogoEstablecimiento.nombre).all()
-    instituciones = CatalogoInstitucion.query.filter_by(activo=True).order_by(CatalogoInstitucion.nombre).all()  # Para denuncia
+    # Cargar catálogos necesarios para el formulario de gestión (desde memoria)
+    catalogos = obtener_catalogos()
+    establecimientos = catalogos.establecimientos.activos
+    instituciones = catalogos.instituciones.activos  # Para denuncia
 
     if request.method == 'POST':
         try:
@@ -726,10 +580,8 @@ def gestionar_caso(id):
                     # "Otro" depende del valor FINAL que quedó guardado (no del raw)
                     caso.denuncia_institucion_otro = None
                     inst_final = caso.denuncia_institucion_id
-                    if inst_final:
-                        inst_obj = CatalogoInstitucion.query.get(inst_final)
-                        if inst_obj and 'otro' in inst_obj.nombre.lower():
-                            caso.denuncia_institucion_otro = clean(request.form.get('institucion_otro'))
+                    if catalogos.instituciones.es_otro(inst_final):
+                        caso.denuncia_institucion_otro = clean(request.form.get('institucion_otro'))
 
                     # Profesional (solo actualiza si viene algo en el POST)
                     nombre_prof = clean(request.form.get('denuncia_nombre'))
@@ -824,8 +676,7 @@ def gestionar_caso(id):
             # Lógica "Otro Recinto Inscrito"
             caso.recinto_inscrito_otro_texto = None # Reset por defecto
             if recinto_inscrito_id_int:
-                est_obj = CatalogoEstablecimiento.query.get(recinto_inscrito_id_int)
-                if est_obj and 'otro' in est_obj.nombre.lower():
+                if catalogos.establecimientos.es_otro(recinto_inscrito_id_int):
                     texto_otro = request.form.get('recinto_inscrito_otro')
                     if texto_otro and texto_otro.strip():
                         caso.recinto_inscrito_otro_texto = texto_otro.strip()
@@ -938,34 +789,16 @@ def cerrar_caso(id):
         db.session.add(audit)
         db.session.commit() # Guardamos para que la fecha_cierre esté firme en DB
 
-        # 3. Generar PDF de Acta (Path Estable y Multiplataforma)
-        filename = f"acta_{caso.id}_{caso.folio_atencion}.pdf"
-        
-        # Calculamos la raíz del proyecto subiendo un nivel desde 'blueprints/'
-        # Esto funciona en Windows y Linux/cPanel por igual
-        BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-        uploads_actas_dir = os.path.join(BASE_DIR, 'uploads', 'actas')
-        
-        # Ruta absoluta completa para guardar el archivo
-        output_path_abs = os.path.join(uploads_actas_dir, filename)
-
-        # Ruta relativa para guardar en BD (portable)
-        output_path_rel = f"uploads/actas/{filename}"
-
-        # Generar el PDF
-        generar_acta_cierre_pdf(caso, output_path_abs, current_user)
-
-        # 4. Guardar ruta relativa en BD
-        caso.acta_pdf_path = output_path_rel
-        db.session.commit()
+        # 3. Encolar el Acta (PDF) en segundo plano: la ficha muestra "generando…" hasta que esté lista
+        encolar_acta(caso, current_user.id)
 
-        # 5. Enviar Correo (Best Effort)
+        # 4. Enviar Correo (Best Effort)
         try:
             enviar_aviso_cierre(caso, current_user)
-            flash('Caso cerrado exitosamente. Acta generada y notificaciones enviadas.', 'success')
+            flash('Caso cerrado exitosamente. El acta se está generando y las notificaciones están en cola de envío.', 'success')
         except Exception as e_mail:
             print(f"Error enviando correo cierre: {e_mail}")
-            flash('Caso cerrado y acta generada, pero falló el envío del correo.', 'warning')
+            flash('Caso cerrado, pero falló el envío del correo. El acta se está generando.', 'warning')
 
         registrar_log("Cierre Caso", f"Caso #{caso.folio_atencion} cerrado por {current_user.nombre_completo}")
 
@@ -976,6 +809,37 @@ def cerrar_caso(id):
 
     return redirect(url_for('casos.ver_caso', id=caso.id))
 
+# --- RUTA REINTENTAR ACTA (si la generación en segundo plano falló) ---
+@casos_bp.route('/reintentar_acta/<int:id>', methods=['POST'])
+@login_required
+def reintentar_acta(id):
+    caso = Caso.query.get_or_404(id)
+    rol_nombre = current_user.rol.nombre
+
+    # Mismos permisos que el cierre (Admin, Torre Control o TS asignado)
+    puede_cerrar = rol_nombre in ['Admin', 'Torre Control'] or (
+        rol_nombre == 'Trabajador(a) Social' and
+        current_user.id in (caso.asignado_ts_id, caso.asignado_a_usuario_id)
+    )
+    if not puede_cerrar:
+        flash('No tienes permisos para regenerar el acta de este caso.', 'danger')
+        return redirect(url_for('casos.ver_caso', id=caso.id))
+
+    if caso.estado != 'CERRADO':
+        flash('Solo los casos cerrados tienen acta.', 'warning')
+        return redirect(url_for('casos.ver_caso', id=caso.id))
+
+    try:
+        encolar_acta(caso)
+        registrar_log("Reintento Acta", f"Caso #{caso.folio_atencion} por {current_user.email}")
+        flash('Se reintentará la generación del acta en segundo plano.', 'info')
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error reintentando acta: {e}")
+        flash('No fue posible reintentar la generación del acta.', 'danger')
+
+    return redirect(url_for('casos.ver_caso', id=caso.id))
+
 # --- NUEVA RUTA: ANULAR CASO ---
 @casos_bp.route('/anular/<int:id>', methods=['POST'])
 @login_required
@@ -1038,6 +902,30 @@ def anular_caso(id):
 
     return redirect(url_for('casos.index'))
 
+def _puede_descargar_acta(caso):
+    # Regla de la bandeja + la TS que cerró el caso (aunque ya no esté asignada)
+    return obtener_alcance().puede_ver(caso) or (
+        current_user.rol.nombre == 'Trabajador(a) Social' and caso.usuario_cierre_id == current_user.id
+    )
+
+# --- ESTADO DEL ACTA (la ficha lo consulta mientras se genera) ---
+@casos_bp.route('/<int:id>/acta/estado', methods=['GET'])
+@login_required
+def estado_acta_caso(id):
+    """JSON con el estado del último trabajo de acta; 'lista' indica que ya se puede descargar."""
+    caso = Caso.query.get_or_404(id)
+    if not _puede_descargar_acta(caso):
+        abort(403)
+
+    trabajo = estado_acta(caso.id)
+    lista = bool(caso.acta_pdf_path)
+    return jsonify({
+        'estado': trabajo.estado if trabajo else None,
+        'en_proceso': bool(trabajo and trabajo.en_proceso),
+        'lista': lista,
+        'url': url_for('casos.descargar_acta', id=caso.id) if lista else None,
+    })
+
 # --- RUTA DESCARGA SEGURA DE ACTA (PRODUCCIÓN) ---
 @casos_bp.route('/acta/<int:id>', methods=['GET'])
 @login_required
@@ -1050,50 +938,11 @@ def descargar_acta(id):
     - Auditoría de descarga
     """
     caso = Caso.query.get_or_404(id)
-    rol_nombre = current_user.rol.nombre
 
     # =========================================================
     # 1. VALIDACIÓN DE PERMISOS
     # =========================================================
-    permitido = False
-
-    # --- Roles Globales ---
-    if rol_nombre in ['Admin', 'Torre Control', 'Coordinador EPI']:
-        permitido = True
-
-    # --- Referente / Visualizador (por ciclo + subrogancia) ---
-    elif rol_nombre in ['Referente', 'Visualizador']:
-        # ✅ FASE 2: Comprobar acceso en lista M:N
-        acceso_propio = (
-            not current_user.ciclos or
-            caso.ciclo_vital_id in [c.id for c in current_user.ciclos]
-        )
-
-        acceso_subrogado = False
-        if current_user.subrogante_de and current_user.subrogante_de.ciclos:
-            if caso.ciclo_vital_id in [c.id for c in current_user.subrogante_de.ciclos]:
-                acceso_subrogado = True
-
-        if acceso_propio or acceso_subrogado:
-            permitido = True
-
-    # --- Trabajador(a) Social ---
-    elif rol_nombre == 'Trabajador(a) Social':
-        es_asignado = (
-            caso.asignado_ts_id == current_user.id or
-            caso.asignado_a_usuario_id == current_user.id  # legacy
-        )
-        es_quien_cerro = (caso.usuario_cierre_id == current_user.id)
-
-        if es_asignado or es_quien_cerro:
-            permitido = True
-
-    # --- Coordinador de Ciclo ---
-    elif rol_nombre == 'Coordinador Ciclo':
-        if caso.asignado_coord_id == current_user.id:
-            permitido = True
-
-    if not permitido:
+    if not _puede_descargar_acta(caso):
         flash("No tienes permisos para descargar este documento.", "danger")
         return redirect(url_for('casos.index'))
 
@@ -1101,7 +950,13 @@ def descargar_acta(id):
     # 2. VALIDAR EXISTENCIA DE ACTA EN BD
     # =========================================================
     if not caso.acta_pdf_path:
-        flash('El caso no tiene un acta generada.', 'warning')
+        trabajo = estado_acta(caso.id)
+        if trabajo and trabajo.en_proceso:
+            flash('El acta se está generando. Intente nuevamente en unos segundos.', 'info')
+        elif trabajo and trabajo.estado == 'ERROR':
+            flash('La generación del acta falló. Puede reintentarla desde la ficha del caso.', 'warning')
+        else:
+            flash('El caso no tiene un acta generada.', 'warning')
         return redirect(url_for('casos.ver_caso', id=caso.id))
 
     try:
@@ -1167,75 +1022,109 @@ def descargar_acta(id):
         flash('Error interno al intentar descargar el archivo.', 'danger')
         return redirect(url_for('casos.ver_caso', id=caso.id))
     
+# --- EXPORTACIÓN: columnas y fila compartidas por Excel y CSV ---
+# Indices: Fec, Fol, Est, Tip, Num, Pac, Eda, Cic, Not, Ins, TS,  Coo, Cie
+COLUMNAS_EXPORTACION = [
+    "Fecha Ingreso",
+    "Folio",
+    "Estado",
+    "Tipo Doc",
+    "Num Documento",
+    "Paciente",
+    "Edad (Ref)",
+    "Ciclo Vital",
+    "Recinto Notifica",
+    "Recinto Inscrito",
+    "Trabajador Social",
+    "Coordinador Ciclo",
+    "Fecha Cierre"
+]
+ANCHOS_EXPORTACION = [18, 10, 15, 8, 12, 30, 8, 15, 25, 25, 25, 25, 18]
+
+# Casos leídos por lote desde la BD al exportar
+LOTE_EXPORTACION = 500
+
+def _fila_exportacion(caso, hoy):
+    """Convierte un caso en la fila del reporte (evita errores con None)."""
+    fecha_ingreso = caso.fecha_ingreso.strftime('%d-%m-%Y %H:%M') if caso.fecha_ingreso else ""
+    fecha_cierre = caso.fecha_cierre.strftime('%d-%m-%Y %H:%M') if caso.fecha_cierre else ""
+
+    # Nombre completo paciente
+    nombres = caso.origen_nombres or ""
+    apellidos = caso.origen_apellidos or ""
+    paciente_full = f"{nombres} {apellidos}".strip()
+
+    # Documento
+    doc_tipo = caso.paciente_doc_tipo or "RUT"
+    doc_num = caso.paciente_doc_numero or caso.origen_rut or "S/I"
+
+    # --- Lógica Dual ---
+    # 1. Trabajador Social (Prioriza columna nueva, fallback a legacy)
+    nombre_ts = "Sin Asignar"
+    if caso.asignado_ts:
+        nombre_ts = caso.asignado_ts.nombre_completo
+    elif caso.asignado_a:
+        nombre_ts = caso.asignado_a.nombre_completo
+
+    # 2. Coordinador
+    nombre_coord = caso.asignado_coord.nombre_completo if caso.asignado_coord else "Sin Asignar"
+
+    # Recintos
+    recinto_notifica = caso.recinto_notifica.nombre if caso.recinto_notifica else "Desconocido"
+    recinto_inscrito = caso.recinto_inscrito.nombre if caso.recinto_inscrito else "No Registrado"
+    if caso.recinto_inscrito_otro_texto:
+        recinto_inscrito += f" ({caso.recinto_inscrito_otro_texto})"
+
+    # Edad referencial (calculo simple si hay fecha nac)
+    edad_str = ""
+    if caso.paciente_fecha_nacimiento:
+        nac = caso.paciente_fecha_nacimiento
+        edad = hoy.year - nac.year - ((hoy.month, hoy.day) < (nac.month, nac.day))
+        edad_str = f"{edad} años"
+
+    return [
+        fecha_ingreso,
+        caso.folio_atencion,
+        caso.estado,
+        doc_tipo,
+        doc_num,
+        paciente_full,
+        edad_str,
+        caso.ciclo_vital.nombre,
+        recinto_notifica,
+        recinto_inscrito,
+        nombre_ts,      # Columna TS
+        nombre_coord,   # Columna Coord
+        fecha_cierre
+    ]
+
 # --- NUEVA RUTA: EXPORTAR EXCEL ---
 @casos_bp.route('/exportar')
 @login_required
+@usa_replica
 def exportar_excel():
     """
     Genera y descarga un reporte Excel (.xlsx) de los casos filtrados.
+    Con ?formato=csv entrega el mismo reporte en CSV (streaming, sin estilos).
     Adaptado para asignación dual y nuevos roles (Fase 6).
     """
     # 1. Recuperar filtros de la URL (igual que en index)
     search_query = request.args.get('search', '').strip()
     estado_filter = request.args.get('estado', '').strip()
 
-    rol_nombre = current_user.rol.nombre
-    
-    # 2. Construir Filtros de Seguridad (Base Query)
-    filters = []
-
-    # A) Acceso Global
-    if rol_nombre in ['Admin', 'Torre Control', 'Coordinador EPI']:
-        pass 
-        
-    # B) Acceso por Ciclo (Referente / Visualizador)
-    elif rol_nombre in ['Referente', 'Visualizador']:
-        ciclos_permitidos = []
-
-        # ✅ FASE 2: Múltiples ciclos en exportación
-        if current_user.ciclos:
-            ciclos_permitidos.extend([c.id for c in current_user.ciclos])
-
-        if current_user.subrogante_de and current_user.subrogante_de.ciclos:
-            ciclos_sub = [c.id for c in current_user.subrogante_de.ciclos]
-            for c_id in ciclos_sub:
-                if c_id not in ciclos_permitidos:
-                    ciclos_permitidos.append(c_id)
-
-        if ciclos_permitidos:
-            filters.append(Caso.ciclo_vital_id.in_(ciclos_permitidos))
-        else:
-            pass # Si no tiene ciclo, asume global o vacío según regla de negocio
-            
-    # C) Acceso TS (Gestor) - Migración Segura
-    elif rol_nombre == 'Trabajador(a) Social':
-        filters.append(or_(
-            Caso.asignado_ts_id == current_user.id,
-            Caso.asignado_a_usuario_id == current_user.id
-        ))
-        
-    # D) Acceso Coordinador Ciclo
-    elif rol_nombre == 'Coordinador Ciclo':
-        filters.append(Caso.asignado_coord_id == current_user.id)
-        
-    else:
+    # 2. Filtros de Seguridad (Base Query): mismo alcance que la bandeja
+    alcance = obtener_alcance()
+    if not alcance.permitido:
         abort(403)
+    filters = alcance.filtros()
 
     # Iniciar query segura
     query = Caso.query.filter(*filters)
 
     # 3. Aplicar Filtros de Usuario (Búsqueda y Estado)
     if search_query:
-        search_clean = search_query.replace('.', '')
-        search_pattern = f"%{search_clean}%"
-        query = query.filter(or_(
-            Caso.folio_atencion.ilike(search_pattern),
-            Caso.origen_nombres.ilike(search_pattern),
-            Caso.origen_apellidos.ilike(search_pattern),
-            Caso.paciente_doc_numero.ilike(search_pattern),
-            Caso.origen_rut.ilike(search_pattern),
-            Caso.acompanante_nombre.ilike(search_pattern)
-        ))
+        # Índice de búsqueda: RUT exacto, folio por prefijo o nombres por texto completo
+        query = query.filter(filtro_busqueda(search_query))
 
     if estado_filter:
         query = query.filter(Caso.estado == estado_filter)
@@ -1243,139 +1132,96 @@ def exportar_excel():
         # Por defecto exportamos solo casos activos, alineado con la bandeja.
         query = query.filter(Caso.estado != 'ANULADO')
 
-    # 4. Obtener TODOS los resultados (Sin paginación)
+    # 4. Obtener resultados en streaming (Sin paginación)
     # Ordenamos igual que la vista: Prioridad Estado -> Fecha
+    # yield_per trae los casos por lotes (cursor de servidor en MySQL): la memoria no crece con el total.
     orden_estado = case(
         (Caso.estado == 'PENDIENTE_RESCATAR', 0),
         (Caso.estado == 'EN_SEGUIMIENTO', 1),
         (Caso.estado == 'CERRADO', 2),
         else_=3
     )
-    casos = query.order_by(orden_estado, Caso.fecha_ingreso.desc()).all()
-
-    # 5. Generar Excel con openpyxl
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Reporte de Casos"
-
-    # Definir Encabezados (Actualizado para Dual)
-    headers = [
-        "Fecha Ingreso", 
-        "Folio", 
-        "Estado", 
-        "Tipo Doc", 
-        "Num Documento", 
-        "Paciente", 
-        "Edad (Ref)",
-        "Ciclo Vital", 
-        "Recinto Notifica", 
-        "Recinto Inscrito",
-        "Trabajador Social",   # Nueva Columna
-        "Coordinador Ciclo",   # Nueva Columna
-        "Fecha Cierre"
-    ]
+    casos = query.options(*CARGA_EXPORTACION) \
+        .order_by(orden_estado, Caso.fecha_ingreso.desc()) \
+        .yield_per(LOTE_EXPORTACION)
+
+    ahora = obtener_hora_chile()
+    hoy = ahora.date()
+    marca = ahora.strftime('%Y%m%d_%H%M')
+
+    # 5A. Variante CSV: se envía a medida que se leen los lotes (sin estilos)
+    if request.args.get('formato') == 'csv':
+        def generar_csv():
+            buffer = io.StringIO()
+            # ';' como separador y BOM UTF-8: así lo abre directo Excel con configuración regional es-CL
+            writer = csv.writer(buffer, delimiter=';')
+            buffer.write('\ufeff')
+            writer.writerow(COLUMNAS_EXPORTACION)
+
+            # El generador corre después de que la vista retorna (con otra sesión en db.session):
+            # la lectura en réplica se declara aquí, sobre la sesión de la query
+            with lectura_replica(casos.session):
+                for i, caso in enumerate(casos):
+                    if i % LOTE_EXPORTACION == 0:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate(0)
+                    writer.writerow(_fila_exportacion(caso, hoy))
+
+            yield buffer.getvalue()
+
+        return Response(
+            stream_with_context(generar_csv()),
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename="Reporte_Casos_{marca}.csv"'}
+        )
+
+    # 5B. Excel en modo write_only: cada fila se escribe a disco y se descarta
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Reporte de Casos")
+
+    # En write_only el formato de hoja se define ANTES de escribir filas
+    ws.freeze_panes = "A2"
+    for i, width in enumerate(ANCHOS_EXPORTACION, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
 
     # Estilo para Encabezados (Negrita, Fondo Azul Oscuro, Letra Blanca)
     header_font = Font(bold=True, color="FFFFFF")
     header_fill = PatternFill(start_color="1F2937", end_color="1F2937", fill_type="solid") # Gris oscuro tipo Tailwind gray-800
     alignment_center = Alignment(horizontal="center", vertical="center")
 
-    # Escribir Encabezados
-    ws.append(headers)
-    for col_num, cell in enumerate(ws[1], 1):
+    encabezados = []
+    for titulo in COLUMNAS_EXPORTACION:
+        cell = WriteOnlyCell(ws, value=titulo)
         cell.font = header_font
         cell.fill = header_fill
         cell.alignment = alignment_center
+        encabezados.append(cell)
+    ws.append(encabezados)
 
-    # Escribir Datos
+    total_filas = 0
     for caso in casos:
-        # Pre-procesamiento de datos para evitar errores con None
-        fecha_ingreso = caso.fecha_ingreso.strftime('%d-%m-%Y %H:%M') if caso.fecha_ingreso else ""
-        fecha_cierre = caso.fecha_cierre.strftime('%d-%m-%Y %H:%M') if caso.fecha_cierre else ""
-        
-        # Nombre completo paciente
-        nombres = caso.origen_nombres or ""
-        apellidos = caso.origen_apellidos or ""
-        paciente_full = f"{nombres} {apellidos}".strip()
-
-        # Documento
-        doc_tipo = caso.paciente_doc_tipo or "RUT"
-        doc_num = caso.paciente_doc_numero or caso.origen_rut or "S/I"
-
-        # --- Lógica Dual para Excel ---
-        # 1. Trabajador Social (Prioriza columna nueva, fallback a legacy)
-        nombre_ts = "Sin Asignar"
-        if caso.asignado_ts:
-            nombre_ts = caso.asignado_ts.nombre_completo
-        elif caso.asignado_a:
-            nombre_ts = caso.asignado_a.nombre_completo
-            
-        # 2. Coordinador
-        nombre_coord = caso.asignado_coord.nombre_completo if caso.asignado_coord else "Sin Asignar"
-
-        # Recintos
-        recinto_notifica = caso.recinto_notifica.nombre if caso.recinto_notifica else "Desconocido"
-        recinto_inscrito = caso.recinto_inscrito.nombre if caso.recinto_inscrito else "No Registrado"
-        if caso.recinto_inscrito_otro_texto:
-            recinto_inscrito += f" ({caso.recinto_inscrito_otro_texto})"
-
-        # Edad referencial (calculo simple si hay fecha nac)
-        edad_str = ""
-        if caso.paciente_fecha_nacimiento:
-            hoy = obtener_hora_chile().date()
-            nac = caso.paciente_fecha_nacimiento
-            edad = hoy.year - nac.year - ((hoy.month, hoy.day) < (nac.month, nac.day))
-            edad_str = f"{edad} años"
-
-        row = [
-            fecha_ingreso,
-            caso.folio_atencion,
-            caso.estado,
-            doc_tipo,
-            doc_num,
-            paciente_full,
-            edad_str,
-            caso.ciclo_vital.nombre,
-            recinto_notifica,
-            recinto_inscrito,
-            nombre_ts,      # Columna TS
-            nombre_coord,   # Columna Coord
-            fecha_cierre
-        ]
-        ws.append(row)
+        ws.append(_fila_exportacion(caso, hoy))
+        total_filas += 1
 
-    # 6. Formato Final (AutoFilter, Congelar Panel, Anchos)
+    # AutoFilter: sin ws.dimensions en write_only, calculamos el rango con el conteo
+    ws.auto_filter.ref = f"A1:{get_column_letter(len(COLUMNAS_EXPORTACION))}{total_filas + 1}"
 
-    # Agregar AutoFilter
-    ws.auto_filter.ref = ws.dimensions
-    
-    # Congelar primera fila
-    ws.freeze_panes = "A2"
-
-    # Ajustar anchos (Agregamos una columna más, ajustamos índices)
-    # Indices: Fec, Fol, Est, Tip, Num, Pac, Eda, Cic, Not, Ins, TS,  Coo, Cie
-    column_widths = [18, 10, 15, 8,  12,  30,  8,   15,  25,  25,  25,  25,  18]
-    
-    for i, width in enumerate(column_widths, 1):
-        col_letter = get_column_letter(i)
-        ws.column_dimensions[col_letter].width = width
-
-    # 7. Guardar en memoria y enviar
-    output = io.BytesIO()
+    # 6. Guardar en archivo temporal (no en RAM) y enviarlo por bloques
+    output = tempfile.TemporaryFile()
     wb.save(output)
     output.seek(0)
-    
-    filename = f"Reporte_Casos_{obtener_hora_chile().strftime('%Y%m%d_%H%M')}.xlsx"
 
     return send_file(
         output,
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         as_attachment=True,
-        download_name=filename
+        download_name=f"Reporte_Casos_{marca}.xlsx"
     )
 
 @casos_bp.route('/enviar_reporte_masivo', methods=['POST'])
 @login_required
+@usa_replica
 def enviar_reporte_masivo():
     """
     Calcula estadísticas globales y las envía por correo a todos los usuarios activos.
@@ -1479,17 +1325,24 @@ def enviar_reporte_masivo():
                 'pct': pct
             })
 
-        # 6) Empaquetar todo para email.py (nueva firma)
+        # 6) Tendencia de ingresos: últimos 12 meses, agrupados en la BD desde la tabla resumen
+        stats_tendencia = [
+            {'periodo': etiqueta(p.inicio, 'mes'), 'total': p.total}
+            for p in serie_ingresos(None, dias=365, granularidad='mes')
+        ]
+
+        # 7) Empaquetar todo para email.py (nueva firma)
         data_completa = {
             'global': stats,
             'inscritos': stats_inscritos,
-            'notificacion': stats_notificacion
+            'notificacion': stats_notificacion,
+            'tendencia': stats_tendencia
         }
 
-        # 7) Enviar correo masivo
+        # 8) Enviar correo masivo
         if enviar_reporte_estadistico_masivo(destinatarios_bcc, data_completa):
-            registrar_log("Reporte Masivo", f"Enviado por {current_user.email} a {len(destinatarios_bcc)} destinatarios.")
-            flash(f"Reporte enviado exitosamente a {len(destinatarios_bcc)} usuarios.", "success")
+            registrar_log("Reporte Masivo", f"Encolado por {current_user.email} a {len(destinatarios_bcc)} destinatarios.")
+            flash(f"Reporte en cola de envío para {len(destinatarios_bcc)} usuarios.", "success")
         else:
             flash("Hubo un error al intentar enviar el reporte por correo.", "danger")
 
@@ -1535,6 +1388,7 @@ def gestionar_subrogancia():
 
             subrogante_actual.subrogante_de_usuario_id = None
             db.session.commit()
+            invalidar_sesion_usuario(subrogante_actual.id)
 
             # Correo best-effort
             try:
@@ -1570,6 +1424,7 @@ def gestionar_subrogancia():
             # Activar (el subrogante apunta al titular)
             subrogante_nuevo.subrogante_de_usuario_id = current_user.id
             db.session.commit()
+            invalidar_sesion_usuario(subrogante_nuevo.id, anterior.id if anterior else None)
 
             # Correo best-effort
             try:
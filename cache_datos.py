@@ -0,0 +1,252 @@
+# cache_datos.py
+# Caché de datos de la aplicación (indicadores, totales, fotos de sesión) con TTL, desalojo LRU
+# e invalidación por etiquetas ('ciclo:3', 'asignado:12'). Backend en memoria del proceso o Redis.
+# Vive fuera de utils/ (igual que reloj.py) para que extensions.py lo instancie sin importar models.
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+MAX_ENTRADAS = int(os.getenv('CACHE_MAX_ENTRADAS', '5000'))    # Entradas del backend local (LRU)
+PREFIJO_REDIS = 'redprotege:cache'
+TTL_ETIQUETA_REDIS = 24 * 3600      # Vida del índice etiqueta -> claves en Redis (mayor que cualquier TTL)
+REINTENTO_REDIS = 30                # Segundos sin usar Redis tras un fallo (se calcula directo en la BD)
+
+# ---------------------------------------------------------
+# 1) BACKENDS (misma interfaz: obtener, guardar, borrar, invalidar, limpiar)
+# ---------------------------------------------------------
+
+class BackendLocal:
+    """
+    Memoria del proceso: TTL + desalojo LRU + índice etiqueta -> claves.
+    Cada worker tiene su copia: invalidar() solo afecta al proceso que hizo el cambio
+    (los demás esperan el TTL). Para invalidar en todos los workers, usar Redis.
+    """
+
+    nombre = 'local'
+
+    def __init__(self, maximo=MAX_ENTRADAS):
+        self._maximo = maximo
+        self._datos = OrderedDict()     # clave -> (valor, vence, etiquetas)
+        self._etiquetas = {}            # etiqueta -> {claves}
+        self._lock = threading.Lock()
+
+    def _quitar(self, clave):
+        _, _, etiquetas = self._datos.pop(clave)
+        for etiqueta in etiquetas:
+            claves = self._etiquetas.get(etiqueta)
+            if claves is not None:
+                claves.discard(clave)
+                if not claves:
+                    del self._etiquetas[etiqueta]
+
+    def obtener(self, clave):
+        with self._lock:
+            guardado = self._datos.get(clave)
+            if guardado is None:
+                return None
+            if guardado[1] <= time.monotonic():
+                self._quitar(clave)
+                return None
+            self._datos.move_to_end(clave)
+            return guardado[0]
+
+    def guardar(self, clave, valor, ttl, etiquetas=()):
+        """Retorna cuántas entradas se desalojaron por falta de espacio."""
+        etiquetas = frozenset(etiquetas)
+        desalojadas = 0
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            self._datos[clave] = (valor, time.monotonic() + ttl, etiquetas)
+            for etiqueta in etiquetas:
+                self._etiquetas.setdefault(etiqueta, set()).add(clave)
+            while len(self._datos) > self._maximo:
+                self._quitar(next(iter(self._datos)))
+                desalojadas += 1
+        return desalojadas
+
+    def borrar(self, *claves):
+        with self._lock:
+            for clave in claves:
+                if clave in self._datos:
+                    self._quitar(clave)
+
+    def invalidar(self, *etiquetas):
+        """Borra toda entrada con alguna de estas etiquetas. Retorna las claves borradas."""
+        with self._lock:
+            claves = set()
+            for etiqueta in etiquetas:
+                claves |= self._etiquetas.get(etiqueta, set())
+            for clave in claves:
+                self._quitar(clave)
+            return claves
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+            self._etiquetas.clear()
+
+class BackendRedis:
+    """
+    Redis compartido por todos los workers (ej: redis-server local): una invalidación llega a todos.
+    Valores en JSON (dict/list/str/números; las tuplas vuelven como listas).
+    El límite de tamaño y el desalojo LRU los aplica el servidor (maxmemory + allkeys-lru).
+    Si Redis falla, se comporta como caché vacío por REINTENTO_REDIS segundos (la app sigue con la BD).
+    """
+
+    nombre = 'redis'
+
+    def __init__(self, url):
+        import redis    # Dependencia opcional: solo con CACHE_BACKEND=redis
+        self._error = redis.RedisError
+        self._cliente = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self._caido_hasta = 0.0
+
+    def _clave(self, clave):
+        return f'{PREFIJO_REDIS}:{clave}'
+
+    def _etiqueta(self, etiqueta):
+        return f'{PREFIJO_REDIS}:etiqueta:{etiqueta}'
+
+    def _disponible(self):
+        return time.time() >= self._caido_hasta
+
+    def _fallo(self, error):
+        if time.time() < self._caido_hasta:
+            return
+        self._caido_hasta = time.time() + REINTENTO_REDIS
+        print(f"⚠️ Redis no disponible, caché desactivado por {REINTENTO_REDIS}s: {error}")
+
+    def obtener(self, clave):
+        if not self._disponible():
+            return None
+        try:
+            crudo = self._cliente.get(self._clave(clave))
+        except self._error as e:
+            self._fallo(e)
+            return None
+        return None if crudo is None else json.loads(crudo)
+
+    def guardar(self, clave, valor, ttl, etiquetas=()):
+        if not self._disponible():
+            return 0
+        clave = self._clave(clave)
+        try:
+            pipe = self._cliente.pipeline(transaction=False)
+            pipe.set(clave, json.dumps(valor, separators=(',', ':')), ex=max(1, int(ttl)))
+            for etiqueta in etiquetas:
+                pipe.sadd(self._etiqueta(etiqueta), clave)
+                pipe.expire(self._etiqueta(etiqueta), TTL_ETIQUETA_REDIS)
+            pipe.execute()
+        except self._error as e:
+            self._fallo(e)
+        return 0
+
+    def borrar(self, *claves):
+        if not claves or not self._disponible():
+            return
+        try:
+            self._cliente.delete(*(self._clave(c) for c in claves))
+        except self._error as e:
+            self._fallo(e)
+
+    def invalidar(self, *etiquetas):
+        if not etiquetas or not self._disponible():
+            return set()
+        try:
+            pipe = self._cliente.pipeline(transaction=False)
+            for etiqueta in etiquetas:
+                pipe.smembers(self._etiqueta(etiqueta))
+            claves = set().union(*pipe.execute())
+            self._cliente.delete(*claves, *(self._etiqueta(e) for e in etiquetas))
+        except self._error as e:
+            self._fallo(e)
+            return set()
+        largo = len(PREFIJO_REDIS) + 1
+        return {c.decode()[largo:] for c in claves}
+
+    def limpiar(self):
+        try:
+            claves = list(self._cliente.scan_iter(f'{PREFIJO_REDIS}:*', count=500))
+            for inicio in range(0, len(claves), 500):
+                self._cliente.delete(*claves[inicio:inicio + 500])
+        except self._error as e:
+            self._fallo(e)
+
+# ---------------------------------------------------------
+# 2) EXTENSIÓN (extensions.cache)
+# ---------------------------------------------------------
+
+def _contar(nombre, espacio, cantidad=1):
+    # Import diferido: utils/ importa models (este módulo se carga antes, desde extensions.py)
+    from utils.metricas import incrementar
+    incrementar(nombre, cantidad=cantidad, espacio=espacio)
+
+class Cache:
+    """
+    Caché con espacios de nombres ('indicadores', 'conteos', 'sesion'...).
+    - obtener_o_calcular(espacio, clave, calcular, ttl, etiquetas): lo habitual en las vistas.
+    - invalidar('ciclo:3', ...): descarta todo lo etiquetado así (tras el commit que cambió los datos).
+    Aciertos / fallos / desalojos por espacio van a utils/metricas.py (panel Admin y Prometheus).
+    Un valor None no se guarda (obtener() lo usa para indicar "no está").
+    """
+
+    def __init__(self, app=None):
+        self.backend = BackendLocal()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """CACHE_BACKEND = 'local' (por defecto) o 'redis' (CACHE_REDIS_URL)."""
+        tipo = app.config.get('CACHE_BACKEND', 'local')
+        if tipo == 'redis':
+            try:
+                self.backend = BackendRedis(app.config.get('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+            except ImportError:
+                print("⚠️ CACHE_BACKEND=redis sin el paquete 'redis' instalado: se usa el caché local")
+                self.backend = BackendLocal()
+        elif tipo == 'local':
+            self.backend = BackendLocal(app.config.get('CACHE_MAX_ENTRADAS', MAX_ENTRADAS))
+        else:
+            raise RuntimeError(f"CACHE_BACKEND desconocido: {tipo} (usar 'local' o 'redis')")
+        app.extensions['cache'] = self
+
+    @staticmethod
+    def _clave(espacio, clave):
+        # repr(): las tuplas de str/int no se confunden aunque un filtro traiga ':'
+        return f'{espacio}:{clave!r}'
+
+    def obtener(self, espacio, clave):
+        valor = self.backend.obtener(self._clave(espacio, clave))
+        _contar('datos_cache_aciertos_total' if valor is not None else 'datos_cache_fallos_total', espacio)
+        return valor
+
+    def guardar(self, espacio, clave, valor, ttl, etiquetas=()):
+        if valor is None:
+            return
+        desalojadas = self.backend.guardar(self._clave(espacio, clave), valor, ttl, etiquetas)
+        if desalojadas:
+            _contar('datos_cache_desalojos_total', espacio, desalojadas)
+
+    def obtener_o_calcular(self, espacio, clave, calcular, ttl, etiquetas=()):
+        """Valor cacheado o el resultado de calcular(), que queda guardado 'ttl' segundos."""
+        valor = self.obtener(espacio, clave)
+        if valor is None:
+            valor = calcular()
+            self.guardar(espacio, clave, valor, ttl, etiquetas)
+        return valor
+
+    def borrar(self, espacio, *claves):
+        self.backend.borrar(*(self._clave(espacio, c) for c in claves))
+
+    def invalidar(self, *etiquetas):
+        etiquetas = {e for e in etiquetas if e}
+        if etiquetas:
+            por_espacio = Counter(clave.split(':', 1)[0] for clave in self.backend.invalidar(*etiquetas))
+            for espacio, cantidad in por_espacio.items():
+                _contar('datos_cache_invalidadas_total', espacio, cantidad)
+
+    def limpiar(self):
+        self.backend.limpiar()
@@ -1,5 +1,7 @@
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
+from cache_datos import Cache
 
 login_manager = LoginManager()
-csrf = CSRFProtect()
\ No newline at end of file
+csrf = CSRFProtect()
+cache = Cache()
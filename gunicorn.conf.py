@@ -0,0 +1,41 @@
+# gunicorn.conf.py
+# Servidor de producción: varios procesos (usan todos los núcleos pese al GIL) con varios hilos
+# cada uno (las vistas pasan la mayor parte del tiempo esperando a MySQL).
+# Todo se puede ajustar por variables de entorno sin tocar este archivo.
+import multiprocessing
+import os
+
+bind = os.getenv('WEB_BIND', '127.0.0.1:8000')
+
+# Procesos: núcleos + 1 (los hilos ya cubren la espera de E/S; más procesos solo suman memoria
+# y conexiones a MySQL). Tope de 8 para no agotar max_connections.
+workers = int(os.getenv('WEB_WORKERS', '0')) or min(multiprocessing.cpu_count() + 1, 8)
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', '4'))      # Mismo valor que dimensiona el pool en app.py
+
+# La app (modelos, ReportLab, catálogos, plantillas) se carga una vez en el maestro y se comparte
+preload_app = True
+
+# Exportaciones y reporte masivo pueden tardar; el resto responde en milisegundos
+timeout = 120
+graceful_timeout = 30       # Al recargar/detener, las peticiones en curso tienen 30s para terminar
+keepalive = 5
+
+# Reciclar workers de a poco (evita crecimiento de memoria a largo plazo)
+max_requests = 5000
+max_requests_jitter = 500
+
+pidfile = os.getenv('WEB_PIDFILE', '/tmp/redprotege-gunicorn.pid')
+accesslog = os.getenv('WEB_ACCESSLOG') or None
+errorlog = '-'
+
+def when_ready(server):
+    server.log.info(f"RedProtege listo: {workers} procesos x {threads} hilos en {bind}")
+
+def post_fork(server, worker):
+    # Cada worker abre sus propias conexiones (las del maestro se soltaron en wsgi.precargar)
+    # La app precargada (no "from wsgi import app": con python wsgi.py el módulo es __main__ y se crearía otra)
+    from models import db
+    app = server.app.wsgi()
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,14 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm import joinedload, selectinload
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
-import pytz
+from reloj import obtener_hora_chile
+from replica import SesionEnrutada
 
-db = SQLAlchemy()
-
-def obtener_hora_chile():
-    cl_tz = pytz.timezone('America/Santiago')
-    return datetime.now(cl_tz)
+# Sesión que puede leer de la réplica dentro de lectura_replica() (ver replica.py)
+db = SQLAlchemy(session_options={'class_': SesionEnrutada})
 
 # --- TABLA DE ASOCIACIÓN (MANY-TO-MANY) ---
 # Tabla puente para relacionar Casos con múltiples Vulneraciones
@@ -117,6 +115,13 @@ class Log(db.Model):
     accion = db.Column(db.String(255), nullable=False)
     detalles = db.Column(db.Text)
 
+    # Visor de logs paginado por cursor (timestamp DESC, id DESC), con y sin filtros
+    __table_args__ = (
+        db.Index('idx_logs_fecha_id', 'timestamp', 'id'),
+        db.Index('idx_logs_usuario_fecha', 'usuario_id', 'timestamp', 'id'),
+        db.Index('idx_logs_accion_fecha', 'accion', 'timestamp', 'id'),
+    )
+
 # --- NEGOCIO: CASOS ---
 
 class CasoGestion(db.Model):
@@ -271,6 +276,8 @@ class Caso(db.Model):
     # Índice compuesto para dashboard (Solicitado)
     __table_args__ = (
         db.Index('idx_casos_ciclo_estado', 'ciclo_vital_id', 'estado'),
+        # Bandeja paginada por cursor: (estado, fecha_ingreso DESC, id DESC) sin filesort
+        db.Index('idx_casos_estado_fecha', 'estado', 'fecha_ingreso', 'id'),
     )
 
 class AuditoriaCaso(db.Model):
@@ -348,4 +355,207 @@ class AuditoriaCaso(db.Model):
                 'titulo': 'Ingreso del Caso'
             }
 
-        return config
\ No newline at end of file
+        return config
+
+# --- PERFILES DE CARGA (EAGER LOADING) PARA CASO ---
+# Paquetes de opciones para evitar N+1: cada vista trae de una vez las relaciones que renderiza.
+# - Many-to-one (ciclo, usuarios, recintos): joinedload -> mismo SELECT, seguro con LIMIT/paginate.
+# - Colecciones (vulneraciones, bitácora, auditorías): selectinload -> 1 query extra con IN.
+# Uso: Caso.query.options(*CARGA_BANDEJA)
+
+def _cargar_usuario(relacion):
+    # subrogante_de es lazy='joined' por defecto; aquí no se usa, así que evitamos el self-join extra
+    return joinedload(relacion).lazyload(Usuario.subrogante_de)
+
+# Bandeja (casos/index.html): ciclo + equipo asignado (TS nuevo, TS legacy, Coordinador)
+CARGA_BANDEJA = (
+    joinedload(Caso.ciclo_vital),
+    _cargar_usuario(Caso.asignado_ts),
+    _cargar_usuario(Caso.asignado_a),
+    _cargar_usuario(Caso.asignado_coord),
+)
+
+# Exportación Excel: bandeja + recintos
+CARGA_EXPORTACION = CARGA_BANDEJA + (
+    joinedload(Caso.recinto_notifica),
+    joinedload(Caso.recinto_inscrito),
+)
+
+# Detalle (casos/ver.html): todo lo anterior + denuncia, quién asignó, colecciones y sus usuarios
+CARGA_DETALLE = CARGA_EXPORTACION + (
+    joinedload(Caso.denuncia_institucion),
+    _cargar_usuario(Caso.asignado_por),
+    selectinload(Caso.vulneraciones),
+    selectinload(Caso.gestiones).joinedload(CasoGestion.usuario).lazyload(Usuario.subrogante_de),
+    selectinload(Caso.auditorias).joinedload(AuditoriaCaso.usuario).lazyload(Usuario.subrogante_de),
+)
+
+# Acta de cierre (utils/pdf_actas.py): ciclo, recinto inscrito, vulneraciones y bitácora con usuario
+CARGA_ACTA = (
+    joinedload(Caso.ciclo_vital),
+    joinedload(Caso.recinto_inscrito),
+    selectinload(Caso.vulneraciones),
+    selectinload(Caso.gestiones).joinedload(CasoGestion.usuario).lazyload(Usuario.subrogante_de),
+)
+
+# --- REPORTABILIDAD: RESUMEN PRECALCULADO DEL DASHBOARD ---
+
+class ResumenDashboard(db.Model):
+    """
+    Contadores precalculados de casos por (ciclo × estado × recintos × día).
+    Se mantiene incrementalmente desde utils/dashboard.py y se reconcilia con
+    el comando 'flask reconstruir-resumen'.
+    Nota: los recintos usan 0 (y no NULL) para "sin recinto", porque MySQL
+    permite NULL repetidos dentro de un UNIQUE y romperíamos la unicidad del bucket.
+    """
+    __tablename__ = 'resumen_dashboard'
+    id = db.Column(db.Integer, primary_key=True)
+    ciclo_vital_id = db.Column(db.Integer, nullable=False)
+    estado = db.Column(db.String(30), nullable=False)
+    recinto_notifica_id = db.Column(db.Integer, nullable=False, default=0)
+    recinto_inscrito_id = db.Column(db.Integer, nullable=False, default=0)
+    dia = db.Column(db.Date, nullable=False)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('ciclo_vital_id', 'estado', 'recinto_notifica_id', 'recinto_inscrito_id', 'dia',
+                            name='uq_resumen_bucket'),
+        db.Index('idx_resumen_ciclo_dia', 'ciclo_vital_id', 'dia'),
+    )
+
+class CorreoPendiente(db.Model):
+    """
+    Cola persistente de correos (outbox). Las funciones enviar_* solo encolan;
+    los workers de utils/cola_correos.py la drenan con conexiones SMTP reutilizadas.
+    Estados: PENDIENTE -> ENVIANDO -> ENVIADO | (reintento) PENDIENTE | ERROR (definitivo).
+    """
+    __tablename__ = 'cola_correos'
+    id = db.Column(db.Integer, primary_key=True)
+    destinatarios = db.Column(db.JSON, nullable=False)   # To (visible)
+    bcc = db.Column(db.JSON)                             # Receptores ocultos
+    asunto = db.Column(db.String(255), nullable=False)
+    cuerpo_html = db.Column(db.Text(16777215))           # MEDIUMTEXT en MySQL (reportes masivos)
+    adjunto_path = db.Column(db.String(500))
+
+    estado = db.Column(db.String(20), nullable=False, default='PENDIENTE')
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    proximo_intento = db.Column(db.DateTime, default=obtener_hora_chile)
+    bloqueado_en = db.Column(db.DateTime)                # Cuándo lo tomó un worker (para liberar bloqueos huérfanos)
+    ultimo_error = db.Column(db.Text)
+
+    # Auditoría del caso a actualizar con el resultado final (ej: EMAIL_ASIGNACION)
+    auditoria_id = db.Column(db.Integer, db.ForeignKey('auditoria_casos.id'), nullable=True)
+
+    fecha_creacion = db.Column(db.DateTime, default=obtener_hora_chile)
+    fecha_envio = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_cola_estado_proximo', 'estado', 'proximo_intento'),
+    )
+
+class TrabajoActa(db.Model):
+    """
+    Trabajos de generación del acta de cierre (PDF) en segundo plano.
+    El último trabajo de cada caso define lo que muestra la ficha: generando / lista / error.
+    Estados: PENDIENTE -> GENERANDO -> LISTA | (reintento) PENDIENTE | ERROR (reintentable).
+    """
+    __tablename__ = 'cola_actas'
+    id = db.Column(db.Integer, primary_key=True)
+    caso_id = db.Column(db.Integer, db.ForeignKey('casos.id'), nullable=False, index=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))   # "Cerrado Por" del acta
+
+    estado = db.Column(db.String(20), nullable=False, default='PENDIENTE')
+    intentos = db.Column(db.Integer, nullable=False, default=0)
+    proximo_intento = db.Column(db.DateTime, default=obtener_hora_chile)
+    bloqueado_en = db.Column(db.DateTime)
+    ultimo_error = db.Column(db.Text)
+
+    fecha_creacion = db.Column(db.DateTime, default=obtener_hora_chile)
+    fecha_termino = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('idx_actas_estado_proximo', 'estado', 'proximo_intento'),
+    )
+
+    @property
+    def en_proceso(self):
+        return self.estado in ('PENDIENTE', 'GENERANDO')
+
+class CasoBusqueda(db.Model):
+    """
+    Índice de búsqueda de casos (1 fila por caso), mantenido desde utils/busqueda.py.
+    - folio / documento: normalizados en mayúsculas con índice B-tree (exacto o por prefijo).
+    - texto: nombres del paciente y acompañante en minúsculas y sin tildes, con FULLTEXT en MySQL.
+    Se reconstruye con 'flask reconstruir-busqueda'.
+    """
+    __tablename__ = 'busqueda_casos'
+    caso_id = db.Column(db.Integer, db.ForeignKey('casos.id'), primary_key=True)
+    folio = db.Column(db.String(50), index=True)
+    documento = db.Column(db.String(50), index=True)   # Solo letras/dígitos: 12.345.678-5 -> 123456785
+    texto = db.Column(db.Text)
+
+    caso = db.relationship('Caso', backref=db.backref('busqueda', uselist=False, cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ft_busqueda_texto', 'texto', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
+class CasoHuella(db.Model):
+    """
+    Huellas para detectar casos duplicados (varias filas por caso), mantenidas desde utils/duplicados.py.
+    Dos casos que comparten (tipo, clave) son sospechosos de ser el mismo ingreso:
+    - 'doc':    documento normalizado + fecha de atención
+    - 'folio':  folio normalizado + recinto que notifica
+    - 'nombre': clave fonética de nombre y apellido + fecha de atención
+    Se reconstruye con 'flask reconstruir-huellas'.
+    """
+    __tablename__ = 'huellas_casos'
+    id = db.Column(db.Integer, primary_key=True)
+    caso_id = db.Column(db.Integer, db.ForeignKey('casos.id'), nullable=False, index=True)
+    tipo = db.Column(db.String(10), nullable=False)
+    clave = db.Column(db.String(120), nullable=False)
+
+    caso = db.relationship('Caso', backref=db.backref('huellas', cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('idx_huellas_tipo_clave', 'tipo', 'clave', 'caso_id'),
+    )
+
+class Paciente(db.Model):
+    """
+    Identidad del paciente (1 fila por documento normalizado), mantenida desde utils/pacientes.py.
+    Une todas las derivaciones de una misma persona sin buscar por nombre.
+    Nombres y fecha de nacimiento: los del primer ingreso (se completan si faltaban).
+    Se reconstruye con 'flask reconstruir-pacientes'.
+    """
+    __tablename__ = 'pacientes'
+    id = db.Column(db.Integer, primary_key=True)
+    documento = db.Column(db.String(50), nullable=False, unique=True)   # Solo letras/dígitos: 12.345.678-5 -> 123456785
+    doc_tipo = db.Column(db.String(10))
+    nombres = db.Column(db.String(100))
+    apellidos = db.Column(db.String(100))
+    fecha_nacimiento = db.Column(db.Date)
+    fecha_actualizacion = db.Column(db.DateTime, default=obtener_hora_chile, onupdate=obtener_hora_chile)
+
+class CasoPaciente(db.Model):
+    """Vínculo caso -> paciente (1 fila por caso con documento). Índice (paciente_id, caso_id) para la línea de tiempo."""
+    __tablename__ = 'pacientes_casos'
+    caso_id = db.Column(db.Integer, db.ForeignKey('casos.id'), primary_key=True)
+    paciente_id = db.Column(db.Integer, db.ForeignKey('pacientes.id'), nullable=False)
+
+    caso = db.relationship('Caso', backref=db.backref('vinculo_paciente', uselist=False, cascade='all, delete-orphan'))
+    paciente = db.relationship('Paciente', backref=db.backref('vinculos', lazy='dynamic'))
+
+    __table_args__ = (
+        db.Index('idx_pacientes_casos_paciente', 'paciente_id', 'caso_id'),
+    )
+
+class VersionCache(db.Model):
+    """
+    Sello de versión de datos cacheados en memoria (ej: 'catalogos').
+    Cada proceso compara su versión con esta fila y recarga si cambió.
+    """
+    __tablename__ = 'versiones_cache'
+    clave = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    fecha_actualizacion = db.Column(db.DateTime, default=obtener_hora_chile, onupdate=obtener_hora_chile)
@@ -0,0 +1,76 @@
+# reloj.py
+# Servicio de hora del sistema (Santiago de Chile).
+# Vive fuera de utils/ (igual que extensions.py) para que models.py lo use como default
+# de columnas sin importar el paquete utils (que a su vez importa models).
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+from flask import g, has_request_context
+
+# Zona cargada UNA vez por proceso (antes: pytz.timezone() en cada llamada)
+ZONA_CHILE = ZoneInfo('America/Santiago')
+
+# ---------------------------------------------------------
+# 1) RELOJES
+# ---------------------------------------------------------
+
+class RelojSistema:
+    """Hora real del servidor, convertida a Santiago."""
+
+    def ahora(self):
+        return datetime.now(ZONA_CHILE)
+
+class RelojFijo:
+    """
+    Reloj controlable para pruebas y benchmarks.
+    - RelojFijo(datetime(2025, 3, 1, 9, 0)) -> siempre esa hora (sin tz se asume Santiago)
+    - paso=timedelta(seconds=1) -> avanza ese tanto en cada lectura
+    - avanzar(timedelta(days=1)) -> salta en el tiempo
+    """
+
+    def __init__(self, inicio, paso=timedelta(0)):
+        self.actual = inicio if inicio.tzinfo else inicio.replace(tzinfo=ZONA_CHILE)
+        self.paso = paso
+
+    def ahora(self):
+        valor = self.actual
+        self.actual += self.paso
+        return valor
+
+    def avanzar(self, delta):
+        self.actual += delta
+
+_reloj = RelojSistema()
+
+def usar_reloj(reloj):
+    """Reemplaza el reloj del proceso (ej: RelojFijo en pruebas). Retorna el anterior para restaurarlo."""
+    global _reloj
+    anterior, _reloj = _reloj, reloj
+    return anterior
+
+# ---------------------------------------------------------
+# 2) HORA DE LA PETICIÓN
+# ---------------------------------------------------------
+
+def obtener_hora_chile():
+    """
+    Retorna la fecha y hora actual en Santiago de Chile.
+    Dentro de una petición es la MISMA para toda la petición (g.hora_peticion): el caso,
+    su auditoría y sus logs quedan con un timestamp coherente. Fuera de una petición
+    (CLI, workers de las colas) es la hora del momento.
+    """
+    if has_request_context():
+        hora = g.get('hora_peticion')
+        if hora is None:
+            hora = g.hora_peticion = _reloj.ahora()
+        return hora
+    return _reloj.ahora()
+
+def hora_chile_actual():
+    """Hora del momento aunque se esté dentro de una petición (medir duraciones, reintentos)."""
+    return _reloj.ahora()
+
+def iniciar_reloj(app):
+    """Cada petición parte con su propia hora (g puede sobrevivir entre peticiones en pruebas)."""
+    @app.before_request
+    def _nueva_hora_peticion():
+        g.pop('hora_peticion', None)
@@ -0,0 +1,155 @@
+# replica.py
+# Enrutamiento de lecturas a una réplica de solo lectura (DATABASE_REPLICA_URL).
+# Vive fuera de utils/ (igual que reloj.py) porque models.py crea 'db' con esta sesión.
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, session as sesion_flask, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql import Select, CompoundSelect
+
+BIND_REPLICA = 'replica'
+REINTENTO_REPLICA = 30      # Segundos que la réplica queda descartada tras un fallo (se usa la primaria)
+REVISION_REPLICA = 30       # Cada cuántos segundos se verifica la réplica al entrar a un bloque de lectura
+# Tras escribir, las lecturas de ese usuario van a la primaria por N segundos (ve lo que acaba de guardar
+# aunque la réplica venga con retraso)
+VENTANA_PRIMARIA = int(os.getenv('REPLICA_VENTANA_ESCRITURA', '10'))
+
+_estado = {'caida_hasta': 0.0, 'revisada': 0.0}
+
+# ---------------------------------------------------------
+# 1) SESIÓN QUE ELIGE EL MOTOR POR CONSULTA
+# ---------------------------------------------------------
+
+def _es_lectura(clause):
+    """Solo SELECT sin FOR UPDATE se pueden leer en la réplica."""
+    if isinstance(clause, CompoundSelect):
+        return True
+    return isinstance(clause, Select) and clause._for_update_arg is None
+
+class SesionEnrutada(Session):
+    """
+    Sesión de Flask-SQLAlchemy que, dentro de lectura_replica(), manda los SELECT a la réplica.
+    Todo lo demás va a la primaria: INSERT/UPDATE/DELETE, flush, db.session.connection(),
+    SELECT ... FOR UPDATE y cualquier lectura posterior a una escritura en la misma sesión.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('replica') and not self._flushing:
+            if _es_lectura(clause):
+                if not self.info.get('escribio'):
+                    motor = self._db.engines.get(BIND_REPLICA)
+                    if motor is not None and time.time() >= _estado['caida_hasta']:
+                        return motor
+            else:
+                # DML o acceso directo a la conexión: desde aquí se lee de la primaria
+                self.info['escribio'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def _marcar_escritura(session):
+    session.info['escribio'] = True
+    if has_request_context():
+        g.replica_escritura = True
+
+@event.listens_for(SesionEnrutada, 'after_flush')
+def _escritura_orm(session, flush_context):
+    _marcar_escritura(session)
+
+@event.listens_for(SesionEnrutada, 'do_orm_execute')
+def _escritura_directa(estado):
+    # db.session.execute(insert(...)/update(...)/delete(...)) no pasa por el flush
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        _marcar_escritura(estado.session)
+
+# ---------------------------------------------------------
+# 2) API PARA LAS VISTAS
+# ---------------------------------------------------------
+
+def replica_configurada():
+    from models import db
+    return BIND_REPLICA in db.engines
+
+def _replica_disponible(db):
+    """Réplica utilizable ahora (con un SELECT 1 cada REVISION_REPLICA segundos por proceso)."""
+    motor = db.engines.get(BIND_REPLICA)
+    ahora = time.time()
+    if motor is None or ahora < _estado['caida_hasta']:
+        return False
+    if ahora - _estado['revisada'] > REVISION_REPLICA:
+        try:
+            with motor.connect() as conn:
+                conn.exec_driver_sql('SELECT 1')
+            _estado['revisada'] = ahora
+        except Exception as e:
+            _descartar_replica(e)
+            return False
+    return True
+
+def _descartar_replica(error):
+    if time.time() < _estado['caida_hasta']:
+        return
+    _estado['caida_hasta'] = time.time() + REINTENTO_REPLICA
+    print(f"⚠️ Réplica no disponible, se lee de la primaria por {REINTENTO_REPLICA}s: {error}")
+
+def _usuario_escribio_hace_poco():
+    return has_request_context() and sesion_flask.get('primaria_hasta', 0) > time.time()
+
+@contextmanager
+def lectura_replica(sesion=None):
+    """
+    Los SELECT del bloque se leen en la réplica (datos con unos segundos de retraso).
+    Solo para lecturas que toleran ese retraso: KPIs, gráficos, exportaciones, reportes, logs.
+    Sin réplica configurada, caída, o si el usuario acaba de escribir: todo va a la primaria.
+    'sesion' sirve para una Query creada en otro contexto (ej: la de un generador en streaming).
+    """
+    from models import db
+
+    sesion = sesion or db.session()
+    anterior = sesion.info.get('replica', False)
+    sesion.info['replica'] = _replica_disponible(db) and not _usuario_escribio_hace_poco()
+    try:
+        yield
+    finally:
+        sesion.info['replica'] = anterior
+
+def usa_replica(vista):
+    """Decorador: toda la vista lee de la réplica (las escrituras siguen yendo a la primaria)."""
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        with lectura_replica():
+            return vista(*args, **kwargs)
+    return envoltura
+
+# ---------------------------------------------------------
+# 3) INICIALIZACIÓN
+# ---------------------------------------------------------
+
+def iniciar_replica(app):
+    """
+    Registra el fallo de la réplica (cae a la primaria sin esperar la próxima revisión) y la
+    ventana de lectura desde la primaria para quien acaba de escribir.
+    """
+    from models import db
+
+    with app.app_context():
+        motor = db.engines.get(BIND_REPLICA)
+    if motor is None:
+        return
+
+    @event.listens_for(motor, 'handle_error')
+    def _fallo_replica(contexto):
+        if contexto.is_disconnect or contexto.connection is None:
+            _descartar_replica(contexto.original_exception)
+
+    @app.before_request
+    def _nueva_sesion_lectura():
+        # La sesión puede sobrevivir entre peticiones si hay un app context externo (pruebas)
+        db.session().info.pop('escribio', None)
+
+    @app.after_request
+    def _ventana_primaria(response):
+        if g.pop('replica_escritura', False):
+            sesion_flask['primaria_hasta'] = time.time() + VENTANA_PRIMARIA
+        return response
@@ -0,0 +1,90 @@
+# tests/conftest.py
+# App sobre una BD SQLite temporal con datos de ejemplo (sin MySQL, sin SMTP ni workers).
+import os
+import sys
+from datetime import datetime, date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'clave-de-pruebas')
+os.environ['EMAIL_WORKERS'] = '0'
+os.environ['ACTA_WORKERS'] = '0'
+os.environ.pop('DATABASE_REPLICA_URL', None)
+
+from app import create_app
+from models import (db, Rol, Usuario, Caso, CatalogoCiclo, CatalogoRecinto, CatalogoVulneracion,
+                    CatalogoInstitucion, CatalogoEstablecimiento, AuditoriaCaso, CasoGestion)
+
+CLAVE = 'Clave123'
+CASOS = 40
+FUNCIONARIOS = 6        # TS y coordinadores distintos: un lazy load por usuario se notaría en el conteo
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    ruta = tmp_path_factory.mktemp('bd') / 'pruebas.db'
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{ruta}',
+        'SQLALCHEMY_ENGINE_OPTIONS': {},
+        'WTF_CSRF_ENABLED': False,
+        'TESTING': True,
+    })
+    with app.app_context():
+        db.create_all()
+        _sembrar()
+    return app
+
+def _sembrar():
+    roles = {nombre: Rol(nombre=nombre) for nombre in
+             ('Admin', 'Coordinador EPI', 'Referente', 'Trabajador(a) Social', 'Coordinador Ciclo', 'Solicitante')}
+    ciclos = [CatalogoCiclo(nombre=f'Ciclo {i}') for i in range(3)]
+    recintos = [CatalogoRecinto(nombre=n) for n in ('CESFAM A', 'CESFAM B', 'Otro')]
+    vulneraciones = [CatalogoVulneracion(nombre=n) for n in ('Maltrato', 'Abuso', 'Otro')]
+    instituciones = [CatalogoInstitucion(nombre=n) for n in ('PDI', 'Otro')]
+    establecimientos = [CatalogoEstablecimiento(nombre=n) for n in ('Est 1', 'Est 2', 'Otro')]
+    db.session.add_all([*roles.values(), *ciclos, *recintos, *vulneraciones, *instituciones, *establecimientos])
+
+    def usuario(email, rol):
+        u = Usuario(nombre_completo=email.split('@')[0], email=email, rol=roles[rol], activo=True)
+        u.set_password(CLAVE)
+        db.session.add(u)
+        return u
+
+    admin = usuario('admin@pruebas.cl', 'Admin')
+    usuario('epi@pruebas.cl', 'Coordinador EPI')
+    usuario('referente@pruebas.cl', 'Referente').ciclos = [ciclos[0]]
+    ts = [usuario(f'ts{i}@pruebas.cl', 'Trabajador(a) Social') for i in range(FUNCIONARIOS)]
+    coord = [usuario(f'coord{i}@pruebas.cl', 'Coordinador Ciclo') for i in range(FUNCIONARIOS)]
+    db.session.flush()
+
+    ahora = datetime.now()
+    for i in range(CASOS):
+        caso = Caso(
+            fecha_atencion=date.today(), folio_atencion=f'F{i:04d}',
+            origen_nombres=f'Nombre{i}', origen_apellidos='Apellido', origen_relato='Relato',
+            paciente_doc_tipo='RUT', paciente_doc_numero='12345678-5',
+            recinto_notifica_id=recintos[i % 3].id, recinto_inscrito_id=establecimientos[i % 3].id,
+            ciclo_vital_id=ciclos[i % 3].id, estado=('PENDIENTE_RESCATAR', 'EN_SEGUIMIENTO', 'CERRADO')[i % 3],
+            fecha_ingreso=ahora - timedelta(days=i % 10),
+            asignado_ts_id=ts[i % FUNCIONARIOS].id, asignado_coord_id=coord[i % FUNCIONARIOS].id,
+            asignado_por_usuario_id=admin.id,
+        )
+        caso.vulneraciones = [vulneraciones[i % 3], vulneraciones[(i + 1) % 3]]
+        db.session.add(caso)
+        db.session.flush()
+        for j in range(3):
+            db.session.add(AuditoriaCaso(caso_id=caso.id, usuario_id=(ts + coord)[(i + j) % len(ts + coord)].id,
+                                         fecha_movimiento=ahora, accion='GESTION', detalles_cambio={'n': j}))
+            db.session.add(CasoGestion(caso_id=caso.id, usuario_id=ts[(i + j) % FUNCIONARIOS].id,
+                                       fecha_movimiento=ahora, observacion=f'Gestión {j}'))
+    db.session.commit()
+
+def iniciar_sesion(app, email):
+    cliente = app.test_client()
+    respuesta = cliente.post('/login', data={'email': email, 'password': CLAVE})
+    assert respuesta.status_code == 302
+    return cliente
+
+@pytest.fixture
+def cliente_admin(app):
+    return iniciar_sesion(app, 'admin@pruebas.cl')
@@ -0,0 +1,22 @@
+# tests/test_cache_http.py
+# Política de caché HTTP: las páginas con datos sensibles no quedan guardadas en el navegador.
+import pytest
+
+@pytest.mark.parametrize('url', ['/casos/', '/admin/panel', '/admin/ver_logs'])
+def test_paginas_sensibles_no_se_almacenan(cliente_admin, url):
+    respuesta = cliente_admin.get(url)
+    assert respuesta.status_code == 200
+    assert respuesta.cache_control.no_store
+    assert 'ETag' not in respuesta.headers
+
+@pytest.mark.parametrize('url', ['/login', '/solicitar-reseteo'])
+def test_paginas_de_acceso_no_se_almacenan(app, url):
+    respuesta = app.test_client().get(url)
+    assert respuesta.status_code == 200
+    assert respuesta.cache_control.no_store
+
+def test_json_agregado_se_revalida_con_etag(cliente_admin):
+    respuesta = cliente_admin.get('/casos/api/kpis')
+    assert not respuesta.cache_control.no_store
+    etag = respuesta.headers['ETag']
+    assert cliente_admin.get('/casos/api/kpis', headers={'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,35 @@
+# tests/test_permisos.py
+# Reglas de acceso a casos que no deben cambiar con las optimizaciones de la bandeja.
+import pytest
+
+from conftest import iniciar_sesion
+from models import db, Caso, Usuario
+
+@pytest.fixture
+def caso_id(app):
+    with app.app_context():
+        return db.session.query(Caso.id).order_by(Caso.id).first()[0]
+
+def test_coordinador_epi_ve_bandeja_pero_no_la_ficha(app, caso_id):
+    cliente = iniciar_sesion(app, 'epi@pruebas.cl')
+    assert cliente.get('/casos/').status_code == 200
+    assert cliente.get(f'/casos/ver/{caso_id}').status_code == 403
+
+def test_trabajador_social_solo_abre_casos_asignados(app):
+    with app.app_context():
+        propio = db.session.query(Caso.id).join(Caso.asignado_ts).filter_by(email='ts0@pruebas.cl').first()[0]
+        ajeno = db.session.query(Caso.id).join(Caso.asignado_ts).filter_by(email='ts1@pruebas.cl').first()[0]
+    cliente = iniciar_sesion(app, 'ts0@pruebas.cl')
+    assert cliente.get(f'/casos/ver/{propio}').status_code == 200
+    assert cliente.get(f'/casos/ver/{ajeno}').status_code == 403
+
+def test_otros_casos_del_paciente_solo_muestra_los_del_alcance(app):
+    with app.app_context():
+        casos = db.session.query(Caso.id, Caso.folio_atencion, Usuario.email).join(Caso.asignado_ts).all()
+    propios = [(c_id, folio) for c_id, folio, email in casos if email == 'ts0@pruebas.cl']
+    ajenos = [folio for _, folio, email in casos if email != 'ts0@pruebas.cl']
+
+    html = iniciar_sesion(app, 'ts0@pruebas.cl').get(f'/casos/ver/{propios[0][0]}').get_data(as_text=True)
+    assert f'Folio {propios[1][1]}' in html
+    assert not any(f'Folio {folio}' in html for folio in ajenos)
+    assert 'fuera de tu alcance' in html
@@ -0,0 +1,63 @@
+# tests/test_presupuesto_consultas.py
+# Presupuesto de consultas SQL por petición: un N+1 (lazy load por fila o por usuario) lo rompe.
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from extensions import cache
+from models import db, Caso
+from utils import sesion
+
+# Consultas máximas por petición (caché de datos vacío, catálogos ya cargados)
+PRESUPUESTO_BANDEJA = 5
+PRESUPUESTO_DETALLE = 9
+PRESUPUESTO_EXPORTACION = 3
+
+@pytest.fixture(autouse=True)
+def sello_sesion_verificado(monkeypatch):
+    # El sello de sesiones se consulta cada INTERVALO_VERIFICACION s: que no caiga dentro de la medición
+    monkeypatch.setattr(sesion, 'INTERVALO_VERIFICACION', float('inf'))
+
+@contextmanager
+def contar_consultas(app):
+    """Lista de SQL ejecutado en el bloque (todas las conexiones del motor principal)."""
+    with app.app_context():
+        motor = db.engine
+    sentencias = []
+
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        sentencias.append(statement)
+
+    event.listen(motor, 'before_cursor_execute', registrar)
+    try:
+        yield sentencias
+    finally:
+        event.remove(motor, 'before_cursor_execute', registrar)
+
+def _medir(app, cliente, url):
+    cliente.get(url)            # Calienta catálogos y la foto de sesión (no dependen de los casos)
+    cache.limpiar()
+    with contar_consultas(app) as sentencias:
+        respuesta = cliente.get(url)
+        respuesta.get_data()    # Exportaciones en streaming: las consultas corren al leer el cuerpo
+    assert respuesta.status_code == 200
+    return sentencias
+
+def _detalle(sentencias):
+    return "\n".join(s.split('\n')[0][:120] for s in sentencias)
+
+def test_bandeja(app, cliente_admin):
+    sentencias = _medir(app, cliente_admin, '/casos/')
+    assert len(sentencias) <= PRESUPUESTO_BANDEJA, _detalle(sentencias)
+
+def test_ver_caso(app, cliente_admin):
+    with app.app_context():
+        caso_id = db.session.query(Caso.id).order_by(Caso.id).first()[0]
+    sentencias = _medir(app, cliente_admin, f'/casos/ver/{caso_id}')
+    assert len(sentencias) <= PRESUPUESTO_DETALLE, _detalle(sentencias)
+
+@pytest.mark.parametrize('formato', ['xlsx', 'csv'])
+def test_exportar_excel(app, cliente_admin, formato):
+    sentencias = _medir(app, cliente_admin, f'/casos/exportar?formato={formato}')
+    assert len(sentencias) <= PRESUPUESTO_EXPORTACION, _detalle(sentencias)
@@ -0,0 +1,44 @@
+# tests/test_sesion.py
+# Foto de sesión en caché: una invalidación (o un login) no debe descartar las fotos de otros usuarios.
+from sqlalchemy import select, update, insert
+
+from conftest import iniciar_sesion
+from extensions import cache
+from models import db, Usuario, VersionCache
+from utils import sesion
+
+def _id(email):
+    return db.session.execute(select(Usuario.id).where(Usuario.email == email)).scalar_one()
+
+def test_login_no_descarta_la_foto_de_otro_usuario(app):
+    iniciar_sesion(app, 'ts2@pruebas.cl').get('/casos/')
+    with app.app_context():
+        foto = cache.obtener('sesion', _id('ts2@pruebas.cl'))
+    assert foto is not None
+
+    iniciar_sesion(app, 'ts3@pruebas.cl')
+    sesion._estado['verificado'] = float('-inf')    # Como si hubiera pasado el intervalo de verificación
+    with app.app_context():
+        assert sesion.datos_sesion(_id('ts2@pruebas.cl')) is foto
+
+def test_invalidacion_de_otro_worker_solo_relee_a_su_usuario(app):
+    with app.app_context():
+        propio, ajeno = _id('ts4@pruebas.cl'), _id('ts5@pruebas.cl')
+        foto_propia = sesion.datos_sesion(propio)
+        foto_ajena = sesion.datos_sesion(ajeno)
+
+        # Otro proceso invalida a 'ajeno': sube el contador y su fila, sin tocar el caché de este worker
+        with db.engine.begin() as conn:
+            actual = conn.execute(
+                select(VersionCache.version).where(VersionCache.clave == sesion.CLAVE_VERSION)
+            ).scalar() or 0
+            if actual:
+                conn.execute(update(VersionCache).where(VersionCache.clave == sesion.CLAVE_VERSION)
+                             .values(version=actual + 1))
+            else:
+                conn.execute(insert(VersionCache).values(clave=sesion.CLAVE_VERSION, version=1))
+            conn.execute(insert(VersionCache).values(clave=f'{sesion.PREFIJO_USUARIO}{ajeno}', version=actual + 1))
+        sesion._estado['verificado'] = float('-inf')
+
+        assert sesion.datos_sesion(propio) is foto_propia
+        assert sesion.datos_sesion(ajeno) is not foto_ajena
@@ -1,4 +1,15 @@
-from .helpers import obtener_hora_chile, registrar_log, es_rut_valido, safe_int
-from .email import enviar_correo_reseteo, enviar_aviso_asignacion, enviar_aviso_nuevo_caso, enviar_aviso_cierre, enviar_credenciales_nuevo_usuario, enviar_reporte_estadistico_masivo, enviar_aviso_subrogancia
+from .helpers import obtener_hora_chile, hora_chile_actual, registrar_log, safe_int
+from .rut import es_rut_valido, clean_rut, rut_excede_largo, validar_ruts, normalizar_ruts
+from .email import enviar_correo_reseteo, enviar_aviso_asignacion, enviar_aviso_nuevo_caso, enviar_resumen_ingreso_masivo, enviar_aviso_cierre, enviar_credenciales_nuevo_usuario, enviar_reporte_estadistico_masivo, enviar_aviso_subrogancia
 from .pdf_actas import generar_acta_cierre_pdf
-from .decorators import check_password_change, admin_required, gestor_required
\ No newline at end of file
+from .decorators import check_password_change, admin_required, gestor_required
+from .dashboard import leer_resumen_dashboard, reconstruir_resumen, serie_ingresos
+from .indicadores import kpis, grafico_ingresos, grafico_notificacion, grafico_inscritos
+from .cola_actas import encolar_acta, estado_acta
+from .busqueda import filtro_busqueda, reconstruir_busqueda
+from .paginacion import paginar_por_cursor, contar_con_cache
+from .alcance import obtener_alcance
+from .sesion import cargar_usuario_sesion, invalidar_sesion_usuario
+from .catalogos import obtener_catalogos, invalidar_catalogos
+from .duplicados import buscar_duplicados, detectar_grupos
+from .pacientes import otros_casos_paciente, reconstruir_pacientes
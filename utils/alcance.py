@@ -0,0 +1,94 @@
+from flask import g
+from flask_login import current_user
+from sqlalchemy import or_, false
+from models import Caso
+from utils.sesion import datos_sesion
+
+ROLES_GLOBALES = ('Admin', 'Torre Control', 'Coordinador EPI')
+ROLES_POR_CICLO = ('Referente', 'Visualizador')
+# Ven la bandeja, KPIs y actas de todos los casos, pero no abren la ficha (ver_caso -> 403)
+ROLES_SIN_FICHA = ('Coordinador EPI',)
+
+# ---------------------------------------------------------
+# ALCANCE DE LA PETICIÓN
+# ---------------------------------------------------------
+
+class Alcance:
+    """
+    Qué casos puede ver el usuario:
+    - filtros(): condiciones SQL para Caso.query.filter(*...)
+    - puede_ver(caso): la misma regla en memoria, sin consultas
+    - puede_abrir(caso): además, si puede entrar a la ficha del caso (ver_caso)
+    """
+
+    def __init__(self, usuario_id, rol):
+        self.usuario_id = usuario_id
+        self.rol = rol
+        self.es_global = rol in ROLES_GLOBALES
+        self.ciclos_propios = []        # [(id, nombre)]
+        self.ciclos_subrogados = []     # [(id, nombre)] del titular al que subroga
+        self.ciclo_ids = frozenset()
+
+        if rol in ROLES_POR_CICLO:
+            # Ciclos desde la foto de sesión cacheada (utils/sesion.py): sin lazy loads
+            datos = datos_sesion(usuario_id) or {}
+            self.ciclos_propios = [tuple(c) for c in datos.get('ciclos_propios', [])]
+            self.ciclos_subrogados = [tuple(c) for c in datos.get('ciclos_subrogados', [])]
+            self.ciclo_ids = frozenset(c_id for c_id, _ in self.ciclos_propios + self.ciclos_subrogados)
+
+        # Globales y por ciclo leen el dashboard desde la tabla resumen (TS/Coord filtran por asignación)
+        self.usa_resumen = self.es_global or rol in ROLES_POR_CICLO
+
+        # Solicitante (u otro rol) no tiene bandeja
+        self.permitido = self.es_global or rol in ROLES_POR_CICLO or rol in ('Trabajador(a) Social', 'Coordinador Ciclo')
+
+    def filtros(self):
+        if self.es_global:
+            return []
+        if self.rol in ROLES_POR_CICLO:
+            return [Caso.ciclo_vital_id.in_(sorted(self.ciclo_ids))] if self.ciclo_ids else []
+        if self.rol == 'Trabajador(a) Social':
+            # Columna nueva de TS o la legacy (mientras dure la migración)
+            return [or_(Caso.asignado_ts_id == self.usuario_id, Caso.asignado_a_usuario_id == self.usuario_id)]
+        if self.rol == 'Coordinador Ciclo':
+            return [Caso.asignado_coord_id == self.usuario_id]
+        return [false()]
+
+    def clave(self):
+        """Identifica el universo de casos visible: usuarios con el mismo alcance comparten caché."""
+        if self.usa_resumen:
+            return ('ciclos', tuple(sorted(self.ciclo_ids)))
+        return (self.rol, self.usuario_id)
+
+    def etiquetas(self):
+        """Etiquetas de caché de ese universo: un cambio en un caso invalida solo lo que lo incluye."""
+        if self.usa_resumen:
+            return [f'ciclo:{c}' for c in sorted(self.ciclo_ids)] or ['casos:todos']
+        return [f'asignado:{self.usuario_id}']
+
+    def puede_ver(self, caso):
+        if self.es_global:
+            return True
+        if self.rol in ROLES_POR_CICLO:
+            return not self.ciclo_ids or caso.ciclo_vital_id in self.ciclo_ids
+        if self.rol == 'Trabajador(a) Social':
+            return self.usuario_id in (caso.asignado_ts_id, caso.asignado_a_usuario_id)
+        if self.rol == 'Coordinador Ciclo':
+            return caso.asignado_coord_id == self.usuario_id
+        return False
+
+    def puede_abrir(self, caso):
+        return self.rol not in ROLES_SIN_FICHA and self.puede_ver(caso)
+
+def etiquetas_caso(ciclo_ids, usuario_ids):
+    """Etiquetas a invalidar cuando cambia un caso (valores de antes y después del cambio)."""
+    return {'casos:todos',
+            *(f'ciclo:{c}' for c in ciclo_ids if c),
+            *(f'asignado:{u}' for u in usuario_ids if u)}
+
+def obtener_alcance():
+    """Alcance del usuario actual, calculado una vez por petición (g.alcance)."""
+    alcance = g.get('alcance')
+    if alcance is None or alcance.usuario_id != current_user.id:
+        alcance = g.alcance = Alcance(current_user.id, current_user.rol.nombre)
+    return alcance
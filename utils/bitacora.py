@@ -0,0 +1,140 @@
+import atexit
+import queue
+import threading
+import time
+from flask import g, has_request_context
+from sqlalchemy import insert
+from models import db, Log
+
+# ---------------------------------------------------------
+# DURABILIDAD POR ACCIÓN
+# ---------------------------------------------------------
+# - 'inmediata': INSERT propio en el momento (alertas de seguridad: no puede perderse
+#                aunque la petición termine en error).
+# - 'solicitud': se acumula en la petición y se escribe en UN insert masivo al final
+#                (teardown). Es el valor por defecto.
+# - 'asincrona': se entrega a un hilo escritor que agrupa eventos de varias peticiones
+#                (alto volumen: logins). Si el proceso muere, puede perder el último lote.
+DURABILIDAD_POR_DEFECTO = 'solicitud'
+DURABILIDAD_ACCIONES = {
+    'Seguridad': 'inmediata',
+    'Inicio de Sesión': 'asincrona',
+    'Login Fallido': 'asincrona',
+    'Cierre de Sesión': 'asincrona',
+    'Cierre de Sesión Automático': 'asincrona',
+}
+
+MAX_COLA = 10000            # Eventos asíncronos en memoria; si se llena, pasan a 'solicitud'
+TAMANO_LOTE = 200           # Filas por INSERT del hilo escritor
+ESPERA_LOTE = 1.0           # Segundos (desde el primer evento) que el escritor junta antes de escribir
+
+_cola = queue.Queue(maxsize=MAX_COLA)
+_escritor = []
+_lock_escritor = threading.Lock()
+
+# ---------------------------------------------------------
+# 1) ESCRITURA
+# ---------------------------------------------------------
+
+def _insertar(filas):
+    """
+    INSERT masivo en una conexión propia: no hace flush ni commit de la sesión de la
+    petición (lo pendiente de la ruta no se persiste por accidente). Requiere app context.
+    """
+    with db.engine.begin() as conn:
+        conn.execute(insert(Log), filas)
+
+def _escribir_o_avisar(filas):
+    try:
+        _insertar(filas)
+    except Exception as e:
+        # Igual que antes: un fallo de logging nunca rompe el flujo de la petición
+        print(f"Error al registrar log ({len(filas)} eventos): {e}")
+
+# ---------------------------------------------------------
+# 2) ENTRADA (la usa helpers.registrar_log)
+# ---------------------------------------------------------
+
+def encolar_log(fila, durabilidad=None):
+    """Despacha una fila de 'logs' según su durabilidad (explícita o la configurada para la acción)."""
+    durabilidad = durabilidad or DURABILIDAD_ACCIONES.get(fila['accion'], DURABILIDAD_POR_DEFECTO)
+
+    if durabilidad == 'asincrona' and _escritor:
+        try:
+            _cola.put_nowait(fila)
+            return
+        except queue.Full:
+            durabilidad = 'solicitud'
+
+    # Fuera de una petición (CLI, hilos de colas) no hay teardown: se escribe al tiro
+    if durabilidad == 'inmediata' or not has_request_context():
+        _escribir_o_avisar([fila])
+        return
+
+    if 'logs_pendientes' not in g:
+        g.logs_pendientes = []
+    g.logs_pendientes.append(fila)
+
+def vaciar_logs_solicitud(exc=None):
+    """teardown_request: escribe los logs acumulados de la petición (aunque haya terminado en error)."""
+    filas = g.pop('logs_pendientes', None)
+    if filas:
+        # La petición ya terminó: se libera su conexión antes de pedir la del INSERT
+        # (Flask-SQLAlchemy la soltaría recién en teardown_appcontext y el hilo ocuparía dos del pool)
+        db.session.remove()
+        _escribir_o_avisar(filas)
+
+# ---------------------------------------------------------
+# 3) HILO ESCRITOR (eventos 'asincrona')
+# ---------------------------------------------------------
+
+def _tomar_lote():
+    """Bloquea hasta el primer evento y junta lo que llegue en ESPERA_LOTE (máx TAMANO_LOTE)."""
+    lote = [_cola.get()]
+    limite = time.monotonic() + ESPERA_LOTE
+    try:
+        while len(lote) < TAMANO_LOTE:
+            lote.append(_cola.get(timeout=max(limite - time.monotonic(), 0)))
+    except queue.Empty:
+        pass
+    return lote
+
+def _drenar(app):
+    """Escribe todo lo que quede en la cola (al apagar el proceso)."""
+    lote = []
+    while True:
+        try:
+            lote.append(_cola.get_nowait())
+        except queue.Empty:
+            break
+    if lote:
+        with app.app_context():
+            _escribir_o_avisar(lote)
+
+def _bucle_escritor(app):
+    while True:
+        lote = _tomar_lote()
+        try:
+            with app.app_context():
+                _insertar(lote)
+        except Exception as e:
+            print(f"Error en escritor de logs: {len(lote)} eventos perdidos: {e}")
+
+def iniciar_bitacora(app):
+    """Registra el vaciado de logs al final de cada petición."""
+    app.teardown_request(vaciar_logs_solicitud)
+
+def iniciar_escritor_logs(app):
+    """Levanta (una vez por proceso) el hilo que escribe los eventos de alto volumen."""
+    if _escritor:
+        return
+
+    with _lock_escritor:
+        if _escritor:
+            return
+        hilo = threading.Thread(target=_bucle_escritor, args=(app,), name="logs", daemon=True)
+        hilo.start()
+        _escritor.append(hilo)
+
+    # Al salir del proceso (reinicio/deploy) escribimos lo que quedó en memoria
+    atexit.register(_drenar, app)
@@ -0,0 +1,183 @@
+import re
+import unicodedata
+from sqlalchemy import event, inspect, select, insert, union, or_, and_, false, literal
+from sqlalchemy.dialects.mysql import match
+from models import db, Caso, CasoBusqueda
+from utils.rut import es_rut_valido
+
+# Campos de Caso que alimentan el índice de búsqueda
+CAMPOS_BUSQUEDA = ('folio_atencion', 'origen_nombres', 'origen_apellidos', 'acompanante_nombre',
+                   'paciente_doc_numero', 'origen_rut')
+
+# InnoDB ignora palabras cortas (innodb_ft_min_token_size = 3) y su lista de stopwords
+# incluye algunas frecuentes en apellidos ("de", "la", "en"): esas van por LIKE.
+LARGO_MINIMO_FTS = 3
+STOPWORDS_FTS = {'de', 'la', 'en', 'and', 'the', 'und', 'www', 'com'}
+
+RE_NO_ALFANUM = re.compile(r'[^0-9a-z]+')
+RE_NO_DOCUMENTO = re.compile(r'[^0-9A-Z]')
+RE_FOLIO = re.compile(r'^(?=.*\d)[0-9A-Z][0-9A-Z\-_/]*$')
+
+# ---------------------------------------------------------
+# 1) NORMALIZACIÓN
+# ---------------------------------------------------------
+
+def normalizar_texto(valor):
+    """'José  Pérez-Soto' -> 'jose perez soto' (minúsculas, sin tildes, solo letras/dígitos)."""
+    if not valor:
+        return ''
+    sin_tildes = unicodedata.normalize('NFKD', str(valor)).encode('ascii', 'ignore').decode('ascii')
+    return RE_NO_ALFANUM.sub(' ', sin_tildes.lower()).strip()
+
+def normalizar_documento(valor):
+    """'12.345.678-k' -> '12345678K'."""
+    if not valor:
+        return ''
+    return RE_NO_DOCUMENTO.sub('', str(valor).upper())
+
+def _valores_busqueda(nombres, apellidos, acompanante, folio, doc_numero, origen_rut):
+    return {
+        'folio': (folio or '').strip().upper()[:50] or None,
+        'documento': normalizar_documento(doc_numero or origen_rut)[:50] or None,
+        'texto': ' '.join(filter(None, (
+            normalizar_texto(nombres), normalizar_texto(apellidos), normalizar_texto(acompanante)
+        ))),
+    }
+
+def valores_de_campos(campos):
+    """Columnas de busqueda_casos a partir de un dict de columnas de Caso (ingreso masivo)."""
+    return _valores_busqueda(campos.get('origen_nombres'), campos.get('origen_apellidos'), campos.get('acompanante_nombre'),
+                             campos.get('folio_atencion'), campos.get('paciente_doc_numero'), campos.get('origen_rut'))
+
+def _valores_caso(caso):
+    return _valores_busqueda(caso.origen_nombres, caso.origen_apellidos, caso.acompanante_nombre,
+                             caso.folio_atencion, caso.paciente_doc_numero, caso.origen_rut)
+
+# ---------------------------------------------------------
+# 2) SINCRONÍA (misma transacción que el INSERT/UPDATE del caso)
+# ---------------------------------------------------------
+
+def _aplicar(caso):
+    valores = _valores_caso(caso)
+    if caso.busqueda is None:
+        caso.busqueda = CasoBusqueda(**valores)
+    else:
+        for campo, valor in valores.items():
+            setattr(caso.busqueda, campo, valor)
+
+@event.listens_for(db.session, 'before_flush')
+def _sincronizar_busqueda(session, flush_context, instances):
+    """Crea o actualiza la fila de 'busqueda_casos' cuando cambia algún campo buscable."""
+    for obj in session.new:
+        if isinstance(obj, Caso):
+            _aplicar(obj)
+
+    for obj in session.dirty:
+        if isinstance(obj, Caso):
+            estado = inspect(obj)
+            if any(estado.attrs[c].history.has_changes() for c in CAMPOS_BUSQUEDA):
+                _aplicar(obj)
+
+# ---------------------------------------------------------
+# 3) CLASIFICACIÓN Y FILTRO
+# ---------------------------------------------------------
+
+def clasificar_busqueda(termino):
+    """
+    Decide cómo buscar según la forma del término:
+    - 'rut':    RUT válido (módulo 11) -> documento exacto
+    - 'numero': solo dígitos           -> folio o documento por prefijo (RUT a medio escribir)
+    - 'folio':  código con dígitos     -> folio por prefijo (o nombre, vía UNION)
+    - 'nombre': cualquier otra cosa    -> texto completo (FULLTEXT en MySQL)
+    Retorna (tipo, valor_normalizado).
+    """
+    termino = (termino or '').strip()
+    compacto = normalizar_documento(termino)
+
+    if ' ' not in termino and len(compacto) >= 8 and es_rut_valido(compacto):
+        return 'rut', compacto
+    if compacto.isdigit():
+        return 'numero', compacto
+    if RE_FOLIO.match(termino.upper()):
+        return 'folio', termino.upper()
+    return 'nombre', normalizar_texto(termino)
+
+def _condicion_texto(texto):
+    tokens = texto.split()
+    if not tokens:
+        return false()
+
+    if db.engine.dialect.name == 'mysql':
+        largos = [t for t in tokens if len(t) >= LARGO_MINIMO_FTS and t not in STOPWORDS_FTS]
+        cortos = [t for t in tokens if t not in largos]
+        condiciones = []
+        if largos:
+            # Modo booleano: todas las palabras obligatorias (+) y por prefijo (*)
+            condiciones.append(match(CasoBusqueda.texto, against=' '.join(f'+{t}*' for t in largos)).in_boolean_mode())
+        condiciones.extend(CasoBusqueda.texto.contains(t, autoescape=True) for t in cortos)
+        return and_(*condiciones)
+
+    # Respaldo (SQLite / otros): cada palabra debe comenzar alguna palabra del texto
+    texto_con_borde = literal(' ') + CasoBusqueda.texto
+    return and_(*[texto_con_borde.contains(f' {t}', autoescape=True) for t in tokens])
+
+def _prefijo(columna, valor):
+    """LIKE 'valor%' con patrón literal (no concat()), para que MySQL use el índice B-tree."""
+    escapado = valor.replace('/', '//').replace('%', '/%').replace('_', '/_')
+    return columna.like(f'{escapado}%', escape='/')
+
+def filtro_busqueda(termino):
+    """
+    Condición para Caso.query.filter(...) según el tipo de término.
+    Busca en 'busqueda_casos' (indexada) en vez de 6 ILIKE '%...%' sobre 'casos'.
+    """
+    tipo, valor = clasificar_busqueda(termino)
+
+    if tipo == 'rut':
+        condicion = or_(CasoBusqueda.documento == valor, _prefijo(CasoBusqueda.folio, valor))
+    elif tipo == 'numero':
+        condicion = or_(_prefijo(CasoBusqueda.folio, valor),
+                        _prefijo(CasoBusqueda.documento, valor))
+    elif tipo == 'folio':
+        # Un código alfanumérico también puede ser parte de un nombre: UNION para que
+        # cada rama use su propio índice (un OR con MATCH obliga a recorrer la tabla)
+        codigo = select(CasoBusqueda.caso_id).where(or_(
+            _prefijo(CasoBusqueda.folio, valor),
+            CasoBusqueda.documento == normalizar_documento(valor)
+        ))
+        nombre = select(CasoBusqueda.caso_id).where(_condicion_texto(normalizar_texto(valor)))
+        return Caso.id.in_(union(codigo, nombre))
+    else:
+        condicion = _condicion_texto(valor)
+
+    return Caso.id.in_(select(CasoBusqueda.caso_id).where(condicion))
+
+# ---------------------------------------------------------
+# 4) RECONSTRUCCIÓN (carga inicial / reparación)
+# ---------------------------------------------------------
+
+def reconstruir_busqueda(lote=1000):
+    """Regenera 'busqueda_casos' completa desde 'casos'. Retorna cuántos casos indexó."""
+    columnas = (Caso.id, Caso.origen_nombres, Caso.origen_apellidos, Caso.acompanante_nombre,
+                Caso.folio_atencion, Caso.paciente_doc_numero, Caso.origen_rut)
+
+    db.session.query(CasoBusqueda).delete(synchronize_session=False)
+
+    # Paginación por id (keyset): no dejamos un cursor abierto mientras insertamos
+    total = 0
+    ultimo_id = 0
+    while True:
+        filas = db.session.execute(
+            select(*columnas).where(Caso.id > ultimo_id).order_by(Caso.id).limit(lote)
+        ).all()
+        if not filas:
+            break
+
+        db.session.execute(insert(CasoBusqueda), [
+            {'caso_id': fila[0], **_valores_busqueda(*fila[1:])} for fila in filas
+        ])
+        total += len(filas)
+        ultimo_id = filas[-1][0]
+
+    db.session.commit()
+    return total
@@ -0,0 +1,162 @@
+# utils/cache_http.py
+# Política de caché HTTP: estáticos con huella de contenido (inmutables), 'no-store' en las páginas
+# de la app (pacientes, bitácora, usuarios, claves) y ETag/304 solo para fragmentos marcados como revalidables.
+import os
+import hashlib
+import threading
+from flask import g, request, has_request_context
+from werkzeug.security import safe_join
+from utils.metricas import incrementar
+
+# Políticas por vista
+SIN_ALMACENAR = 'sin_almacenar'   # Datos sensibles: ni el navegador ni proxies guardan copia
+REVALIDAR = 'revalidar'           # Copia privada que se valida con ETag en cada uso (304 si no cambió)
+
+# Blueprints cuyas vistas no se guardan: datos de pacientes (bandeja, fichas, actas, exportaciones, ingreso),
+# bitácora y usuarios (admin) y login / cambio y reseteo de clave (auth)
+BLUEPRINTS_SIN_ALMACENAR = {'casos', 'solicitudes', 'admin', 'auth'}
+
+# Estáticos pedidos con su huella (?v=...): el contenido de esa URL no cambia nunca
+DURACION_INMUTABLE = 365 * 24 * 3600
+
+_lock = threading.Lock()
+_huellas = {}       # filename -> (mtime, huella, bytes)
+
+# ---------------------------------------------------------
+# 1) HUELLA DE LOS ESTÁTICOS
+# ---------------------------------------------------------
+
+def _huella(carpeta, filename):
+    """(huella, bytes) del archivo, recalculada solo si cambió su mtime. None si no existe."""
+    ruta = safe_join(carpeta, filename)
+    if ruta is None:
+        return None
+    try:
+        mtime = os.stat(ruta).st_mtime
+    except OSError:
+        return None
+    actual = _huellas.get(filename)
+    if actual and actual[0] == mtime:
+        return actual[1], actual[2]
+    with open(ruta, 'rb') as f:
+        contenido = f.read()
+    valor = (mtime, hashlib.sha256(contenido).hexdigest()[:12], len(contenido))
+    with _lock:
+        _huellas[filename] = valor
+    return valor[1], valor[2]
+
+# ---------------------------------------------------------
+# 2) POLÍTICA POR VISTA
+# ---------------------------------------------------------
+
+def politica_cache(politica):
+    """
+    Fija la política de una vista, por sobre la de su blueprint (va justo sobre el 'def').
+    Ej: un JSON de KPIs agregados dentro de 'casos' (sin datos de pacientes) -> REVALIDAR.
+    """
+    def decorador(vista):
+        # Atributo en la función: los decoradores externos (login_required) lo copian con @wraps
+        vista.politica_cache = politica
+        return vista
+    return decorador
+
+def _politica(app):
+    vista = app.view_functions.get(request.endpoint)
+    politica = getattr(vista, 'politica_cache', None)
+    if politica:
+        return politica
+    return SIN_ALMACENAR if request.blueprint in BLUEPRINTS_SIN_ALMACENAR else REVALIDAR
+
+# ---------------------------------------------------------
+# 3) ENCABEZADOS
+# ---------------------------------------------------------
+
+def _cache_estatico(app, response):
+    filename = (request.view_args or {}).get('filename', '')
+    datos = _huella(app.static_folder, filename)
+    if datos is None:
+        return response
+    huella, tamano = datos
+
+    cc = response.cache_control
+    cc.public = True
+    if request.args.get('v') == huella:
+        cc.max_age = DURACION_INMUTABLE
+        cc.immutable = True
+        cc.no_cache = None
+    else:
+        # Sin huella (o una antigua): se revalida con el ETag de send_file
+        cc.max_age = 0
+        cc.no_cache = True
+
+    if response.status_code == 304:
+        incrementar('cache_304_total', endpoint='static')
+        incrementar('cache_bytes_304_total', cantidad=tamano, endpoint='static')
+    return response
+
+def _cache_vista(app, response):
+    politica = _politica(app)
+    cc = response.cache_control
+
+    if politica == SIN_ALMACENAR:
+        cc.no_store = True
+        cc.no_cache = True
+        cc.must_revalidate = True
+        cc.private = True
+        cc.max_age = 0
+        # Navegadores/proxies HTTP/1.0
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
+    else:
+        cc.private = True
+        cc.no_cache = True
+        if (request.method in ('GET', 'HEAD') and response.status_code == 200
+                and not response.is_streamed and not response.direct_passthrough):
+            tamano = response.content_length or 0
+            response.add_etag()     # ETag fuerte: hash del cuerpo
+            response.make_conditional(request)
+            if response.status_code == 304:
+                endpoint = request.endpoint or 'sin_ruta'
+                incrementar('cache_304_total', endpoint=endpoint)
+                incrementar('cache_bytes_304_total', cantidad=tamano, endpoint=endpoint)
+
+    _registrar_estaticos_pagina(response)
+    return response
+
+def _registrar_estaticos_pagina(response):
+    """Bytes de estáticos inmutables de la página: lo que NO se vuelve a descargar en la próxima visita."""
+    estaticos = g.pop('cache_estaticos', None)
+    if not estaticos or response.status_code != 200 or response.mimetype != 'text/html':
+        return
+    endpoint = request.endpoint or 'sin_ruta'
+    incrementar('cache_paginas_total', endpoint=endpoint)
+    incrementar('cache_bytes_estaticos_total', cantidad=sum(estaticos.values()), endpoint=endpoint)
+
+# ---------------------------------------------------------
+# 4) INICIALIZACIÓN
+# ---------------------------------------------------------
+
+def iniciar_cache_http(app):
+    """
+    - url_for('static', filename=...) agrega ?v=<huella del contenido>: cache de un año
+      ('immutable') y un archivo modificado cambia de URL solo.
+    - Vistas: 'no-store' en los blueprints de BLUEPRINTS_SIN_ALMACENAR; ETag + 304 (privado,
+      revalidar siempre) en las marcadas con @politica_cache(REVALIDAR) y las que no tienen blueprint.
+    """
+
+    @app.url_defaults
+    def _version_estatica(endpoint, values):
+        if endpoint != 'static' or 'v' in values:
+            return
+        datos = _huella(app.static_folder, values.get('filename', ''))
+        if datos is None:
+            return
+        values['v'] = datos[0]
+        if has_request_context():
+            g.setdefault('cache_estaticos', {})[values['filename']] = datos[1]
+
+    @app.after_request
+    def _aplicar_politica_cache(response):
+        if request.endpoint == 'static':
+            return _cache_estatico(app, response)
+        return _cache_vista(app, response)
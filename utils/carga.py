@@ -0,0 +1,528 @@
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, time as dtime
+from sqlalchemy import event, insert, select, func
+from models import (db, Rol, Usuario, CatalogoCiclo, CatalogoRecinto, CatalogoVulneracion, CatalogoInstitucion,
+                    CatalogoEstablecimiento, Caso, CasoGestion, AuditoriaCaso, Log, CARGA_ACTA)
+from reloj import RelojFijo, usar_reloj
+
+try:
+    import resource         # Unix: memoria máxima del proceso
+except ImportError:         # Windows
+    resource = None
+
+# "Hoy" de los datos sintéticos y de las corridas: mismas ventanas del dashboard en cada ejecución
+FECHA_BASE = datetime(2025, 6, 30, 10, 0)
+DIAS_HISTORIA = 730
+CLAVE_BENCHMARK = 'Benchmark123'
+DOMINIO = 'benchmark.redprotege.test'
+TAMANO_LOTE = 5000          # Filas por executemany (gestiones, auditorías, logs)
+
+CICLOS = ('Infantil', 'Adolescente', 'Adulto', 'Adulto Mayor')
+RECINTOS = ('CESFAM Norte', 'CESFAM Sur', 'CESFAM Pedro Pulgar', 'CESFAM Santa Rosa', 'CECOSF El Boro',
+            'SAPU Norte', 'SAR Sur', 'Hospital Alto Hospicio', 'Otro')
+VULNERACIONES = ('Maltrato físico', 'Maltrato psicológico', 'Abuso sexual', 'Negligencia', 'Abandono',
+                 'Violencia intrafamiliar', 'Trabajo infantil', 'Otro')
+INSTITUCIONES = ('Carabineros', 'PDI', 'Fiscalía', 'Tribunal de Familia', 'OPD', 'Otro')
+ESTABLECIMIENTOS = ('CESFAM Norte', 'CESFAM Sur', 'CESFAM Pedro Pulgar', 'CESFAM Santa Rosa', 'CECOSF El Boro', 'Otro')
+
+NOMBRES = ('Sofía', 'Mateo', 'Isidora', 'Benjamín', 'Florencia', 'Agustín', 'Josefa', 'Vicente', 'Emilia', 'Tomás',
+           'Martina', 'Joaquín', 'Catalina', 'Maximiliano', 'Antonella', 'Lucas', 'Javiera', 'Gaspar', 'Trinidad',
+           'Alonso', 'María José', 'Juan Pablo', 'Fernanda', 'Cristóbal', 'Valentina', 'Ignacio', 'Rosa', 'Luis')
+APELLIDOS = ('González', 'Muñoz', 'Rojas', 'Díaz', 'Pérez', 'Soto', 'Contreras', 'Silva', 'Martínez', 'Sepúlveda',
+             'Morales', 'Rodríguez', 'López', 'Fuentes', 'Hernández', 'Torres', 'Araya', 'Flores', 'Espinoza',
+             'Valenzuela', 'Castillo', 'Tapia', 'Reyes', 'Gutiérrez', 'Castro', 'Pizarro', 'Álvarez', 'Vásquez')
+OBSERVACIONES = ('Se realiza contacto telefónico con la familia.', 'Visita domiciliaria sin moradores.',
+                 'Se coordina hora con psicólogo del CESFAM.', 'Se deriva a OPD.', 'Control sanitario al día.',
+                 'Se cita a tutor para entrevista.', 'Familia no asiste a citación.', 'Se envía oficio a tribunal.')
+
+# Usuarios por rol (Referente, Visualizador y Coordinador Ciclo quedan con ciclos asignados)
+USUARIOS_POR_ROL = {
+    'Admin': 2, 'Torre Control': 2, 'Coordinador EPI': 1, 'Referente': 4, 'Visualizador': 2,
+    'Trabajador(a) Social': 20, 'Coordinador Ciclo': 4, 'Solicitante': 10,
+}
+
+# ---------------------------------------------------------
+# 1) GENERADOR DE DATOS SINTÉTICOS
+# ---------------------------------------------------------
+
+def email_benchmark(rol, i=0):
+    slug = rol.lower().replace('(', '').replace(')', '').replace(' ', '-')
+    return f"{slug}.{i}@{DOMINIO}"
+
+def _rut(cuerpo):
+    from utils.rut import calcular_dv
+    return f"{cuerpo}-{calcular_dv(str(cuerpo))}"
+
+def _catalogo(modelo, nombres):
+    filas = [modelo(nombre=n) for n in nombres]
+    db.session.add_all(filas)
+    return filas
+
+def _sembrar_base():
+    """Roles, catálogos y usuarios de todos los roles (ORM: son pocas filas)."""
+    roles = {nombre: Rol(nombre=nombre) for nombre in USUARIOS_POR_ROL}
+    db.session.add_all(roles.values())
+    ciclos = _catalogo(CatalogoCiclo, CICLOS)
+    recintos = _catalogo(CatalogoRecinto, RECINTOS)
+    vulneraciones = _catalogo(CatalogoVulneracion, VULNERACIONES)
+    _catalogo(CatalogoInstitucion, INSTITUCIONES)
+    establecimientos = _catalogo(CatalogoEstablecimiento, ESTABLECIMIENTOS)
+
+    usuarios = {}
+    for rol, cantidad in USUARIOS_POR_ROL.items():
+        for i in range(cantidad):
+            u = Usuario(nombre_completo=f"{rol} {i + 1}", email=email_benchmark(rol, i), rol=roles[rol],
+                        activo=True, cambio_clave_requerido=False)
+            u.set_password(CLAVE_BENCHMARK)
+            if rol in ('Referente', 'Visualizador', 'Coordinador Ciclo'):
+                u.ciclos = [ciclos[i % len(ciclos)]]
+            db.session.add(u)
+            usuarios.setdefault(rol, []).append(u)
+
+    db.session.commit()
+    return {
+        'ciclos': [c.id for c in ciclos],
+        'recintos': [r.id for r in recintos],
+        'vulneraciones': [v.id for v in vulneraciones],
+        'establecimientos': [e.id for e in establecimientos],
+        'usuarios': {rol: [u.id for u in lista] for rol, lista in usuarios.items()},
+    }
+
+def _estado(azar, antiguedad):
+    """Los casos antiguos están mayoritariamente cerrados; los recientes, pendientes."""
+    r = azar.random()
+    if r < 0.04:
+        return 'ANULADO'
+    if antiguedad > 180:
+        return 'CERRADO' if r < 0.85 else 'EN_SEGUIMIENTO'
+    if antiguedad > 30:
+        return 'CERRADO' if r < 0.40 else ('EN_SEGUIMIENTO' if r < 0.85 else 'PENDIENTE_RESCATAR')
+    return 'PENDIENTE_RESCATAR' if r < 0.55 else ('EN_SEGUIMIENTO' if r < 0.90 else 'CERRADO')
+
+def _caso_sintetico(azar, i, ids, pacientes):
+    antiguedad = int(DIAS_HISTORIA * azar.random() ** 1.5)        # Más casos recientes que antiguos
+    ingreso = FECHA_BASE - timedelta(days=antiguedad, minutes=azar.randint(0, 600))
+    estado = _estado(azar, antiguedad)
+    ciclo = azar.choice(ids['ciclos'])
+    ts = azar.choice(ids['usuarios']['Trabajador(a) Social'])
+    coord = ids['usuarios']['Coordinador Ciclo'][ids['ciclos'].index(ciclo) % len(ids['usuarios']['Coordinador Ciclo'])]
+    asignado = estado != 'PENDIENTE_RESCATAR'
+
+    # ~30% de los casos son de un paciente que ya tenía otra derivación
+    rut_paciente, nombres, apellidos, nacimiento = azar.choice(pacientes) if pacientes and azar.random() < 0.3 \
+        else (_rut(azar.randint(15_000_000, 27_999_999)), azar.choice(NOMBRES),
+              f"{azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}", (ingreso - timedelta(days=azar.randint(30, 30000))).date())
+    pacientes.append((rut_paciente, nombres, apellidos, nacimiento))
+
+    campos = {
+        'fecha_atencion': ingreso.date(),
+        'hora_atencion': dtime(ingreso.hour, ingreso.minute),
+        'recinto_notifica_id': azar.choice(ids['recintos']),
+        'folio_atencion': f"{100000 + i}",
+        'ingresado_por_nombre': f"Solicitante {azar.randint(1, 10)}",
+        'ingresado_por_cargo': 'Enfermera/o',
+        'origen_rut': None,
+        'origen_nombres': nombres,
+        'origen_apellidos': apellidos,
+        'origen_relato': "Relato sintético del caso para pruebas de carga. " * azar.randint(1, 6),
+        'paciente_doc_tipo': 'RUT',
+        'paciente_doc_numero': rut_paciente,
+        'paciente_fecha_nacimiento': nacimiento,
+        'paciente_domicilio': f"Pasaje {azar.choice(APELLIDOS)} {azar.randint(1, 3000)}",
+        'acompanante_nombre': f"{azar.choice(NOMBRES)} {azar.choice(APELLIDOS)}" if azar.random() < 0.4 else None,
+        'acompanante_presente': False,
+        'recinto_inscrito_id': azar.choice(ids['establecimientos']) if azar.random() < 0.8 else None,
+        'ciclo_vital_id': ciclo,
+        'estado': estado,
+        'fecha_ingreso': ingreso,
+        'updated_at': ingreso,
+        'asignado_ts_id': ts if asignado else None,
+        'asignado_coord_id': coord if asignado and azar.random() < 0.6 else None,
+        'asignado_at': ingreso + timedelta(hours=azar.randint(1, 72)) if asignado else None,
+        'fecha_cierre': ingreso + timedelta(days=azar.randint(5, 120)) if estado == 'CERRADO' else None,
+        'usuario_cierre_id': ts if estado == 'CERRADO' else None,
+    }
+    vulneraciones = azar.sample(ids['vulneraciones'], azar.randint(1, 3))
+    return (i, campos, vulneraciones)
+
+def _insertar_por_lotes(conn, tabla, filas):
+    for inicio in range(0, len(filas), TAMANO_LOTE):
+        conn.execute(insert(tabla), filas[inicio:inicio + TAMANO_LOTE])
+
+def _sembrar_historial(conn, azar, casos, ids, gestiones_promedio):
+    """Bitácora, auditoría y logs de un bloque de casos ya insertados [(caso_id, campos)]."""
+    gestiones, auditorias, logs = [], [], []
+    admin = ids['usuarios']['Admin'][0]
+    for caso_id, c in casos:
+        logs.append({'timestamp': c['fecha_ingreso'], 'usuario_id': None, 'usuario_nombre': c['ingresado_por_nombre'],
+                     'accion': 'Ingreso Caso', 'detalles': f"Caso #{c['folio_atencion']} ingresado"})
+        if not c['asignado_ts_id']:
+            continue
+        auditorias.append({'caso_id': caso_id, 'usuario_id': admin, 'fecha_movimiento': c['asignado_at'],
+                           'accion': 'ASIGNACION_TS', 'detalles_cambio': {'ts_nuevo': c['asignado_ts_id']}})
+        for h in range(azar.randint(0, 2 * gestiones_promedio)):
+            gestiones.append({'caso_id': caso_id, 'usuario_id': c['asignado_ts_id'],
+                              'fecha_movimiento': c['asignado_at'] + timedelta(days=h * 3, hours=azar.randint(0, 8)),
+                              'observacion': azar.choice(OBSERVACIONES)})
+        if c['estado'] == 'CERRADO':
+            auditorias.append({'caso_id': caso_id, 'usuario_id': c['usuario_cierre_id'], 'fecha_movimiento': c['fecha_cierre'],
+                               'accion': 'CIERRE_CASO', 'detalles_cambio': {'motivo': 'Cierre manual por gestión finalizada'}})
+            logs.append({'timestamp': c['fecha_cierre'], 'usuario_id': c['usuario_cierre_id'], 'usuario_nombre': None,
+                         'accion': 'Cierre Caso', 'detalles': f"Caso #{c['folio_atencion']} cerrado"})
+
+    _insertar_por_lotes(conn, CasoGestion.__table__, gestiones)
+    _insertar_por_lotes(conn, AuditoriaCaso.__table__, auditorias)
+    _insertar_por_lotes(conn, Log.__table__, logs)
+    return len(gestiones), len(auditorias), len(logs)
+
+def sembrar_datos(casos=100_000, gestiones_promedio=3, semilla=42, informar=print):
+    """
+    Llena una BD VACÍA con volúmenes realistas: usuarios de todos los roles y ciclos, casos con
+    vulneraciones (mismo camino que el ingreso masivo: índice de búsqueda, huellas, pacientes y
+    resumen), bitácora, auditoría y logs. Determinista para una misma semilla.
+    Retorna dict con los totales.
+    """
+    from utils.importacion import insertar_casos
+    from utils.dashboard import reconstruir_resumen
+
+    azar = random.Random(semilla)
+    anterior = usar_reloj(RelojFijo(FECHA_BASE))
+    try:
+        db.create_all()
+        if db.session.query(Usuario.id).limit(1).first():
+            raise RuntimeError("La base de datos ya tiene datos: use una BD dedicada al benchmark (o --reiniciar).")
+
+        ids = _sembrar_base()
+        pacientes = []
+        totales = {'casos': 0, 'gestiones': 0, 'auditorias': 0, 'logs': 0}
+        bloque = 10_000
+        inicio = time.perf_counter()
+
+        for desde in range(0, casos, bloque):
+            validas = [_caso_sintetico(azar, i, ids, pacientes) for i in range(desde, min(desde + bloque, casos))]
+            insertados = insertar_casos(validas)
+            g, a, l = _sembrar_historial(db.session.connection(), azar,
+                                         [(caso_id, campos) for _, caso_id, campos in insertados], ids, gestiones_promedio)
+            db.session.commit()
+            totales['casos'] += len(insertados)
+            totales['gestiones'] += g
+            totales['auditorias'] += a
+            totales['logs'] += l
+            informar(f"  {totales['casos']:>9,} casos ({time.perf_counter() - inicio:6.0f}s)")
+
+        # El ingreso masivo no registra el recinto inscrito en el resumen: se reconcilia una vez
+        reconstruir_resumen()
+        return totales
+    finally:
+        usar_reloj(anterior)
+
+# ---------------------------------------------------------
+# 2) ESCENARIOS (cliente de pruebas de Flask)
+# ---------------------------------------------------------
+
+class Escenario:
+    """
+    Una petición representativa. 'preparar(contexto, n)' retorna (método, url, datos) de la
+    iteración n; 'fraccion' reduce las repeticiones de los escenarios pesados (exportación).
+    """
+
+    def __init__(self, nombre, rol, preparar, fraccion=1.0):
+        self.nombre = nombre
+        self.rol = rol
+        self.preparar = preparar
+        self.fraccion = fraccion
+
+def _formulario(contexto, n):
+    azar = contexto['azar']
+    hoy = FECHA_BASE.date()
+    return 'POST', '/solicitudes/ingreso', {
+        'fecha_atencion': hoy.isoformat(), 'hora_atencion': '10:30',
+        'folio_atencion': f"BENCH-{n}-{azar.randint(0, 10**9)}",
+        'recinto_id': str(contexto['ids']['recintos'][0]), 'ciclo_id': str(contexto['ids']['ciclos'][0]),
+        'vulneraciones': [str(contexto['ids']['vulneraciones'][0])],
+        'relato_caso': 'Relato de prueba de carga.', 'funcionario_nombre': 'Benchmark', 'funcionario_cargo': 'Enfermera/o',
+        'paciente_nombres': azar.choice(NOMBRES), 'paciente_apellidos': azar.choice(APELLIDOS),
+        'paciente_doc_tipo': 'RUT', 'paciente_doc_numero': _rut(azar.randint(15_000_000, 27_999_999)),
+        'paciente_fecha_nac': '2015-03-01', 'confirmar_duplicado': '1',
+    }
+
+def _cerrar(contexto, n):
+    return 'POST', f"/casos/cerrar/{contexto['abiertos'].pop()}", {}
+
+ESCENARIOS = (
+    Escenario('bandeja', 'Admin', lambda c, n: ('GET', '/casos/', None)),
+    Escenario('bandeja_busqueda', 'Admin', lambda c, n: ('GET', f"/casos/?search={c['azar'].choice(APELLIDOS)}", None)),
+    Escenario('bandeja_rut', 'Admin', lambda c, n: ('GET', f"/casos/?search={c['azar'].choice(c['ruts'])}", None)),
+    Escenario('bandeja_estado', 'Admin', lambda c, n: ('GET', '/casos/?estado=EN_SEGUIMIENTO', None)),
+    Escenario('bandeja_pagina_5', 'Admin', lambda c, n: ('GET', f"/casos/?cursor={c['cursor_5']}", None)),
+    # Dashboard por separado (JSON, cacheado por alcance) y paginación sin dashboard
+    Escenario('dashboard_kpis', 'Admin', lambda c, n: ('GET', '/casos/api/kpis', None)),
+    Escenario('grafico_365_dias', 'Admin', lambda c, n: ('GET', '/casos/api/grafico/ingresos?ventana=365', None)),
+    Escenario('tabla_pagina_5', 'Admin', lambda c, n: ('GET', f"/casos/api/tabla?cursor={c['cursor_5']}", None)),
+    Escenario('bandeja_ts', 'Trabajador(a) Social', lambda c, n: ('GET', '/casos/', None)),
+    Escenario('bandeja_referente', 'Referente', lambda c, n: ('GET', '/casos/?ventana=30', None)),
+    Escenario('ver_caso', 'Admin', lambda c, n: ('GET', f"/casos/ver/{c['azar'].choice(c['casos'])}", None)),
+    Escenario('exportar_excel', 'Admin', lambda c, n: ('GET', '/casos/exportar?estado=PENDIENTE_RESCATAR', None), fraccion=0.1),
+    Escenario('cerrar_caso', 'Admin', _cerrar),
+    Escenario('formulario', 'Solicitante', _formulario),
+    Escenario('reporte_masivo', 'Admin', lambda c, n: ('POST', '/casos/enviar_reporte_masivo', {}), fraccion=0.2),
+)
+
+# ---------------------------------------------------------
+# 3) MEDICIÓN
+# ---------------------------------------------------------
+
+def percentil(valores, p):
+    """Percentil exacto (interpolación lineal) de una lista no vacía."""
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p
+    f = int(k)
+    c = min(f + 1, len(ordenados) - 1)
+    return ordenados[f] + (ordenados[c] - ordenados[f]) * (k - f)
+
+def rss_pico_mb():
+    """Memoria residente máxima del proceso (None en Windows)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return pico / (1024 * 1024) if pico > 1 << 32 else pico / 1024
+
+class _ContadorSQL:
+    def __init__(self, engine):
+        self.total = 0
+        event.listen(engine, 'after_cursor_execute', self._sumar)
+
+    def _sumar(self, *args):
+        self.total += 1
+
+def _resumen(tiempos, consultas, estados):
+    return {
+        'n': len(tiempos),
+        'p50_ms': percentil(tiempos, 0.50) * 1000,
+        'p95_ms': percentil(tiempos, 0.95) * 1000,
+        'p99_ms': percentil(tiempos, 0.99) * 1000,
+        'max_ms': max(tiempos) * 1000,
+        'consultas_prom': sum(consultas) / len(consultas),
+        'consultas_max': max(consultas),
+        'errores': sum(1 for e in estados if e >= 400),
+        'rss_pico_mb': rss_pico_mb(),
+    }
+
+def _contexto(app, semilla):
+    """Datos que necesitan los escenarios (ids existentes, RUTs reales, casos abiertos, cursor)."""
+    with app.app_context():
+        casos = list(db.session.execute(select(Caso.id).order_by(Caso.id.desc()).limit(5000)).scalars())
+        abiertos = list(db.session.execute(
+            select(Caso.id).where(Caso.estado.in_(['PENDIENTE_RESCATAR', 'EN_SEGUIMIENTO'])).order_by(Caso.id).limit(5000)
+        ).scalars())
+        ruts = list(db.session.execute(
+            select(Caso.paciente_doc_numero).where(Caso.paciente_doc_numero.isnot(None)).limit(2000)
+        ).scalars())
+        ids = {
+            'recintos': list(db.session.execute(select(CatalogoRecinto.id).order_by(CatalogoRecinto.id)).scalars()),
+            'ciclos': list(db.session.execute(select(CatalogoCiclo.id).order_by(CatalogoCiclo.id)).scalars()),
+            'vulneraciones': list(db.session.execute(select(CatalogoVulneracion.id).order_by(CatalogoVulneracion.id)).scalars()),
+        }
+        total = db.session.query(func.count(Caso.id)).scalar()
+    return {'azar': random.Random(semilla), 'casos': casos, 'abiertos': abiertos, 'ruts': ruts,
+            'ids': ids, 'total_casos': total, 'cursor_5': ''}
+
+def _cursor_pagina(cliente, paginas):
+    """Token de la página N de la bandeja (se sigue el enlace 'Siguiente' del HTML)."""
+    import re
+    cursor = ''
+    for _ in range(paginas - 1):
+        html = cliente.get(f"/casos/?cursor={cursor}").get_data(as_text=True)
+        enlaces = re.findall(r'cursor=([A-Za-z0-9_\-=%.]+)', html)
+        if not enlaces:
+            break
+        cursor = enlaces[-1]             # "Siguiente" va después de "Anterior"
+    return cursor
+
+def _medir_actas(app, casos_ids, contador):
+    """Generación del acta PDF en el proceso (lo que hace cada proceso hijo de la cola de actas)."""
+    from utils.pdf_actas import generar_acta_cierre_pdf
+    tiempos, consultas = [], []
+    with app.app_context(), tempfile.TemporaryDirectory() as carpeta:
+        for caso_id in casos_ids:
+            antes = contador.total
+            inicio = time.perf_counter()
+            caso = Caso.query.options(*CARGA_ACTA).filter_by(id=caso_id).one()
+            usuario = db.session.get(Usuario, caso.usuario_cierre_id)
+            generar_acta_cierre_pdf(caso, os.path.join(carpeta, f"{caso_id}.pdf"), usuario)
+            tiempos.append(time.perf_counter() - inicio)
+            consultas.append(contador.total - antes)
+            db.session.expunge_all()
+    return tiempos, consultas
+
+def ejecutar_benchmark(app, repeticiones=30, calentamiento=2, solo=None, semilla=7, informar=print):
+    """
+    Recorre los escenarios con el cliente de pruebas (SMTP nunca se toca: los correos solo
+    quedan en la cola, EMAIL_WORKERS=0). Retorna {escenario: métricas}.
+    Importante: no llamar dentro de un app_context de 'app' (g se compartiría entre peticiones).
+    """
+    from utils.metricas import reiniciar_metricas
+
+    anterior = usar_reloj(RelojFijo(FECHA_BASE))
+    try:
+        contexto = _contexto(app, semilla)
+        with app.app_context():
+            contador = _ContadorSQL(db.engine)
+
+        clientes = {}
+        def cliente_de(rol):
+            if rol not in clientes:
+                clientes[rol] = app.test_client()
+                respuesta = clientes[rol].post('/login', data={'email': email_benchmark(rol), 'password': CLAVE_BENCHMARK})
+                if respuesta.status_code != 302 or '/login' in respuesta.headers.get('Location', ''):
+                    raise RuntimeError(f"No se pudo iniciar sesión como {rol}: ¿la BD fue sembrada con 'sembrar-benchmark'?")
+            return clientes[rol]
+
+        contexto['cursor_5'] = _cursor_pagina(cliente_de('Admin'), 5)
+        reiniciar_metricas()
+        resultados = {}
+        cerrados = []
+
+        for escenario in ESCENARIOS:
+            if solo and escenario.nombre not in solo:
+                continue
+            cliente = cliente_de(escenario.rol)
+            n = max(3, int(repeticiones * escenario.fraccion))
+
+            tiempos, consultas, estados = [], [], []
+            for i in range(-calentamiento, n):
+                metodo, url, datos = escenario.preparar(contexto, i)
+                antes = contador.total
+                inicio = time.perf_counter()
+                respuesta = cliente.open(url, method=metodo, data=datos)
+                respuesta.get_data()         # Consume respuestas en streaming (CSV)
+                duracion = time.perf_counter() - inicio
+                if escenario.nombre == 'cerrar_caso':
+                    cerrados.append(int(url.rsplit('/', 1)[1]))
+                if i < 0:
+                    continue
+                tiempos.append(duracion)
+                consultas.append(contador.total - antes)
+                estados.append(respuesta.status_code)
+
+            resultados[escenario.nombre] = _resumen(tiempos, consultas, estados)
+            informar(formatear_fila(escenario.nombre, resultados[escenario.nombre]))
+
+        if cerrados and (not solo or 'acta_pdf' in solo):
+            tiempos, consultas = _medir_actas(app, cerrados[calentamiento:] or cerrados, contador)
+            resultados['acta_pdf'] = _resumen(tiempos, consultas, [])
+            informar(formatear_fila('acta_pdf', resultados['acta_pdf']))
+
+        return {'fecha': datetime.now().isoformat(timespec='seconds'), 'casos': contexto['total_casos'],
+                'repeticiones': repeticiones, 'escenarios': resultados}
+    finally:
+        usar_reloj(anterior)
+
+# ---------------------------------------------------------
+# 4) REPORTE Y COMPARACIÓN (detección de regresiones)
+# ---------------------------------------------------------
+
+ENCABEZADO = f"{'escenario':<20} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'máx ms':>9} {'SQL/pet':>8} {'SQL máx':>8} {'err':>4} {'RSS MB':>8}"
+
+def formatear_fila(nombre, r):
+    rss = f"{r['rss_pico_mb']:8.0f}" if r['rss_pico_mb'] is not None else f"{'n/d':>8}"
+    return (f"{nombre:<20} {r['n']:>4} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} {r['p99_ms']:9.1f} {r['max_ms']:9.1f} "
+            f"{r['consultas_prom']:8.1f} {r['consultas_max']:>8} {r['errores']:>4} {rss}")
+
+def guardar_resultados(resultados, ruta):
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2)
+
+def comparar_resultados(actual, ruta_base, tolerancia=0.25):
+    """
+    Compara contra una corrida guardada. Es regresión si el p95 empeora más que 'tolerancia'
+    (y más de 2 ms, para no alarmarse por ruido en escenarios muy rápidos) o si suben las consultas.
+    Retorna la lista de mensajes de regresión.
+    """
+    with open(ruta_base, encoding='utf-8') as f:
+        base = json.load(f)['escenarios']
+
+    regresiones = []
+    for nombre, r in actual['escenarios'].items():
+        previo = base.get(nombre)
+        if not previo:
+            continue
+        if r['p95_ms'] > previo['p95_ms'] * (1 + tolerancia) and r['p95_ms'] - previo['p95_ms'] > 2:
+            regresiones.append(f"{nombre}: p95 {previo['p95_ms']:.1f} -> {r['p95_ms']:.1f} ms")
+        if r['consultas_prom'] > previo['consultas_prom'] + 0.5:
+            regresiones.append(f"{nombre}: consultas/petición {previo['consultas_prom']:.1f} -> {r['consultas_prom']:.1f}")
+    return regresiones
+
+# ---------------------------------------------------------
+# 5) CARGA CONCURRENTE CONTRA UN SERVIDOR REAL (gunicorn / waitress)
+# ---------------------------------------------------------
+
+def _sesion_http(url_base, email, clave):
+    """Cliente HTTP con cookies y sesión iniciada (toma el csrf_token del formulario de login)."""
+    import re
+    import http.cookiejar
+    import urllib.parse
+    import urllib.request
+
+    abridor = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    html = abridor.open(f"{url_base}/login", timeout=30).read().decode('utf-8', 'replace')
+    datos = {'email': email, 'password': clave}
+    token = re.search(r'name="csrf_token" value="([^"]+)"', html)
+    if token:
+        datos['csrf_token'] = token.group(1)
+    respuesta = abridor.open(f"{url_base}/login", data=urllib.parse.urlencode(datos).encode(), timeout=30)
+    if respuesta.geturl().rstrip('/').endswith('/login'):
+        raise RuntimeError(f"No se pudo iniciar sesión como {email} en {url_base}")
+    return abridor
+
+def carga_concurrente(url_base, email, clave, rutas=('/casos/',), concurrencia=8, duracion=20):
+    """
+    'concurrencia' usuarios simultáneos (un hilo y una sesión cada uno) piden las rutas en ciclo
+    durante 'duracion' segundos. Retorna throughput, percentiles y errores.
+    """
+    import threading
+
+    url_base = url_base.rstrip('/')
+    sesiones = [_sesion_http(url_base, email, clave) for _ in range(concurrencia)]
+    tiempos, errores = [], []
+    lock = threading.Lock()
+    fin = time.perf_counter() + duracion
+
+    def usuario(abridor, desfase):
+        i = desfase
+        while time.perf_counter() < fin:
+            ruta = rutas[i % len(rutas)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                abridor.open(f"{url_base}{ruta}", timeout=60).read()
+                with lock:
+                    tiempos.append(time.perf_counter() - inicio)
+            except Exception as e:
+                with lock:
+                    errores.append(str(e))
+
+    hilos = [threading.Thread(target=usuario, args=(s, n)) for n, s in enumerate(sesiones)]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    total = time.perf_counter() - inicio
+
+    if not tiempos:
+        raise RuntimeError(f"Ninguna petición respondió ({len(errores)} errores): {errores[:1]}")
+    return {
+        'concurrencia': concurrencia,
+        'peticiones': len(tiempos),
+        'por_segundo': len(tiempos) / total,
+        'p50_ms': percentil(tiempos, 0.50) * 1000,
+        'p95_ms': percentil(tiempos, 0.95) * 1000,
+        'p99_ms': percentil(tiempos, 0.99) * 1000,
+        'errores': len(errores),
+    }
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import namedtuple
+from itertools import chain
+from sqlalchemy import event, select, update, insert
+from sqlalchemy.orm import make_transient_to_detached
+from models import (db, CatalogoRecinto, CatalogoVulneracion, CatalogoCiclo, CatalogoInstitucion,
+                    CatalogoEstablecimiento, VersionCache, obtener_hora_chile)
+
+CLAVE_VERSION = 'catalogos'
+INTERVALO_VERIFICACION = 30     # Segundos entre consultas al sello de versión (cambios de otros procesos)
+
+MODELOS_CATALOGO = (CatalogoRecinto, CatalogoVulneracion, CatalogoCiclo, CatalogoInstitucion, CatalogoEstablecimiento)
+
+# Fila de catálogo inmutable (segura de compartir entre hilos y peticiones)
+ItemCatalogo = namedtuple('ItemCatalogo', 'id nombre activo es_otro rango_descripcion', defaults=(None,))
+
+_estado = {'version': None, 'verificado': 0.0, 'datos': None}
+_lock = threading.Lock()
+
+# ---------------------------------------------------------
+# 1) ESTRUCTURAS
+# ---------------------------------------------------------
+
+class Catalogo:
+    """Un catálogo completo: lista para los <select> y mapa id -> ItemCatalogo para validar."""
+
+    def __init__(self, modelo, items):
+        self.modelo = modelo
+        self.todos = items
+        self.activos = [i for i in items if i.activo]
+        self.por_id = {i.id: i for i in items}
+
+    def obtener(self, item_id):
+        return self.por_id.get(item_id)
+
+    def es_otro(self, item_id):
+        """True si la opción elegida es "Otro" (el formulario pide texto libre)."""
+        item = self.por_id.get(item_id)
+        return bool(item and item.es_otro)
+
+    def __contains__(self, item_id):
+        return item_id in self.por_id
+
+    def adjuntar(self, item_id):
+        """
+        Instancia ORM asociada a la sesión SIN consultar la BD (para relaciones M:N).
+        Retorna None si el id no existe en el catálogo.
+        """
+        item = self.por_id.get(item_id)
+        if item is None:
+            return None
+        campos = {'id': item.id, 'nombre': item.nombre}
+        if hasattr(self.modelo, 'activo'):
+            campos['activo'] = item.activo
+        obj = self.modelo(**campos)
+        make_transient_to_detached(obj)
+        return db.session.merge(obj, load=False)
+
+class Catalogos:
+    def __init__(self, version, recintos, vulneraciones, ciclos, instituciones, establecimientos):
+        self.version = version
+        self.recintos = recintos
+        self.vulneraciones = vulneraciones
+        self.ciclos = ciclos
+        self.instituciones = instituciones
+        self.establecimientos = establecimientos
+
+def _item(fila, con_activo=True):
+    return ItemCatalogo(
+        id=fila.id,
+        nombre=fila.nombre,
+        activo=bool(fila.activo) if con_activo else True,
+        es_otro='otro' in (fila.nombre or '').lower(),
+        rango_descripcion=getattr(fila, 'rango_descripcion', None)
+    )
+
+def _cargar(version):
+    def por_nombre(modelo):
+        filas = db.session.execute(
+            select(modelo.id, modelo.nombre, modelo.activo).order_by(modelo.nombre)
+        ).all()
+        return Catalogo(modelo, [_item(f) for f in filas])
+
+    ciclos = db.session.execute(
+        select(CatalogoCiclo.id, CatalogoCiclo.nombre, CatalogoCiclo.rango_descripcion).order_by(CatalogoCiclo.id)
+    ).all()
+
+    return Catalogos(
+        version=version,
+        recintos=por_nombre(CatalogoRecinto),
+        vulneraciones=por_nombre(CatalogoVulneracion),
+        ciclos=Catalogo(CatalogoCiclo, [_item(f, con_activo=False) for f in ciclos]),
+        instituciones=por_nombre(CatalogoInstitucion),
+        establecimientos=por_nombre(CatalogoEstablecimiento),
+    )
+
+# ---------------------------------------------------------
+# 2) LECTURA (requiere app context)
+# ---------------------------------------------------------
+
+def _version_actual():
+    return db.session.execute(
+        select(VersionCache.version).where(VersionCache.clave == CLAVE_VERSION)
+    ).scalar() or 0
+
+def obtener_catalogos():
+    """
+    Catálogos desde memoria. Solo consulta la BD para comparar el sello de versión
+    (como mucho cada INTERVALO_VERIFICACION segundos) y recarga si cambió.
+    """
+    ahora = time.monotonic()
+    datos = _estado['datos']
+    if datos is not None and ahora - _estado['verificado'] < INTERVALO_VERIFICACION:
+        return datos
+
+    with _lock:
+        datos = _estado['datos']
+        if datos is not None and ahora - _estado['verificado'] < INTERVALO_VERIFICACION:
+            return datos
+
+        version = _version_actual()
+        if datos is None or datos.version != version:
+            datos = _cargar(version)
+            _estado['datos'] = datos
+        _estado['verificado'] = ahora
+        return datos
+
+def invalidar_catalogos():
+    """Sube el sello de versión (todos los procesos recargan) y olvida la copia local."""
+    _subir_version(db.session)
+    db.session.commit()
+
+# ---------------------------------------------------------
+# 3) SELLO DE VERSIÓN (se sube en la misma transacción que el cambio)
+# ---------------------------------------------------------
+
+def _subir_version(session):
+    actualizadas = session.execute(
+        update(VersionCache).where(VersionCache.clave == CLAVE_VERSION)
+        .values(version=VersionCache.version + 1, fecha_actualizacion=obtener_hora_chile())
+    ).rowcount
+    if not actualizadas:
+        session.execute(insert(VersionCache).values(
+            clave=CLAVE_VERSION, version=1, fecha_actualizacion=obtener_hora_chile()
+        ))
+    session.info['catalogos_cambiaron'] = True
+
+@event.listens_for(db.session, 'after_flush')
+def _detectar_cambios(session, flush_context):
+    # Solo cambios de columnas: asignar un catálogo a un caso no toca la fila del catálogo
+    for obj in chain(session.new, session.deleted, session.dirty):
+        if isinstance(obj, MODELOS_CATALOGO) and (
+            obj not in session.dirty or session.is_modified(obj, include_collections=False)
+        ):
+            _subir_version(session)
+            return
+
+@event.listens_for(db.session, 'after_commit')
+def _tras_commit(session):
+    if session.info.pop('catalogos_cambiaron', False):
+        with _lock:
+            _estado['datos'] = None
+
+@event.listens_for(db.session, 'after_rollback')
+def _tras_rollback(session):
+    session.info.pop('catalogos_cambiaron', None)
@@ -0,0 +1,258 @@
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from types import SimpleNamespace
+from sqlalchemy import or_, and_
+from models import db, Caso, Usuario, TrabajoActa, CARGA_ACTA
+from utils.helpers import obtener_hora_chile
+from utils.metricas import observar
+
+# Raíz del proyecto (un nivel arriba de utils/)
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+MAX_INTENTOS = 3            # Luego queda en ERROR (botón "Reintentar" o CLI regenerar-actas)
+BACKOFF_BASE = 20           # Segundos: 20s, 40s
+TIEMPO_MAXIMO = 300         # Segundos máximos por acta antes de darla por fallida
+ESPERA_SONDEO = 30
+BLOQUEO_MAXIMO = timedelta(minutes=10)
+
+_despertar = threading.Event()
+_workers = []
+_lock_workers = threading.Lock()
+
+# ---------------------------------------------------------
+# 1) RUTAS DEL ACTA
+# ---------------------------------------------------------
+
+def ruta_acta(caso):
+    """Retorna (ruta_absoluta, ruta_relativa_bd) del PDF del acta (portable Windows/Linux)."""
+    filename = f"acta_{caso.id}_{caso.folio_atencion}.pdf"
+    output_path_abs = os.path.join(BASE_DIR, 'uploads', 'actas', filename)
+    output_path_rel = f"uploads/actas/{filename}"
+    return output_path_abs, output_path_rel
+
+# ---------------------------------------------------------
+# 2) LADO DEL PROCESO HIJO (ReportLab fuera del proceso web)
+# ---------------------------------------------------------
+
+_app_proceso = None
+
+def _inicializar_proceso(config_db):
+    """Cada proceso del pool arma una app mínima (solo BD) con la misma conexión que la app web."""
+    global _app_proceso
+    from flask import Flask
+    _app_proceso = Flask('actas')
+    _app_proceso.config.update(config_db)
+    db.init_app(_app_proceso)
+
+def _generar_en_proceso(caso_id, usuario_id):
+    """
+    Carga el caso (CARGA_ACTA) y escribe el PDF.
+    Retorna (ruta relativa para la BD, segundos de ReportLab): las métricas viven en el proceso web.
+    """
+    from utils.pdf_actas import generar_acta_cierre_pdf
+
+    with _app_proceso.app_context():
+        caso = Caso.query.options(*CARGA_ACTA).filter_by(id=caso_id).one()
+        usuario = db.session.get(Usuario, usuario_id) if usuario_id else None
+        if usuario is None:
+            usuario = SimpleNamespace(nombre_completo='Sistema')
+
+        output_path_abs, output_path_rel = ruta_acta(caso)
+
+        # Escribimos a un temporal y lo movemos: nunca se descarga un PDF a medio escribir
+        temporal = output_path_abs + '.tmp'
+        inicio = time.perf_counter()
+        generar_acta_cierre_pdf(caso, temporal, usuario)
+        duracion = time.perf_counter() - inicio
+        os.replace(temporal, output_path_abs)
+        return output_path_rel, duracion
+
+def _config_db(app):
+    claves = ('SQLALCHEMY_DATABASE_URI', 'SQLALCHEMY_ENGINE_OPTIONS', 'SQLALCHEMY_BINDS')
+    return {k: app.config[k] for k in claves if k in app.config}
+
+def crear_pool_procesos(app, procesos):
+    """
+    Pool de procesos para ReportLab (CPU): no bloquea el GIL de los hilos web.
+    'spawn' evita heredar locks/conexiones de un proceso con hilos.
+    """
+    return ProcessPoolExecutor(
+        max_workers=procesos,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_inicializar_proceso,
+        initargs=(_config_db(app),)
+    )
+
+def _terminar_procesos(pool):
+    """Mata los procesos del pool (un acta colgada no termina sola). El pool queda roto."""
+    terminar = getattr(pool, 'terminate_workers', None)     # Python 3.14+
+    if terminar:
+        terminar()
+        return
+    for proceso in list((pool._processes or {}).values()):  # Antes de 3.14 no hay API pública
+        proceso.terminate()
+
+def reciclar_pool(app, estado_pool, roto):
+    """
+    Reemplaza un pool roto por uno nuevo. Varios hilos despachadores lo ven roto a la vez:
+    solo el primero lo rehace (los demás encuentran ya otro pool en estado_pool).
+    """
+    with _lock_workers:
+        if estado_pool['pool'] is not roto:
+            return
+        estado_pool['pool'] = crear_pool_procesos(app, estado_pool['procesos'])
+    roto.shutdown(wait=False, cancel_futures=True)
+    print("Pool de actas reiniciado tras la caída o el bloqueo de un proceso.")
+
+# ---------------------------------------------------------
+# 3) ENCOLAR / CONSULTAR
+# ---------------------------------------------------------
+
+def encolar_acta(caso, usuario_id=None):
+    """
+    Crea el trabajo de generación (commit propio) salvo que ya haya uno en curso.
+    Retorna el TrabajoActa vigente.
+    """
+    vigente = estado_acta(caso.id)
+    if vigente and vigente.en_proceso:
+        return vigente
+
+    trabajo = TrabajoActa(
+        caso_id=caso.id,
+        usuario_id=usuario_id or caso.usuario_cierre_id,
+        proximo_intento=obtener_hora_chile()
+    )
+    db.session.add(trabajo)
+    db.session.commit()
+
+    _despertar.set()
+    return trabajo
+
+def estado_acta(caso_id):
+    """Último trabajo de acta del caso (o None si nunca se encoló)."""
+    return TrabajoActa.query.filter_by(caso_id=caso_id).order_by(TrabajoActa.id.desc()).first()
+
+# ---------------------------------------------------------
+# 4) PROCESAMIENTO (workers web y CLI)
+# ---------------------------------------------------------
+
+def _siguiente_trabajo(ahora):
+    """Reclama el próximo trabajo vencido con un UPDATE condicional (seguro entre procesos)."""
+    vencidos = db.session.query(TrabajoActa.id).filter(
+        or_(
+            and_(TrabajoActa.estado == 'PENDIENTE', TrabajoActa.proximo_intento <= ahora),
+            and_(TrabajoActa.estado == 'GENERANDO', TrabajoActa.bloqueado_en < ahora - BLOQUEO_MAXIMO)
+        )
+    ).order_by(TrabajoActa.id).limit(10).all()
+
+    for fila in vencidos:
+        tomados = TrabajoActa.query.filter(
+            TrabajoActa.id == fila.id,
+            TrabajoActa.estado.in_(['PENDIENTE', 'GENERANDO']),
+            or_(TrabajoActa.bloqueado_en.is_(None), TrabajoActa.bloqueado_en < ahora - BLOQUEO_MAXIMO)
+        ).update({'estado': 'GENERANDO', 'bloqueado_en': ahora}, synchronize_session=False)
+        db.session.commit()
+        if tomados == 1:
+            return db.session.get(TrabajoActa, fila.id)
+
+    return None
+
+def procesar_siguiente_acta(pool):
+    """
+    Genera el próximo acta pendiente en el pool de procesos.
+    Retorna False si no había trabajo. Requiere app context.
+    Si el pool se rompe (un hijo murió o se mató por exceder TIEMPO_MAXIMO), el trabajo vuelve
+    a PENDIENTE como intento fallido y se relanza BrokenProcessPool para que el llamador
+    rehaga el pool con reciclar_pool().
+    """
+    trabajo = _siguiente_trabajo(obtener_hora_chile())
+    if not trabajo:
+        return False
+
+    pool_roto = False
+    futuro = pool.submit(_generar_en_proceso, trabajo.caso_id, trabajo.usuario_id)
+    try:
+        ruta_rel, duracion = futuro.result(timeout=TIEMPO_MAXIMO)
+        observar('pdf_segundos', duracion)
+        error = None
+    except BrokenProcessPool as e:
+        error, pool_roto = e, True
+    except Exception as e:
+        error = e
+        if not futuro.done():
+            # Excedió TIEMPO_MAXIMO: el hijo sigue corriendo (ocupa el pool y escribiría el mismo
+            # archivo sobre el del reintento). Se mata antes de liberar el trabajo.
+            _terminar_procesos(pool)
+            error, pool_roto = TimeoutError(f"El acta superó {TIEMPO_MAXIMO}s"), True
+
+    ahora = obtener_hora_chile()
+    trabajo.bloqueado_en = None
+
+    if error is None:
+        caso = db.session.get(Caso, trabajo.caso_id)
+        caso.acta_pdf_path = ruta_rel
+        trabajo.estado = 'LISTA'
+        trabajo.fecha_termino = ahora
+        trabajo.ultimo_error = None
+    else:
+        trabajo.intentos = (trabajo.intentos or 0) + 1
+        trabajo.ultimo_error = str(error)[:1000]
+        if trabajo.intentos >= MAX_INTENTOS:
+            trabajo.estado = 'ERROR'
+            trabajo.fecha_termino = ahora
+        else:
+            trabajo.estado = 'PENDIENTE'
+            trabajo.proximo_intento = ahora + timedelta(seconds=BACKOFF_BASE * 2 ** (trabajo.intentos - 1))
+        print(f"Error generando acta del caso {trabajo.caso_id} (intento {trabajo.intentos}): {error}")
+
+    db.session.commit()
+    if pool_roto:
+        raise BrokenProcessPool(f"Pool de actas inutilizable tras el caso {trabajo.caso_id}: {error}")
+    return True
+
+def _bucle_worker(app, estado_pool):
+    while True:
+        _despertar.wait(ESPERA_SONDEO)
+        _despertar.clear()
+        try:
+            with app.app_context():
+                while True:
+                    pool = estado_pool['pool']
+                    try:
+                        if not procesar_siguiente_acta(pool):
+                            break
+                    except BrokenProcessPool:
+                        # Un hijo murió (ej: OOM) o se mató por tiempo: el trabajo ya volvió a PENDIENTE
+                        reciclar_pool(app, estado_pool, pool)
+        except Exception as e:
+            print(f"Error en worker de actas: {e}")
+            time.sleep(ESPERA_SONDEO)
+
+def iniciar_cola_actas(app):
+    """
+    Levanta (una vez por proceso) los hilos despachadores y el pool de procesos de ReportLab.
+    Cantidad vía ACTA_WORKERS en .env (por defecto 2; 0 = solo por CLI 'regenerar-actas').
+    """
+    if _workers:
+        return
+
+    cantidad = int(os.getenv('ACTA_WORKERS', '2'))
+    if cantidad <= 0:
+        return
+
+    with _lock_workers:
+        if _workers:
+            return
+        estado_pool = {'procesos': cantidad, 'pool': crear_pool_procesos(app, cantidad)}
+        for i in range(cantidad):
+            hilo = threading.Thread(target=_bucle_worker, args=(app, estado_pool), name=f"actas-{i}", daemon=True)
+            hilo.start()
+            _workers.append(hilo)
+
+    # Retoma lo que haya quedado pendiente de un reinicio
+    _despertar.set()
@@ -0,0 +1,304 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+from datetime import timedelta
+from sqlalchemy import event, insert, or_, and_
+from models import db, CorreoPendiente, AuditoriaCaso
+from utils.helpers import obtener_hora_chile
+from utils.metricas import medir
+
+SMTP_SERVIDOR = "smtp.gmail.com"
+SMTP_PUERTO = 587
+
+MAX_INTENTOS = 6            # Luego de esto el correo queda en ERROR (reintentable por CLI)
+BACKOFF_BASE = 30           # Segundos: 30s, 1m, 2m, 4m, 8m...
+BACKOFF_MAXIMO = 3600
+TAMANO_LOTE = 20            # Correos que un worker toma por vuelta
+ESPERA_SONDEO = 30          # Si nadie avisa, los workers revisan la cola cada N segundos
+BLOQUEO_MAXIMO = timedelta(minutes=10)  # ENVIANDO más antiguo que esto = worker muerto, se libera
+INACTIVIDAD_SMTP = 60       # Conexión ociosa más de N segundos se verifica con NOOP antes de reusar
+
+_despertar = threading.Event()
+_workers = []
+_lock_workers = threading.Lock()
+
+# ---------------------------------------------------------
+# 1) POOL DE CONEXIONES SMTP AUTENTICADAS
+# ---------------------------------------------------------
+
+class PoolSMTP:
+    """
+    Conexiones SMTP ya autenticadas (STARTTLS + login) que se reutilizan entre envíos.
+    Evita el handshake completo por cada correo.
+    """
+
+    def __init__(self, maximo=2):
+        self._libres = queue.LifoQueue(maxsize=maximo)
+
+    def _conectar(self):
+        remitente = os.getenv("EMAIL_USUARIO")
+        contrasena = os.getenv("EMAIL_CONTRASENA")
+        server = smtplib.SMTP(SMTP_SERVIDOR, SMTP_PUERTO, timeout=30)
+        server.starttls()
+        server.login(remitente, contrasena)
+        return server
+
+    def obtener(self):
+        try:
+            conn, desde = self._libres.get_nowait()
+        except queue.Empty:
+            return self._conectar()
+
+        # El servidor corta conexiones ociosas: verificamos antes de reutilizar
+        if time.monotonic() - desde > INACTIVIDAD_SMTP:
+            try:
+                if conn.noop()[0] == 250:
+                    return conn
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.descartar(conn)
+            return self._conectar()
+
+        return conn
+
+    def devolver(self, conn):
+        try:
+            self._libres.put_nowait((conn, time.monotonic()))
+        except queue.Full:
+            self.descartar(conn)
+
+    def descartar(self, conn):
+        try:
+            conn.quit()
+        except Exception:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def cerrar_todas(self):
+        while True:
+            try:
+                conn, _ = self._libres.get_nowait()
+            except queue.Empty:
+                return
+            self.descartar(conn)
+
+# ---------------------------------------------------------
+# 2) ENCOLAR
+# ---------------------------------------------------------
+
+def encolar_correo(destinatarios, asunto, cuerpo_html, adjunto_path=None, bcc=None, auditoria_id=None):
+    """
+    Persiste el correo en 'cola_correos' y avisa a los workers. Nunca confirma ni descarta
+    la sesión del llamador:
+    - Con 'auditoria_id' (auditoría recién agregada por la ruta, aún sin commit): el correo va en
+      la misma transacción (db.session.add) y lo persiste el commit de la ruta.
+    - Sin auditoría (avisos posteriores al commit de la ruta): INSERT en una conexión propia,
+      como utils/bitacora.py.
+    """
+    valores = dict(
+        destinatarios=destinatarios,
+        bcc=bcc or [],
+        asunto=asunto[:255],
+        cuerpo_html=cuerpo_html,
+        adjunto_path=adjunto_path,
+        auditoria_id=auditoria_id,
+        proximo_intento=obtener_hora_chile()
+    )
+    if auditoria_id is not None:
+        db.session.add(CorreoPendiente(**valores))
+        db.session.info['correos_encolados'] = True     # Se despierta a los workers tras el commit
+        return
+
+    with db.engine.begin() as conn:
+        conn.execute(insert(CorreoPendiente).values(**valores))
+    _despertar.set()
+
+@event.listens_for(db.session, 'after_commit')
+def _despertar_tras_commit(session):
+    if session.info.pop('correos_encolados', False):
+        _despertar.set()
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_aviso(session):
+    session.info.pop('correos_encolados', None)
+
+# ---------------------------------------------------------
+# 3) PROCESAMIENTO (usado por los workers y por el CLI)
+# ---------------------------------------------------------
+
+def _reclamar(correo_id, ahora):
+    """
+    Toma el correo para este worker con un UPDATE condicional.
+    Si otro worker/proceso lo tomó antes, rowcount = 0 y lo saltamos.
+    """
+    tomados = CorreoPendiente.query.filter(
+        CorreoPendiente.id == correo_id,
+        or_(
+            CorreoPendiente.estado == 'PENDIENTE',
+            and_(CorreoPendiente.estado == 'ENVIANDO', CorreoPendiente.bloqueado_en < ahora - BLOQUEO_MAXIMO)
+        )
+    ).update({'estado': 'ENVIANDO', 'bloqueado_en': ahora}, synchronize_session=False)
+    db.session.commit()
+    return tomados == 1
+
+def _actualizar_auditoria(correo, status, error=None):
+    """Refleja el resultado final en la AuditoriaCaso asociada (ej: EMAIL_ASIGNACION)."""
+    if not correo.auditoria_id:
+        return
+    auditoria = db.session.get(AuditoriaCaso, correo.auditoria_id)
+    if not auditoria:
+        return
+
+    # Reasignamos el dict completo: la columna JSON no detecta mutaciones internas
+    detalles = dict(auditoria.detalles_cambio or {})
+    detalles['status'] = status
+    detalles['intentos'] = correo.intentos
+    if error:
+        detalles['error'] = error
+    auditoria.detalles_cambio = detalles
+
+def _entregar(correo, pool):
+    """Intenta enviar un correo ya reclamado y deja su estado actualizado (sin commit)."""
+    from utils.email import construir_mensaje
+
+    remitente = os.getenv("EMAIL_USUARIO")
+    error = None
+    definitivo = False
+
+    try:
+        msg, recipients = construir_mensaje(
+            remitente, correo.destinatarios, correo.asunto, correo.cuerpo_html,
+            adjunto_path=correo.adjunto_path, bcc=correo.bcc
+        )
+
+        # Dos vueltas: si la conexión reutilizada se cayó, probamos una vez con una nueva
+        for _ in range(2):
+            conn = pool.obtener()
+            try:
+                with medir('smtp'):
+                    conn.send_message(msg, from_addr=remitente, to_addrs=recipients)
+                pool.devolver(conn)
+                error = None
+                break
+            except smtplib.SMTPServerDisconnected as e:
+                pool.descartar(conn)
+                error = e
+            except smtplib.SMTPRecipientsRefused as e:
+                # Todos los destinatarios rechazados: reintentar no sirve
+                pool.devolver(conn)
+                error, definitivo = e, True
+                break
+            except Exception as e:
+                pool.descartar(conn)
+                error = e
+                break
+
+    except Exception as e:
+        error = e
+
+    ahora = obtener_hora_chile()
+    correo.bloqueado_en = None
+
+    if error is None:
+        correo.estado = 'ENVIADO'
+        correo.fecha_envio = ahora
+        correo.ultimo_error = None
+        # Ya entregado: no guardamos el cuerpo (datos de pacientes / credenciales)
+        correo.cuerpo_html = None
+        _actualizar_auditoria(correo, 'OK')
+        return True
+
+    correo.intentos = (correo.intentos or 0) + 1
+    correo.ultimo_error = str(error)[:1000]
+
+    if definitivo or correo.intentos >= MAX_INTENTOS:
+        correo.estado = 'ERROR'
+        _actualizar_auditoria(correo, 'ERROR_ENVIO', correo.ultimo_error)
+        print(f"Error definitivo enviando correo '{correo.asunto}': {error}")
+    else:
+        espera = min(BACKOFF_BASE * 2 ** (correo.intentos - 1), BACKOFF_MAXIMO)
+        correo.estado = 'PENDIENTE'
+        correo.proximo_intento = ahora + timedelta(seconds=espera)
+        print(f"Error enviando correo '{correo.asunto}' (intento {correo.intentos}), reintento en {espera}s: {error}")
+
+    return False
+
+def procesar_cola(pool, limite=TAMANO_LOTE):
+    """
+    Envía hasta 'limite' correos vencidos. Retorna cuántos procesó.
+    Requiere app context.
+    """
+    ahora = obtener_hora_chile()
+    ids = [fila.id for fila in db.session.query(CorreoPendiente.id).filter(
+        or_(
+            and_(CorreoPendiente.estado == 'PENDIENTE', CorreoPendiente.proximo_intento <= ahora),
+            and_(CorreoPendiente.estado == 'ENVIANDO', CorreoPendiente.bloqueado_en < ahora - BLOQUEO_MAXIMO)
+        )
+    ).order_by(CorreoPendiente.id).limit(limite).all()]
+
+    procesados = 0
+    for correo_id in ids:
+        if not _reclamar(correo_id, ahora):
+            continue
+        correo = db.session.get(CorreoPendiente, correo_id)
+        _entregar(correo, pool)
+        db.session.commit()
+        procesados += 1
+
+    return procesados
+
+def reintentar_fallidos():
+    """Devuelve a la cola los correos en ERROR (intentos desde cero). Retorna cuántos."""
+    total = CorreoPendiente.query.filter_by(estado='ERROR').update({
+        'estado': 'PENDIENTE',
+        'intentos': 0,
+        'proximo_intento': obtener_hora_chile()
+    }, synchronize_session=False)
+    db.session.commit()
+    _despertar.set()
+    return total
+
+# ---------------------------------------------------------
+# 4) WORKERS EN SEGUNDO PLANO
+# ---------------------------------------------------------
+
+def _bucle_worker(app, pool):
+    while True:
+        _despertar.wait(ESPERA_SONDEO)
+        _despertar.clear()
+        try:
+            with app.app_context():
+                # Seguimos mientras haya trabajo vencido
+                while procesar_cola(pool):
+                    pass
+        except Exception as e:
+            print(f"Error en worker de correos: {e}")
+            time.sleep(ESPERA_SONDEO)
+
+def iniciar_cola_correos(app):
+    """
+    Levanta (una sola vez por proceso) los workers que drenan la cola.
+    Cantidad vía EMAIL_WORKERS en .env (por defecto 2; 0 = solo por CLI 'procesar-correos').
+    """
+    if _workers:
+        return
+
+    cantidad = int(os.getenv('EMAIL_WORKERS', '2'))
+    if cantidad <= 0:
+        return
+
+    with _lock_workers:
+        if _workers:
+            return
+        pool = PoolSMTP(maximo=cantidad)
+        for i in range(cantidad):
+            hilo = threading.Thread(target=_bucle_worker, args=(app, pool), name=f"correos-{i}", daemon=True)
+            hilo.start()
+            _workers.append(hilo)
+
+    # Drena lo que haya quedado pendiente de un reinicio
+    _despertar.set()
@@ -0,0 +1,475 @@
+import os
+import click
+
+def registrar_comandos(app):
+    """Registra los comandos de mantención: flask --app app <comando>."""
+
+    @app.cli.command('reconstruir-resumen')
+    def reconstruir_resumen_cmd():
+        """Reconcilia la tabla resumen_dashboard contra la tabla casos."""
+        from utils.dashboard import reconstruir_resumen
+        total, corregidos = reconstruir_resumen()
+        click.echo(f"✅ Resumen reconstruido: {total} buckets vigentes, {corregidos} corregidos.")
+
+    @app.cli.command('crear-indices')
+    def crear_indices_cmd():
+        """Crea los índices declarados en models.py que falten (db.create_all no toca tablas existentes)."""
+        from sqlalchemy import inspect
+        from models import db
+        inspector = inspect(db.engine)
+        tablas = set(inspector.get_table_names())
+        creados = 0
+        for tabla in db.metadata.sorted_tables:
+            if tabla.name not in tablas:
+                continue
+            existentes = {i['name'] for i in inspector.get_indexes(tabla.name)}
+            faltantes = [i for i in tabla.indexes if i.name not in existentes]
+            for indice in faltantes:
+                # Respeta ddl_if (ej: FULLTEXT solo en MySQL): en otros motores no emite nada
+                indice.create(db.engine)
+            if faltantes:
+                ahora = {i['name'] for i in inspect(db.engine).get_indexes(tabla.name)}
+                for indice in faltantes:
+                    if indice.name in ahora:
+                        click.echo(f"  + {tabla.name}.{indice.name}")
+                        creados += 1
+        click.echo(f"✅ Índices creados: {creados}.")
+
+    @app.cli.command('invalidar-catalogos')
+    def invalidar_catalogos_cmd():
+        """Fuerza la recarga de los catálogos en memoria (tras editarlos directo en la BD)."""
+        from utils.catalogos import invalidar_catalogos, obtener_catalogos
+        invalidar_catalogos()
+        click.echo(f"✅ Catálogos invalidados (versión {obtener_catalogos().version}).")
+
+    @app.cli.command('importar-casos')
+    @click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--email', required=True, help='Usuario (Admin/Torre Control) a quien se atribuye el ingreso.')
+    @click.option('--simular', is_flag=True, help='Solo valida y reporta errores; no guarda nada.')
+    @click.option('--reporte', type=click.Path(dir_okay=False), help='Escribe las filas con error en este CSV.')
+    @click.option('--permitir-duplicados', is_flag=True, help='Ingresa también las filas que coinciden con un caso vigente.')
+    @click.option('--url-base', default=lambda: os.getenv('URL_BASE', 'http://localhost:5000'),
+                  help='URL pública del sistema (links de los correos).')
+    def importar_casos_cmd(archivo, email, simular, reporte, permitir_duplicados, url_base):
+        """Ingreso masivo de casos desde CSV, XLSX o JSON (mismas validaciones del formulario)."""
+        from models import Usuario
+        from utils.importacion import leer_filas, importar_filas, reporte_errores_csv, ErrorImportacion
+        usuario = Usuario.query.filter_by(email=email).first()
+        if not usuario or not usuario.rol or usuario.rol.nombre not in ('Admin', 'Torre Control'):
+            raise click.ClickException(f"{email} no existe o no es Admin/Torre Control.")
+
+        with open(archivo, 'rb') as f:
+            contenido = f.read()
+        try:
+            filas = leer_filas(contenido, archivo)
+        except ErrorImportacion as e:
+            raise click.ClickException(str(e))
+
+        # Los correos usan url_for(_external=True): necesitan un contexto con la URL pública
+        with app.test_request_context(base_url=url_base):
+            resultado = importar_filas(filas, usuario, simular=simular,
+                                       primera_fila=1 if archivo.lower().endswith('.json') else 2,
+                                       permitir_duplicados=permitir_duplicados)
+
+        for e in resultado['errores'][:20]:
+            click.echo(f"  ✗ fila {e['fila']} ({e['folio'] or 's/folio'}): {'; '.join(e['errores'])}")
+        if len(resultado['errores']) > 20:
+            click.echo(f"  ... y {len(resultado['errores']) - 20} filas más con error.")
+        if reporte and resultado['errores']:
+            with open(reporte, 'w', encoding='utf-8-sig', newline='') as f:
+                f.write(reporte_errores_csv(resultado['errores']))
+            click.echo(f"  Reporte de errores: {reporte}")
+
+        if simular:
+            click.echo(f"✅ Simulación: {resultado['validas']}/{resultado['total']} filas válidas (no se guardó nada).")
+        else:
+            click.echo(f"✅ Casos ingresados: {resultado['insertados']}/{resultado['total']} "
+                       f"({len(resultado['errores'])} filas con error).")
+
+    @app.cli.command('auditar-ruts')
+    @click.option('--corregir', is_flag=True, help='Reescribe como 12345678-9 los RUT válidos guardados con otro formato.')
+    @click.option('--lote', default=5000, show_default=True, help='Casos leídos por consulta.')
+    def auditar_ruts_cmd(corregir, lote):
+        """Revisa los RUT de paciente y acompañante guardados en casos (validación por lotes)."""
+        from sqlalchemy import select, update, bindparam
+        from models import db, Caso
+        from utils.rut import normalizar_ruts
+
+        columnas = (
+            ('paciente', Caso.paciente_doc_tipo, Caso.paciente_doc_numero),
+            ('acompañante', Caso.acompanante_doc_tipo, Caso.acompanante_doc_numero),
+        )
+        tabla = Caso.__table__
+        for etiqueta, tipo, numero in columnas:
+            invalidos, corregibles, revisados, ultimo_id = [], [], 0, 0
+            while True:
+                filas = db.session.execute(
+                    select(Caso.id, numero)
+                    .where(tipo == 'RUT', numero.isnot(None), numero != '', Caso.id > ultimo_id)
+                    .order_by(Caso.id).limit(lote)
+                ).all()
+                if not filas:
+                    break
+                normalizados, validos = normalizar_ruts([valor for _, valor in filas])
+                for (caso_id, valor), normal, ok in zip(filas, normalizados, validos):
+                    if not ok:
+                        invalidos.append((caso_id, valor))
+                    elif normal != valor:
+                        corregibles.append({'b_id': caso_id, 'b_valor': normal})
+                revisados += len(filas)
+                ultimo_id = filas[-1][0]
+
+            click.echo(f"RUT {etiqueta}: {revisados} revisados | {len(invalidos)} inválidos | "
+                       f"{len(corregibles)} válidos con formato distinto")
+            for caso_id, valor in invalidos[:20]:
+                click.echo(f"  ✗ caso {caso_id}: {valor!r}")
+
+            if corregir and corregibles:
+                db.session.execute(
+                    update(tabla).where(tabla.c.id == bindparam('b_id')).values({numero.key: bindparam('b_valor')}),
+                    corregibles
+                )
+                db.session.commit()
+                click.echo(f"  ✅ {len(corregibles)} RUT normalizados.")
+
+    @app.cli.command('reconstruir-busqueda')
+    def reconstruir_busqueda_cmd():
+        """Regenera el índice de búsqueda (busqueda_casos) desde la tabla casos."""
+        from utils.busqueda import reconstruir_busqueda
+        total = reconstruir_busqueda()
+        click.echo(f"✅ Índice de búsqueda reconstruido: {total} casos.")
+
+    @app.cli.command('reconstruir-huellas')
+    def reconstruir_huellas_cmd():
+        """Regenera las huellas de duplicados (huellas_casos) desde la tabla casos."""
+        from utils.duplicados import reconstruir_huellas
+        total = reconstruir_huellas()
+        click.echo(f"✅ Huellas reconstruidas: {total} casos.")
+
+    @app.cli.command('reconstruir-pacientes')
+    @click.option('--lote', default=1000, show_default=True, help='Casos procesados por consulta.')
+    def reconstruir_pacientes_cmd(lote):
+        """Regenera la identidad de pacientes (pacientes, pacientes_casos) desde la tabla casos."""
+        from utils.pacientes import reconstruir_pacientes
+        casos, pacientes = reconstruir_pacientes(lote=lote)
+        click.echo(f"✅ Pacientes reconstruidos: {pacientes} pacientes a partir de {casos} casos.")
+
+    @app.cli.command('reporte-duplicados')
+    @click.option('--solo-fuertes', is_flag=True, help='Ignora las coincidencias solo por nombre fonético y fecha.')
+    @click.option('--csv', 'ruta_csv', type=click.Path(dir_okay=False), help='Escribe los grupos en este CSV.')
+    def reporte_duplicados_cmd(solo_fuertes, ruta_csv):
+        """Grupos de casos vigentes que parecen el mismo ingreso (comparten documento, folio o nombre)."""
+        import csv
+        from models import db, Caso
+        from utils.duplicados import detectar_grupos, TIPOS_FUERTES
+
+        grupos = detectar_grupos(TIPOS_FUERTES if solo_fuertes else None)
+        if not grupos:
+            click.echo("✅ No se encontraron posibles duplicados.")
+            return
+
+        ids = [i for g in grupos for i in g['casos']]
+        folios = dict(db.session.query(Caso.id, Caso.folio_atencion).filter(Caso.id.in_(ids)).all())
+
+        for g in grupos[:50]:
+            casos = ", ".join(f"#{i} ({folios.get(i) or 's/folio'})" for i in g['casos'])
+            click.echo(f"  ⚠ [{'/'.join(g['tipos'])}] {casos}")
+        if len(grupos) > 50:
+            click.echo(f"  ... y {len(grupos) - 50} grupos más.")
+
+        if ruta_csv:
+            with open(ruta_csv, 'w', encoding='utf-8-sig', newline='') as f:
+                escritor = csv.writer(f, delimiter=';')
+                escritor.writerow(['grupo', 'caso_id', 'folio', 'coincidencias'])
+                for n, g in enumerate(grupos, start=1):
+                    for i in g['casos']:
+                        escritor.writerow([n, i, folios.get(i) or '', '/'.join(g['tipos'])])
+            click.echo(f"  Reporte: {ruta_csv}")
+
+        click.echo(f"✅ {len(grupos)} grupos con {len(ids)} casos en total.")
+
+    @app.cli.command('procesar-correos')
+    @click.option('--continuo', is_flag=True, help='Sigue revisando la cola (útil como proceso dedicado o cron largo).')
+    def procesar_correos_cmd(continuo):
+        """Envía los correos pendientes de la cola (alternativa a los workers en proceso)."""
+        import time
+        from utils.cola_correos import PoolSMTP, procesar_cola, ESPERA_SONDEO
+        pool = PoolSMTP()
+        total = 0
+        try:
+            while True:
+                procesados = procesar_cola(pool)
+                total += procesados
+                if procesados:
+                    continue
+                if not continuo:
+                    break
+                time.sleep(ESPERA_SONDEO)
+        finally:
+            pool.cerrar_todas()
+        click.echo(f"✅ Cola de correos procesada: {total} correos.")
+
+    @app.cli.command('reintentar-correos')
+    def reintentar_correos_cmd():
+        """Devuelve a la cola los correos que quedaron en ERROR definitivo."""
+        from utils.cola_correos import reintentar_fallidos
+        total = reintentar_fallidos()
+        click.echo(f"✅ {total} correos devueltos a la cola.")
+
+    @app.cli.command('regenerar-actas')
+    @click.option('--todas', is_flag=True, help='Regenera el acta de TODOS los casos cerrados (por defecto: solo faltantes o fallidas).')
+    @click.option('--caso', 'caso_id', type=int, help='Regenera solo el acta de este caso.')
+    @click.option('--procesos', default=2, show_default=True, help='Procesos de ReportLab en paralelo.')
+    def regenerar_actas_cmd(todas, caso_id, procesos):
+        """Encola y genera actas de cierre en bloque usando un pool de procesos."""
+        import os
+        import threading
+        from concurrent.futures.process import BrokenProcessPool
+        from models import Caso
+        from utils.cola_actas import encolar_acta, estado_acta, procesar_siguiente_acta, crear_pool_procesos, reciclar_pool, ruta_acta
+
+        query = Caso.query.filter(Caso.estado == 'CERRADO')
+        if caso_id:
+            query = query.filter(Caso.id == caso_id)
+
+        encolados = 0
+        for caso in query.order_by(Caso.id).all():
+            if not (todas or caso_id):
+                trabajo = estado_acta(caso.id)
+                falta_archivo = not caso.acta_pdf_path or not os.path.exists(ruta_acta(caso)[0])
+                if not falta_archivo and not (trabajo and trabajo.estado == 'ERROR'):
+                    continue
+            encolar_acta(caso)
+            encolados += 1
+
+        click.echo(f"Actas encoladas: {encolados}. Generando con {procesos} procesos...")
+
+        # Un hilo despachador por proceso: cada uno toma un trabajo y espera su PDF
+        estado_pool = {'procesos': procesos, 'pool': crear_pool_procesos(app, procesos)}
+        generadas = []
+
+        def despachar():
+            with app.app_context():
+                while True:
+                    pool = estado_pool['pool']
+                    try:
+                        if not procesar_siguiente_acta(pool):
+                            break
+                        generadas.append(1)
+                    except BrokenProcessPool:
+                        reciclar_pool(app, estado_pool, pool)
+
+        hilos = [threading.Thread(target=despachar) for _ in range(procesos)]
+        try:
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        finally:
+            estado_pool['pool'].shutdown()
+        click.echo(f"✅ Actas procesadas: {len(generadas)}.")
+
+    @app.cli.command('benchmark-actas')
+    @click.option('--n', 'cantidad', default=30, show_default=True, help='Actas sintéticas por corrida.')
+    @click.option('--gestiones', default=15, show_default=True, help='Entradas de bitácora por acta.')
+    def benchmark_actas_cmd(cantidad, gestiones):
+        """Mide el costo por acta con y sin la caché de assets (no toca la BD)."""
+        import os
+        import tempfile
+        import time
+        from datetime import datetime, timedelta
+        from types import SimpleNamespace
+        from utils.pdf_actas import generar_acta_cierre_pdf
+
+        def caso_sintetico(i):
+            ahora = datetime(2025, 1, 1, 9, 0) + timedelta(days=i)
+            usuario = SimpleNamespace(nombre_completo=f"Funcionario {i % 7}")
+            return SimpleNamespace(
+                folio_atencion=f"B{i:05d}", fecha_ingreso=ahora, fecha_cierre=ahora + timedelta(days=20),
+                ingresado_por_nombre="Solicitante Demo", origen_nombres=f"Paciente {i}", origen_apellidos="Sintético",
+                paciente_doc_tipo="RUT", paciente_doc_numero="11111111-1", paciente_fecha_nacimiento=ahora.date(),
+                ciclo_vital=SimpleNamespace(nombre="Infancia"), paciente_domicilio="Calle Falsa 123",
+                origen_relato="Relato de prueba. " * 20,
+                vulneraciones=[SimpleNamespace(nombre="Maltrato"), SimpleNamespace(nombre="Negligencia")],
+                vulneracion_otro_texto=None,
+                recinto_inscrito=SimpleNamespace(nombre="CESFAM Demo"), recinto_inscrito_otro_texto=None,
+                control_sanitario='AL_DIA', gestion_vacunas='AL_DIA', gestion_judicial='PENDIENTE',
+                gestion_salud_mental='DERIVADO', gestion_cosam='NO_CORRESPONDE',
+                fallecido=False, fecha_defuncion=None, observaciones_gestion=None,
+                gestiones=[
+                    SimpleNamespace(fecha_movimiento=ahora + timedelta(hours=h), usuario=usuario,
+                                    observacion=f"Gestión {h}: contacto telefónico y seguimiento.")
+                    for h in range(gestiones)
+                ],
+            )
+
+        casos = [caso_sintetico(i) for i in range(cantidad)]
+        usuario_cierre = SimpleNamespace(nombre_completo="Benchmark")
+
+        with tempfile.TemporaryDirectory() as carpeta:
+            for etiqueta, usar_cache in (("sin caché", False), ("con caché", True)):
+                # Una acta de calentamiento (imports de ReportLab / armado de la caché)
+                generar_acta_cierre_pdf(casos[0], os.path.join(carpeta, "calentamiento.pdf"), usuario_cierre, usar_cache=usar_cache)
+
+                inicio = time.perf_counter()
+                peso = 0
+                for caso in casos:
+                    ruta = os.path.join(carpeta, f"{caso.folio_atencion}.pdf")
+                    generar_acta_cierre_pdf(caso, ruta, usuario_cierre, usar_cache=usar_cache)
+                    peso += os.path.getsize(ruta)
+                total = time.perf_counter() - inicio
+
+                click.echo(f"{etiqueta:>10}: {total / cantidad * 1000:8.1f} ms/acta | {peso / cantidad / 1024:8.1f} KB/acta | {cantidad} actas en {total:.2f}s")
+
+    @app.cli.command('benchmark-rut')
+    @click.option('--n', 'cantidad', default=1_000_000, show_default=True, help='RUTs sintéticos por corrida.')
+    def benchmark_rut_cmd(cantidad):
+        """Compara la validación de RUT anterior (re.match + cycle) con la actual y la de lotes (no toca la BD)."""
+        import random
+        import re
+        import time
+        from itertools import cycle
+        from utils.rut import es_rut_valido, validar_ruts, calcular_dv, np
+
+        def es_rut_valido_anterior(rut):
+            # Implementación previa de utils/helpers.py, como referencia
+            if not rut:
+                return False
+            rut = rut.replace(".", "").replace("-", "").upper().strip()
+            if not re.match(r"^\d{7,8}[0-9K]$", rut):
+                return False
+            cuerpo, dv_ingresado = rut[:-1], rut[-1]
+            s = sum(d * f for d, f in zip(map(int, reversed(cuerpo)), cycle(range(2, 8))))
+            res = (-s) % 11
+            return dv_ingresado == ("K" if res == 10 else str(res))
+
+        # Mezcla realista: formatos con/sin puntos y guion, ~10% DV errado, ~5% basura
+        azar = random.Random(42)
+        ruts = []
+        for _ in range(cantidad):
+            cuerpo = str(azar.randint(1_000_000, 29_999_999))
+            dv = calcular_dv(cuerpo) if azar.random() > 0.1 else azar.choice("0123456789K")
+            formato = azar.random()
+            if formato < 0.05:
+                ruts.append(azar.choice(["", "12.34", "K-12345678", "abc123456-7"]))
+            elif formato < 0.5:
+                ruts.append(f"{int(cuerpo):,}".replace(",", ".") + f"-{dv}")
+            elif formato < 0.9:
+                ruts.append(f"{cuerpo}-{dv}")
+            else:
+                ruts.append(f"{cuerpo}{dv.lower()}")
+
+        corridas = [
+            ("anterior", lambda: [es_rut_valido_anterior(r) for r in ruts]),
+            ("es_rut_valido", lambda: [es_rut_valido(r) for r in ruts]),
+            ("lote (Python)", lambda: validar_ruts(ruts, usar_numpy=False)),
+        ]
+        if np is not None:
+            corridas.append(("lote (NumPy)", lambda: validar_ruts(ruts)))
+        else:
+            click.echo("(NumPy no está instalado: se omite la validación vectorizada)")
+
+        referencia = None
+        for etiqueta, funcion in corridas:
+            inicio = time.perf_counter()
+            resultado = funcion()
+            total = time.perf_counter() - inicio
+            if referencia is None:
+                referencia = resultado
+            iguales = "OK" if resultado == referencia else "DIFIERE"
+            click.echo(f"{etiqueta:>14}: {cantidad / total / 1e6:6.2f} M RUT/s | {total:6.2f}s | "
+                       f"{sum(resultado)} válidos | {iguales}")
+
+    # --- BENCHMARK DE CARGA (siempre sobre una BD aparte, nunca la de producción) ---
+
+    def _app_benchmark(bd):
+        if bd == app.config.get('SQLALCHEMY_DATABASE_URI'):
+            raise click.UsageError("--bd debe ser una base de datos dedicada al benchmark, no la del sistema.")
+        # Sin workers: los correos quedan en la cola (SMTP nunca se toca) y las actas se miden aparte
+        os.environ['EMAIL_WORKERS'] = '0'
+        os.environ['ACTA_WORKERS'] = '0'
+        os.environ.setdefault('EMAIL_USUARIO', 'benchmark@redprotege.test')
+        os.environ.setdefault('EMAIL_CONTRASENA', 'benchmark')
+        from app import create_app
+        return create_app({
+            'SQLALCHEMY_DATABASE_URI': bd,
+            'SQLALCHEMY_ENGINE_OPTIONS': {} if bd.startswith('sqlite') else app.config['SQLALCHEMY_ENGINE_OPTIONS'],
+            'WTF_CSRF_ENABLED': False,
+        })
+
+    @app.cli.command('sembrar-benchmark')
+    @click.option('--bd', required=True, help='URI de la BD del benchmark (ej: sqlite:////tmp/bench.db o mysql+pymysql://.../bench).')
+    @click.option('--casos', default=100_000, show_default=True, help='Casos sintéticos a generar.')
+    @click.option('--gestiones', default=3, show_default=True, help='Entradas de bitácora promedio por caso asignado.')
+    @click.option('--semilla', default=42, show_default=True, help='Misma semilla = mismos datos.')
+    @click.option('--reiniciar', is_flag=True, help='Borra TODAS las tablas de esa BD antes de sembrar.')
+    def sembrar_benchmark_cmd(bd, casos, gestiones, semilla, reiniciar):
+        """Llena una BD dedicada con usuarios de todos los roles, casos, bitácora, auditoría y logs."""
+        import time
+        from models import db
+        from utils.carga import sembrar_datos, CLAVE_BENCHMARK, DOMINIO
+
+        app_bench = _app_benchmark(bd)
+        with app_bench.app_context():
+            if reiniciar:
+                db.drop_all()
+            inicio = time.perf_counter()
+            try:
+                totales = sembrar_datos(casos, gestiones, semilla, informar=click.echo)
+            except RuntimeError as e:
+                raise click.ClickException(str(e))
+        click.echo(f"✅ BD sembrada en {time.perf_counter() - inicio:.0f}s: {totales['casos']} casos, "
+                   f"{totales['gestiones']} gestiones, {totales['auditorias']} auditorías, {totales['logs']} logs.")
+        click.echo(f"   Usuarios: <rol>.0@{DOMINIO} (ej: admin.0@{DOMINIO}), clave {CLAVE_BENCHMARK}")
+
+    @app.cli.command('benchmark-carga')
+    @click.option('--bd', required=True, help='URI de la BD sembrada con sembrar-benchmark.')
+    @click.option('--repeticiones', default=30, show_default=True, help='Peticiones medidas por escenario.')
+    @click.option('--calentamiento', default=2, show_default=True, help='Peticiones previas no medidas por escenario.')
+    @click.option('--solo', multiple=True, help='Escenario a ejecutar (repetible). Por defecto, todos.')
+    @click.option('--guardar', type=click.Path(dir_okay=False), help='Escribe los resultados en este JSON.')
+    @click.option('--comparar', type=click.Path(exists=True, dir_okay=False), help='JSON de una corrida anterior.')
+    @click.option('--tolerancia', default=0.25, show_default=True, help='Empeoramiento de p95 aceptado al comparar (0.25 = 25%).')
+    def benchmark_carga_cmd(bd, repeticiones, calentamiento, solo, guardar, comparar, tolerancia):
+        """Latencia p50/p95/p99, consultas por petición y RSS pico de las vistas principales."""
+        from utils.carga import ejecutar_benchmark, guardar_resultados, comparar_resultados, ENCABEZADO
+
+        app_bench = _app_benchmark(bd)
+        click.echo(ENCABEZADO)
+        try:
+            resultados = ejecutar_benchmark(app_bench, repeticiones, calentamiento, solo=set(solo), informar=click.echo)
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"({resultados['casos']} casos en la BD)")
+
+        if guardar:
+            guardar_resultados(resultados, guardar)
+            click.echo(f"✅ Resultados guardados en {guardar}")
+
+        if comparar:
+            regresiones = comparar_resultados(resultados, comparar, tolerancia)
+            for mensaje in regresiones:
+                click.echo(f"⚠️ Regresión: {mensaje}")
+            if regresiones:
+                raise SystemExit(1)
+            click.echo("✅ Sin regresiones respecto de la corrida anterior.")
+
+    @app.cli.command('benchmark-servidor')
+    @click.option('--url', 'url_base', default='http://127.0.0.1:8000', show_default=True, help='Servidor ya levantado (python wsgi.py).')
+    @click.option('--email', required=True, help='Usuario con acceso a la bandeja.')
+    @click.option('--clave', prompt=True, hide_input=True, help='Contraseña del usuario.')
+    @click.option('--ruta', 'rutas', multiple=True, default=['/casos/'], show_default=True, help='Ruta a pedir (repetible).')
+    @click.option('--concurrencia', multiple=True, type=int, default=[1, 4, 8, 16], show_default=True, help='Usuarios simultáneos (repetible).')
+    @click.option('--duracion', default=20, show_default=True, help='Segundos por nivel de concurrencia.')
+    def benchmark_servidor_cmd(url_base, email, clave, rutas, concurrencia, duracion):
+        """Throughput y latencia de un servidor real bajo usuarios concurrentes (por defecto, casos.index)."""
+        from utils.carga import carga_concurrente
+
+        click.echo(f"{'usuarios':>8} {'pet/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peticiones':>11} {'errores':>8}")
+        for n in concurrencia:
+            try:
+                r = carga_concurrente(url_base, email, clave, rutas, n, duracion)
+            except RuntimeError as e:
+                raise click.ClickException(str(e))
+            click.echo(f"{n:>8} {r['por_segundo']:8.1f} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} {r['p99_ms']:9.1f} "
+                       f"{r['peticiones']:>11} {r['errores']:>8}")
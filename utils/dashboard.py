@@ -0,0 +1,250 @@
+from collections import Counter, namedtuple
+from datetime import date
+from sqlalchemy import event, func, inspect
+from models import db, Caso, ResumenDashboard, CatalogoRecinto, CatalogoEstablecimiento
+from utils.series import serie_temporal
+
+# Campos de Caso que definen el bucket del resumen (si cambian, el caso "se mueve" de bucket)
+CAMPOS_BUCKET = ('ciclo_vital_id', 'estado', 'recinto_notifica_id', 'recinto_inscrito_id')
+
+# Fila liviana (mismos atributos que las queries originales: .nombre / .count)
+FilaRecinto = namedtuple('FilaRecinto', ['nombre', 'count'])
+
+# ---------------------------------------------------------
+# 1) MANTENCIÓN INCREMENTAL (dentro de la misma transacción)
+# ---------------------------------------------------------
+
+def _dia(fecha):
+    """Normaliza fecha_ingreso (datetime / date / str de SQLite) a date."""
+    if fecha is None:
+        return None
+    if isinstance(fecha, str):
+        return date.fromisoformat(fecha[:10])
+    return fecha.date() if hasattr(fecha, 'date') else fecha
+
+def _bucket(ciclo_id, estado, notifica_id, inscrito_id, fecha):
+    if not ciclo_id or not fecha:
+        return None
+    return (ciclo_id, estado or 'PENDIENTE_RESCATAR', notifica_id or 0, inscrito_id or 0, _dia(fecha))
+
+def _valor_previo(caso, campo):
+    """Valor del campo antes de los cambios pendientes de este flush."""
+    hist = inspect(caso).attrs[campo].history
+    if hist.deleted:
+        return hist.deleted[0]
+    if hist.unchanged:
+        return hist.unchanged[0]
+    return getattr(caso, campo)
+
+def _aplicar_deltas(conn, deltas):
+    """UPSERT de cada bucket: total = total + delta (atómico en BD, sin leer primero)."""
+    tabla = ResumenDashboard.__table__
+    llaves = ['ciclo_vital_id', 'estado', 'recinto_notifica_id', 'recinto_inscrito_id', 'dia']
+
+    for key, delta in deltas.items():
+        if not delta:
+            continue
+        valores = dict(zip(llaves, key), total=delta)
+
+        if conn.dialect.name == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(tabla).values(**valores).on_duplicate_key_update(total=tabla.c.total + delta)
+        elif conn.dialect.name == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(tabla).values(**valores).on_conflict_do_update(
+                index_elements=llaves, set_={'total': tabla.c.total + delta}
+            )
+        else:
+            condicion = [tabla.c[k] == v for k, v in zip(llaves, key)]
+            res = conn.execute(tabla.update().where(*condicion).values(total=tabla.c.total + delta))
+            if res.rowcount:
+                continue
+            stmt = tabla.insert().values(**valores)
+
+        conn.execute(stmt)
+
+def bucket_de_campos(campos):
+    """Bucket del resumen a partir de un dict de columnas de Caso (ingreso masivo). None si no cuenta."""
+    return _bucket(*(campos.get(c) for c in CAMPOS_BUCKET), campos.get('fecha_ingreso'))
+
+def sumar_al_resumen(conn, lista_campos):
+    """Suma al resumen casos insertados con Core (sin pasar por el listener del ORM)."""
+    deltas = Counter(bucket_de_campos(campos) for campos in lista_campos)
+    deltas.pop(None, None)
+    _aplicar_deltas(conn, deltas)
+
+@event.listens_for(db.session, 'before_flush')
+def _acumular_cambios_resumen(session, flush_context, instances):
+    """
+    Traduce los INSERT/UPDATE/DELETE de Caso de este flush a deltas del resumen.
+    Cubre ingreso (formulario), asignación, gestión, cierre y anulación sin tocar cada ruta.
+    """
+    deltas = Counter()
+
+    for obj in session.new:
+        if isinstance(obj, Caso):
+            # fecha_ingreso se completa por default recién en el INSERT; la fijamos antes para conocer el día
+            if obj.fecha_ingreso is None:
+                from utils.helpers import obtener_hora_chile
+                obj.fecha_ingreso = obtener_hora_chile()
+            key = _bucket(obj.ciclo_vital_id, obj.estado, obj.recinto_notifica_id, obj.recinto_inscrito_id, obj.fecha_ingreso)
+            if key:
+                deltas[key] += 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Caso) and session.is_modified(obj):
+            antes = [_valor_previo(obj, c) for c in CAMPOS_BUCKET]
+            despues = [getattr(obj, c) for c in CAMPOS_BUCKET]
+            if antes == despues:
+                continue
+            key_antes = _bucket(*antes, obj.fecha_ingreso)
+            key_despues = _bucket(*despues, obj.fecha_ingreso)
+            if key_antes:
+                deltas[key_antes] -= 1
+            if key_despues:
+                deltas[key_despues] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Caso):
+            key = _bucket(*[_valor_previo(obj, c) for c in CAMPOS_BUCKET], obj.fecha_ingreso)
+            if key:
+                deltas[key] -= 1
+
+    if deltas:
+        _aplicar_deltas(session.connection(), deltas)
+
+_campos_con_historial = set()
+
+def _sin_efecto(target, value, oldvalue, initiator):
+    pass
+
+def forzar_historial(*campos):
+    """
+    active_history=True en estos campos de Caso: al asignarlos sobre un caso "expirado" (post-commit),
+    SQLAlchemy carga el valor anterior para que los listeners de flush sepan de dónde descontar.
+    Un solo listener por campo aunque varios módulos lo pidan.
+    """
+    for campo in campos:
+        if campo not in _campos_con_historial:
+            event.listen(getattr(Caso, campo), 'set', _sin_efecto, active_history=True)
+            _campos_con_historial.add(campo)
+
+# Bucket del resumen del que se descuenta el caso
+forzar_historial(*CAMPOS_BUCKET)
+
+# ---------------------------------------------------------
+# 2) LECTURA PARA EL DASHBOARD (O(nº de buckets))
+# ---------------------------------------------------------
+
+def serie_ingresos(ciclos_ids=None, dias=7, granularidad='dia'):
+    """Ingresos (sin anulados) por día/semana/mes desde la tabla resumen, completados con 0."""
+    return serie_temporal(ResumenDashboard.dia, _filtros_resumen(ciclos_ids), dias=dias, granularidad=granularidad,
+                          valor=func.sum(ResumenDashboard.total))
+
+def _filtros_resumen(ciclos_ids):
+    filtros = [ResumenDashboard.estado != 'ANULADO']
+    if ciclos_ids:
+        filtros.append(ResumenDashboard.ciclo_vital_id.in_(ciclos_ids))
+    return filtros
+
+def resumen_por_estado(ciclos_ids=None):
+    """{estado: total} sin anulados."""
+    filas = db.session.query(ResumenDashboard.estado, func.sum(ResumenDashboard.total)) \
+        .filter(*_filtros_resumen(ciclos_ids)) \
+        .group_by(ResumenDashboard.estado) \
+        .all()
+    # SUM() en MySQL retorna Decimal: lo normalizamos a int (serializable a JSON)
+    return {estado: int(total or 0) for estado, total in filas}
+
+def resumen_recintos_notificacion(ciclos_ids=None):
+    total_col = func.sum(ResumenDashboard.total)
+    filas = db.session.query(CatalogoRecinto.nombre, total_col.label('count')) \
+        .join(CatalogoRecinto, CatalogoRecinto.id == ResumenDashboard.recinto_notifica_id) \
+        .filter(*_filtros_resumen(ciclos_ids)) \
+        .group_by(CatalogoRecinto.nombre) \
+        .having(total_col > 0) \
+        .order_by(total_col.desc()).all()
+    return [FilaRecinto(r.nombre, int(r.count)) for r in filas]
+
+def resumen_recintos_inscritos(ciclos_ids=None, limite=5):
+    total_col = func.sum(ResumenDashboard.total)
+    filas = db.session.query(CatalogoEstablecimiento.nombre, total_col.label('count')) \
+        .join(CatalogoEstablecimiento, CatalogoEstablecimiento.id == ResumenDashboard.recinto_inscrito_id) \
+        .filter(*_filtros_resumen(ciclos_ids)) \
+        .group_by(CatalogoEstablecimiento.nombre) \
+        .having(total_col > 0) \
+        .order_by(total_col.desc()) \
+        .limit(limite).all()
+    return [FilaRecinto(r.nombre, int(r.count)) for r in filas]
+
+def leer_resumen_dashboard(ciclos_ids, dias=7, granularidad='dia'):
+    """
+    Devuelve los agregados del dashboard leyendo solo la tabla resumen.
+    'ciclos_ids': lista de ciclos permitidos (None o [] = vista global).
+    'dias' / 'granularidad': ventana de la serie de ingresos (ver utils/series.py).
+    Las filas de recintos exponen .nombre y .count, igual que las queries originales.
+    Cada parte también se lee por separado (utils/indicadores.py, API del dashboard).
+    """
+    por_estado = resumen_por_estado(ciclos_ids)
+    return {
+        'pendientes': por_estado.get('PENDIENTE_RESCATAR', 0),
+        'seguimiento': por_estado.get('EN_SEGUIMIENTO', 0),
+        'cerrados': por_estado.get('CERRADO', 0),
+        'serie': serie_ingresos(ciclos_ids, dias, granularidad),
+        'notif': resumen_recintos_notificacion(ciclos_ids),
+        'inscritos': resumen_recintos_inscritos(ciclos_ids),
+    }
+
+# ---------------------------------------------------------
+# 3) RECONSTRUCCIÓN / RECONCILIACIÓN CONTRA LA TABLA 'casos'
+# ---------------------------------------------------------
+
+def reconstruir_resumen():
+    """
+    Recalcula el resumen desde 'casos' y corrige las diferencias.
+    Retorna (buckets_reales, buckets_corregidos).
+    """
+    reales = Counter()
+    filas = db.session.query(
+        Caso.ciclo_vital_id,
+        Caso.estado,
+        func.coalesce(Caso.recinto_notifica_id, 0),
+        func.coalesce(Caso.recinto_inscrito_id, 0),
+        func.date(Caso.fecha_ingreso),
+        func.count(Caso.id)
+    ).filter(Caso.fecha_ingreso.isnot(None)).group_by(
+        Caso.ciclo_vital_id, Caso.estado,
+        func.coalesce(Caso.recinto_notifica_id, 0),
+        func.coalesce(Caso.recinto_inscrito_id, 0),
+        func.date(Caso.fecha_ingreso)
+    ).all()
+
+    for ciclo_id, estado, notif_id, insc_id, dia, n in filas:
+        reales[(ciclo_id, estado, notif_id, insc_id, _dia(dia))] = int(n)
+
+    actuales = {
+        (r.ciclo_vital_id, r.estado, r.recinto_notifica_id, r.recinto_inscrito_id, _dia(r.dia)): r
+        for r in ResumenDashboard.query.all()
+    }
+
+    corregidos = 0
+    for key, fila in actuales.items():
+        if reales.get(key, 0) != fila.total:
+            corregidos += 1
+            if key in reales:
+                fila.total = reales[key]
+            else:
+                db.session.delete(fila)
+
+    for key, n in reales.items():
+        if key not in actuales:
+            corregidos += 1
+            ciclo_id, estado, notif_id, insc_id, dia = key
+            db.session.add(ResumenDashboard(
+                ciclo_vital_id=ciclo_id, estado=estado,
+                recinto_notifica_id=notif_id, recinto_inscrito_id=insc_id,
+                dia=dia, total=n
+            ))
+
+    db.session.commit()
+    return len(reales), corregidos
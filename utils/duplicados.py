@@ -0,0 +1,234 @@
+import re
+from collections import defaultdict
+from sqlalchemy import event, inspect, select, insert, or_, and_, func
+from models import db, Caso, CasoHuella
+from utils.busqueda import normalizar_texto, normalizar_documento
+
+# Campos de Caso que alimentan las huellas (si cambian, se recalculan)
+CAMPOS_HUELLA = ('paciente_doc_numero', 'origen_rut', 'folio_atencion', 'fecha_atencion',
+                 'recinto_notifica_id', 'origen_nombres', 'origen_apellidos')
+
+# 'doc' y 'folio' identifican el ingreso casi con certeza; 'nombre' es una coincidencia débil
+TIPOS_FUERTES = ('doc', 'folio')
+LARGO_MINIMO_DOC = 5        # Documentos más cortos ("0", "S/N") no sirven como huella
+
+# Reglas fonéticas para nombres en español (orden importa)
+_REGLAS_FONETICAS = [(re.compile(p), r) for p, r in (
+    (r'ph', 'f'),
+    (r'ch', '0'),               # marcador temporal: la 'h' de 'ch' no es muda
+    (r'qu', 'k'),
+    (r'gu(?=[ei])', '1'),       # marcador: 'gue/gui' suena g, no j
+    (r'g(?=[ei])', 'j'),
+    (r'c(?=[ei])', 's'),
+    (r'c', 'k'),
+    (r'z', 's'),
+    (r'[vw]', 'b'),
+    (r'll', 'y'),
+    (r'y$', 'i'),
+    (r'h', ''),
+    (r'x', 'ks'),
+    (r'(.)\1+', r'\1'),         # letras repetidas
+    (r'0', 'ch'),
+    (r'1', 'g'),
+)]
+
+# ---------------------------------------------------------
+# 1) CLAVES
+# ---------------------------------------------------------
+
+def clave_fonetica(palabra):
+    """Clave fonética simple (español): 'Vásquez' y 'Basques' -> 'baskes'; 'Yésica' y 'Llesica' -> 'yesika'."""
+    clave = normalizar_texto(palabra).replace(' ', '')
+    for patron, reemplazo in _REGLAS_FONETICAS:
+        clave = patron.sub(reemplazo, clave)
+    return clave
+
+def _primera(texto):
+    partes = normalizar_texto(texto).split()
+    return partes[0] if partes else ''
+
+def calcular_huellas(doc_numero, origen_rut, folio, fecha_atencion, recinto_id, nombres, apellidos):
+    """Lista de (tipo, clave) para un caso. Campos vacíos simplemente no generan huella."""
+    huellas = []
+    dia = fecha_atencion.isoformat() if fecha_atencion else None
+
+    documento = normalizar_documento(doc_numero or origen_rut)
+    if dia and len(documento) >= LARGO_MINIMO_DOC:
+        huellas.append(('doc', f"{documento[:50]}|{dia}"))
+
+    folio_norm = normalizar_documento(folio)
+    if folio_norm and recinto_id:
+        huellas.append(('folio', f"{folio_norm[:50]}|{recinto_id}"))
+
+    nombre, apellido = _primera(nombres), _primera(apellidos)
+    if dia and nombre and apellido:
+        huellas.append(('nombre', f"{clave_fonetica(nombre)[:40]} {clave_fonetica(apellido)[:40]}|{dia}"))
+
+    return huellas
+
+def huellas_de_campos(campos):
+    """Huellas a partir de un dict de columnas de Caso (preparar_caso / ingreso masivo)."""
+    return calcular_huellas(campos.get('paciente_doc_numero'), campos.get('origen_rut'), campos.get('folio_atencion'),
+                            campos.get('fecha_atencion'), campos.get('recinto_notifica_id'),
+                            campos.get('origen_nombres'), campos.get('origen_apellidos'))
+
+def _huellas_caso(caso):
+    return huellas_de_campos({c: getattr(caso, c) for c in CAMPOS_HUELLA})
+
+# ---------------------------------------------------------
+# 2) SINCRONÍA (misma transacción que el INSERT/UPDATE del caso)
+# ---------------------------------------------------------
+
+@event.listens_for(db.session, 'before_flush')
+def _sincronizar_huellas(session, flush_context, instances):
+    """Crea o recalcula las huellas cuando se ingresa un caso o cambia un campo de huella."""
+    for obj in session.new:
+        if isinstance(obj, Caso):
+            obj.huellas = [CasoHuella(tipo=t, clave=k) for t, k in _huellas_caso(obj)]
+
+    for obj in session.dirty:
+        if isinstance(obj, Caso):
+            estado = inspect(obj)
+            if any(estado.attrs[c].history.has_changes() for c in CAMPOS_HUELLA):
+                obj.huellas = [CasoHuella(tipo=t, clave=k) for t, k in _huellas_caso(obj)]
+
+# ---------------------------------------------------------
+# 3) CONSULTA AL INGRESAR (1 SELECT por índice (tipo, clave))
+# ---------------------------------------------------------
+
+def _condicion(huellas):
+    por_tipo = defaultdict(set)
+    for tipo, clave in huellas:
+        por_tipo[tipo].add(clave)
+    return or_(*[and_(CasoHuella.tipo == t, CasoHuella.clave.in_(sorted(c))) for t, c in por_tipo.items()])
+
+def buscar_por_huellas(huellas):
+    """
+    Casos vigentes (no ANULADO) que comparten alguna huella.
+    Retorna {(tipo, clave): [caso_id, ...]}.
+    """
+    if not huellas:
+        return {}
+    filas = db.session.execute(
+        select(CasoHuella.tipo, CasoHuella.clave, CasoHuella.caso_id)
+        .join(Caso, Caso.id == CasoHuella.caso_id)
+        .where(_condicion(huellas), Caso.estado != 'ANULADO')
+    ).all()
+    encontrados = defaultdict(list)
+    for tipo, clave, caso_id in filas:
+        encontrados[(tipo, clave)].append(caso_id)
+    return encontrados
+
+def buscar_duplicados(campos, limite=5):
+    """
+    Posibles duplicados de un caso aún no guardado (dict de columnas).
+    Retorna [{'id', 'folio', 'fecha_atencion', 'estado', 'coincidencias': ['doc', ...]}],
+    primero los de coincidencia fuerte.
+    """
+    encontrados = buscar_por_huellas(huellas_de_campos(campos))
+    coincidencias = defaultdict(set)
+    for (tipo, _), ids in encontrados.items():
+        for caso_id in ids:
+            coincidencias[caso_id].add(tipo)
+    if not coincidencias:
+        return []
+
+    orden = sorted(coincidencias, key=lambda i: (not coincidencias[i] & set(TIPOS_FUERTES), -len(coincidencias[i]), -i))[:limite]
+    datos = {
+        f.id: f for f in db.session.execute(
+            select(Caso.id, Caso.folio_atencion, Caso.fecha_atencion, Caso.estado).where(Caso.id.in_(orden))
+        ).all()
+    }
+    return [
+        {'id': i, 'folio': datos[i].folio_atencion, 'fecha_atencion': datos[i].fecha_atencion,
+         'estado': datos[i].estado, 'coincidencias': sorted(coincidencias[i])}
+        for i in orden if i in datos
+    ]
+
+# ---------------------------------------------------------
+# 4) REPORTE DE GRUPOS (toda la tabla, sin comparar pares)
+# ---------------------------------------------------------
+
+def detectar_grupos(tipos=None):
+    """
+    Agrupa los casos vigentes que comparten huellas (GROUP BY tipo, clave + union-find).
+    Costo ~ O(n) filas de huellas, no O(n²) comparaciones.
+    Retorna [{'casos': [ids], 'tipos': [...]}] de mayor a menor.
+    """
+    tipos = tuple(tipos or ('doc', 'folio', 'nombre'))
+    vigentes = and_(CasoHuella.tipo.in_(tipos), Caso.estado != 'ANULADO')
+
+    repetidas = (
+        select(CasoHuella.tipo, CasoHuella.clave)
+        .join(Caso, Caso.id == CasoHuella.caso_id)
+        .where(vigentes)
+        .group_by(CasoHuella.tipo, CasoHuella.clave)
+        .having(func.count() > 1)
+        .subquery()
+    )
+    filas = db.session.execute(
+        select(CasoHuella.tipo, CasoHuella.clave, CasoHuella.caso_id)
+        .join(repetidas, and_(repetidas.c.tipo == CasoHuella.tipo, repetidas.c.clave == CasoHuella.clave))
+        .join(Caso, Caso.id == CasoHuella.caso_id)
+        .where(vigentes)
+        .order_by(CasoHuella.tipo, CasoHuella.clave)
+    ).all()
+
+    # Union-find: cada huella compartida une a sus casos en un mismo grupo
+    padre = {}
+
+    def raiz(x):
+        padre.setdefault(x, x)
+        while padre[x] != x:
+            padre[x] = padre[padre[x]]
+            x = padre[x]
+        return x
+
+    primero_por_clave = {}
+    tipos_por_caso = defaultdict(set)
+    for tipo, clave, caso_id in filas:
+        tipos_por_caso[caso_id].add(tipo)
+        primero = primero_por_clave.setdefault((tipo, clave), caso_id)
+        padre[raiz(caso_id)] = raiz(primero)
+
+    grupos = defaultdict(list)
+    for caso_id in tipos_por_caso:
+        grupos[raiz(caso_id)].append(caso_id)
+
+    return sorted(
+        ({'casos': sorted(ids), 'tipos': sorted(set().union(*(tipos_por_caso[i] for i in ids)))}
+         for ids in grupos.values()),
+        key=lambda g: (-len(g['casos']), g['casos'][0])
+    )
+
+# ---------------------------------------------------------
+# 5) RECONSTRUCCIÓN (carga inicial / reparación)
+# ---------------------------------------------------------
+
+def reconstruir_huellas(lote=1000):
+    """Regenera 'huellas_casos' completa desde 'casos'. Retorna cuántos casos procesó."""
+    columnas = (Caso.id, Caso.paciente_doc_numero, Caso.origen_rut, Caso.folio_atencion, Caso.fecha_atencion,
+                Caso.recinto_notifica_id, Caso.origen_nombres, Caso.origen_apellidos)
+
+    db.session.query(CasoHuella).delete(synchronize_session=False)
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        filas = db.session.execute(
+            select(*columnas).where(Caso.id > ultimo_id).order_by(Caso.id).limit(lote)
+        ).all()
+        if not filas:
+            break
+
+        nuevas = [
+            {'caso_id': fila[0], 'tipo': tipo, 'clave': clave}
+            for fila in filas for tipo, clave in calcular_huellas(*fila[1:])
+        ]
+        if nuevas:
+            db.session.execute(insert(CasoHuella), nuevas)
+        total += len(filas)
+        ultimo_id = filas[-1][0]
+
+    db.session.commit()
+    return total
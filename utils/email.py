@@ -1,6 +1,5 @@
 import os
-import smtplib
-from datetime import datetime
+from utils.helpers import obtener_hora_chile
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
@@ -24,18 +23,17 @@ def get_email_template(titulo, contenido):
     </div>
     """
 
-def enviar_correo_generico(destinatarios, asunto, cuerpo_html, adjunto_path=None, bcc=None):
+def enviar_correo_generico(destinatarios, asunto, cuerpo_html, adjunto_path=None, bcc=None, auditoria_id=None):
     """
-    Envía un correo utilizando SMTP (Gmail) de forma segura y consistente.
+    Encola un correo en la cola persistente (tabla 'cola_correos') y retorna de inmediato.
+    El envío real lo hacen los workers de utils/cola_correos.py (SMTP reutilizado + reintentos).
 
     - 'destinatarios' (To): lista o string. Visible en el correo.
     - 'bcc' (BCC): lista o string. NO visible en el correo (privacidad).
-    - Importante: usamos server.send_message(..., to_addrs=...) para controlar
-      el "envelope" SMTP y NO depender de headers Bcc.
+    - 'auditoria_id': AuditoriaCaso a actualizar con el estado final del envío. El correo
+      queda en la transacción de esa auditoría: lo persiste el commit del llamador.
 
-    Esto evita:
-    - exponer correos en envíos masivos
-    - depender de que 'send_message' elimine headers Bcc
+    Retorna True si quedó encolado (no significa entregado).
     """
     remitente = os.getenv("EMAIL_USUARIO")
     contrasena = os.getenv("EMAIL_CONTRASENA")
@@ -73,8 +71,34 @@ def enviar_correo_generico(destinatarios, asunto, cuerpo_html, adjunto_path=None
         print("ERROR: Faltan destinatarios (To/Bcc).")
         return False
 
+    # -------------------------------------------------
+    # 3) Encolar (sin tocar la sesión del llamador) y despertar a los workers
+    # -------------------------------------------------
+    from utils.cola_correos import encolar_correo
+    try:
+        encolar_correo(destinatarios, asunto, cuerpo_html, adjunto_path=adjunto_path, bcc=bcc, auditoria_id=auditoria_id)
+        return True
+    except Exception as e:
+        print(f"Error encolando correo '{asunto}': {e}")
+        return False
+
+def construir_mensaje(remitente, destinatarios, asunto, cuerpo_html, adjunto_path=None, bcc=None):
+    """
+    Arma el MIME y el "sobre" SMTP de un correo ya normalizado.
+    Retorna (msg, recipients). Lo usa el worker al momento de enviar.
+
+    Importante: usamos server.send_message(..., to_addrs=recipients) para controlar
+    el "envelope" SMTP y NO depender de headers Bcc.
+
+    Esto evita:
+    - exponer correos en envíos masivos
+    - depender de que 'send_message' elimine headers Bcc
+    """
+    destinatarios = destinatarios or []
+    bcc = bcc or []
+
     # -------------------------------------------------------------
-    # 3) Construir el mensaje (headers visibles)
+    # 1) Construir el mensaje (headers visibles)
     # -------------------------------------------------------------
     msg = MIMEMultipart()
     msg["Subject"] = asunto
@@ -88,7 +112,7 @@ def enviar_correo_generico(destinatarios, asunto, cuerpo_html, adjunto_path=None
     # La privacidad la manejamos con "to_addrs" en send_message.
 
     # Cuerpo HTML
-    msg.attach(MIMEText(cuerpo_html, "html"))
+    msg.attach(MIMEText(cuerpo_html or "", "html"))
 
     # Adjuntar archivo si corresponde
     if adjunto_path and os.path.exists(adjunto_path):
@@ -101,7 +125,7 @@ def enviar_correo_generico(destinatarios, asunto, cuerpo_html, adjunto_path=None
             print(f"Error adjuntando archivo: {e}")
 
     # -------------------------------------------------------------
-    # 4) Enviar: definimos explícitamente el "sobre" (envelope SMTP)
+    # 2) Definimos explícitamente el "sobre" (envelope SMTP)
     # -------------------------------------------------------------
     # Los receptores reales son: To visibles + BCC ocultos
     # Si To estaba vacío, el header To quedó como remitente, pero igual
@@ -119,26 +143,8 @@ def enviar_correo_generico(destinatarios, asunto, cuerpo_html, adjunto_path=None
     # Deduplicar recipients por si se repiten
     recipients = list(dict.fromkeys([r for r in recipients if r]))
 
-    try:
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.starttls()
-            server.login(remitente, contrasena)
-
-            # MODERNO + CONTROL:
-            # - send_message es moderno
-            # - to_addrs controla a quién se envía realmente (incluye BCC)
-            # - No dependemos del header Bcc (ni lo exponemos)
-            server.send_message(
-                msg,
-                from_addr=remitente,
-                to_addrs=recipients
-            )
+    return msg, recipients
 
-        return True
-
-    except Exception as e:
-        print(f"Error enviando correo '{asunto}': {e}")
-        return False
 
 # --- FUNCIONES ESPECÍFICAS DE NOTIFICACIÓN ---
 
@@ -157,7 +163,7 @@ def enviar_correo_reseteo(usuario, token):
     html = get_email_template("Recuperación de Contraseña", contenido)
     enviar_correo_generico(usuario.email, 'Restablecimiento de Contraseña - RedProtege', html)
 
-def enviar_aviso_asignacion(funcionario, caso, asignador):
+def enviar_aviso_asignacion(funcionario, caso, asignador, auditoria_id=None):
     url = url_for('casos.ver_caso', id=caso.id, _external=True)
     recinto = caso.recinto_notifica.nombre if caso.recinto_notifica else "No especificado"
     if caso.recinto_otro_texto: recinto += f" ({caso.recinto_otro_texto})"
@@ -182,7 +188,7 @@ def enviar_aviso_asignacion(funcionario, caso, asignador):
         </div>
     """
     html = get_email_template(f"Nuevo Caso Asignado #{caso.folio_atencion}", contenido)
-    return enviar_correo_generico(funcionario.email, f"Nuevo Caso Asignado #{caso.folio_atencion}", html)
+    return enviar_correo_generico(funcionario.email, f"Nuevo Caso Asignado #{caso.folio_atencion}", html, auditoria_id=auditoria_id)
 
 def enviar_aviso_nuevo_caso(caso, usuario_ingreso):
     # Lazy Import para evitar ciclos
@@ -226,6 +232,77 @@ def enviar_aviso_nuevo_caso(caso, usuario_ingreso):
     html = get_email_template(f"Nuevo Caso Ingresado #{caso.folio_atencion}", contenido)
     enviar_correo_generico(destinatarios, f"Alerta: Nuevo Caso #{caso.folio_atencion}", html)
 
+def enviar_resumen_ingreso_masivo(casos, usuario_ingreso, catalogos):
+    """
+    Versión agrupada de enviar_aviso_nuevo_caso para el ingreso masivo:
+    UN correo por destinatario con todos los casos que le corresponden
+    (Referente: los de sus ciclos; Torre Control: todos), en vez de uno por caso.
+
+    'casos': lista de dicts {id, folio, ciclo_id, fecha_atencion}.
+    Retorna cuántos correos quedaron encolados.
+    """
+    # Lazy Import para evitar ciclos
+    from models import Usuario, Rol
+    from sqlalchemy.orm import selectinload, contains_eager
+
+    if not casos:
+        return 0
+
+    ciclos_casos = {c['ciclo_id'] for c in casos}
+    destinatarios = Usuario.query.join(Rol).options(contains_eager(Usuario.rol), selectinload(Usuario.ciclos)).filter(
+        Usuario.activo == True,
+        Usuario.email.isnot(None),
+        Usuario.email != '',
+        Rol.nombre.in_(['Referente', 'Torre Control'])
+    ).all()
+
+    # Un correo por email (si alguien aparece dos veces, se unen sus ciclos)
+    por_email = {}
+    for u in destinatarios:
+        email = u.email.strip()
+        if not email:
+            continue
+        if u.rol.nombre == 'Torre Control':
+            por_email[email] = None  # None = todos los ciclos
+        elif por_email.get(email, set()) is not None:
+            por_email.setdefault(email, set()).update(c.id for c in u.ciclos if c.id in ciclos_casos)
+
+    url_bandeja = url_for('casos.index', _external=True)
+    enviados = 0
+    for email, ciclos in por_email.items():
+        propios = [c for c in casos if ciclos is None or c['ciclo_id'] in ciclos]
+        if not propios:
+            continue
+
+        filas = "".join(f"""
+            <tr>
+                <td style="padding: 6px; border-bottom: 1px solid #eee;"><a href="{url_for('casos.ver_caso', id=c['id'], _external=True)}">{c['folio']}</a></td>
+                <td style="padding: 6px; border-bottom: 1px solid #eee;">{catalogos.ciclos.obtener(c['ciclo_id']).nombre if catalogos.ciclos.obtener(c['ciclo_id']) else 'S/I'}</td>
+                <td style="padding: 6px; border-bottom: 1px solid #eee;">{c['fecha_atencion'].strftime('%d/%m/%Y') if c['fecha_atencion'] else 'S/I'}</td>
+            </tr>""" for c in propios)
+
+        contenido = f"""
+            <p>Se ingresaron <strong>{len(propios)}</strong> nuevas solicitudes al sistema que requieren revisión.</p>
+            <p style="font-size: 13px; color: #666;">Carga masiva realizada por {usuario_ingreso.nombre_completo}.</p>
+
+            <table style="width: 100%; border-collapse: collapse; font-size: 13px; margin: 20px 0;">
+                <tr style="background-color: #f8f9fa; text-align: left;">
+                    <th style="padding: 6px;">Folio</th><th style="padding: 6px;">Ciclo Vital</th><th style="padding: 6px;">Fecha Atención</th>
+                </tr>
+                {filas}
+            </table>
+
+            <div style="text-align: center; margin: 30px 0;">
+                <a href="{url_bandeja}" style="background-color: #275c80; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; font-weight: bold;">
+                    Ir a Bandeja de Casos
+                </a>
+            </div>
+        """
+        html = get_email_template(f"{len(propios)} Nuevos Casos Ingresados", contenido)
+        if enviar_correo_generico(email, f"Alerta: {len(propios)} Nuevos Casos (Carga Masiva)", html):
+            enviados += 1
+    return enviados
+
 def enviar_aviso_cierre(caso, funcionario_cierre):
     """
     Notifica cierre al referente y al funcionario
@@ -320,6 +397,7 @@ def enviar_reporte_estadistico_masivo(destinatarios_bcc, data):
       - data['global'] = {total, pendientes, seguimiento, cerrados}
       - data['inscritos'] = [{nombre,total,pendientes,seguimiento,cerrados}, ...]
       - data['notificacion'] = [{nombre,total,pct}, ...]
+      - data['tendencia'] = [{periodo,total}, ...] (opcional: ingresos por mes)
     """
     remitente = os.getenv("EMAIL_USUARIO")
     if not remitente:
@@ -329,13 +407,14 @@ def enviar_reporte_estadistico_masivo(destinatarios_bcc, data):
     stats = data.get('global', {}) or {}
     inscritos = data.get('inscritos', []) or []
     notificacion = data.get('notificacion', []) or []
+    tendencia = data.get('tendencia', []) or []
 
     # Fecha en español sin locale del sistema
     meses = {
         1: "Enero", 2: "Febrero", 3: "Marzo", 4: "Abril", 5: "Mayo", 6: "Junio",
         7: "Julio", 8: "Agosto", 9: "Septiembre", 10: "Octubre", 11: "Noviembre", 12: "Diciembre"
     }
-    now = datetime.now()
+    now = obtener_hora_chile()
     fecha_larga = f"{now.day:02d} de {meses[now.month]}, {now.year}"
     fecha_corta = now.strftime("%d/%m/%Y")
 
@@ -389,6 +468,35 @@ def enviar_reporte_estadistico_masivo(destinatarios_bcc, data):
         </tr>
     """
 
+    # -------------------------
+    # Construcción tabla tendencia (barra proporcional al mes con más ingresos)
+    # -------------------------
+    bloque_tendencia = ""
+    if tendencia:
+        maximo = max(int(x.get('total', 0) or 0) for x in tendencia) or 1
+        rows_tendencia = ""
+        for item in tendencia:
+            n = int(item.get('total', 0) or 0)
+            rows_tendencia += f"""
+        <tr>
+            <td style="padding:6px 10px; border-bottom:1px solid #E5E7EB; color:#374151; white-space:nowrap;">{item.get('periodo','')}</td>
+            <td style="padding:6px 10px; border-bottom:1px solid #E5E7EB; width:100%;">
+                <div style="background:#3B82F6; width:{round(n / maximo * 100)}%; height:8px; border-radius:999px;"></div>
+            </td>
+            <td style="padding:6px 10px; border-bottom:1px solid #E5E7EB; text-align:right; font-weight:700;">{n}</td>
+        </tr>
+        """
+        bloque_tendencia = f"""
+        <!-- TABLA TENDENCIA -->
+        <h3 style="margin:0 0 12px; font-size:16px; border-bottom:2px solid #E5E7EB; padding-bottom:8px; text-align:center;">
+            Ingresos por Mes (Últimos 12 meses)
+        </h3>
+
+        <table width="100%" cellpadding="0" cellspacing="0" style="border:1px solid #E5E7EB; border-radius:10px; overflow:hidden; font-size:12px; margin-bottom:22px;">
+            {rows_tendencia}
+        </table>
+        """
+
     contenido = f"""
     <div style="font-family: 'Segoe UI', Helvetica, Arial, sans-serif; color:#111827; line-height:1.6;">
 
@@ -529,7 +637,7 @@ def enviar_reporte_estadistico_masivo(destinatarios_bcc, data):
             </tr>
             {rows_notif}
         </table>
-
+{bloque_tendencia}
         <!-- CTA -->
         <div style="text-align: center; margin-top: 26px; padding-top: 18px; border-top: 1px solid #E5E7EB;">
             <a href="{url_for('auth.login', _external=True)}"
@@ -615,7 +723,7 @@ def enviar_aviso_subrogancia(titular, subrogante, es_activacion=True):
             <p style="margin: 6px 0;"><strong>Acción:</strong> {tipo} de Subrogancia</p>
             <p style="margin: 6px 0;"><strong>Titular:</strong> {nombre_titular}</p>
             <p style="margin: 6px 0;"><strong>Ciclo del titular:</strong> {ciclo_titular}</p>
-            <p style="margin: 6px 0;"><strong>Fecha:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M')}</p>
+            <p style="margin: 6px 0;"><strong>Fecha:</strong> {obtener_hora_chile().strftime('%d/%m/%Y %H:%M')}</p>
         </div>
 
         {detalle}
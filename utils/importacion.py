@@ -0,0 +1,366 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, date, time
+from sqlalchemy import insert
+from models import db, Caso, CasoBusqueda, CasoHuella, caso_vulneraciones
+from utils.helpers import obtener_hora_chile
+from utils.ingreso import preparar_caso, clean
+from utils.catalogos import obtener_catalogos
+from utils.busqueda import valores_de_campos, normalizar_texto
+from utils.dashboard import sumar_al_resumen
+from utils.indicadores import marcar_casos_cambiados
+from utils.duplicados import huellas_de_campos, buscar_por_huellas, TIPOS_FUERTES
+from utils.pacientes import vincular_pacientes, datos_de_campos
+
+TAMANO_BLOQUE = 500         # Casos por INSERT masivo (y por commit)
+MAX_FILAS = 5000            # Tope por archivo/petición
+EXTENSIONES = ('.csv', '.xlsx', '.json')
+
+# Columnas con nombre de catálogo (alternativa legible a *_id)
+COLUMNAS_CATALOGO = {
+    'recinto': ('recinto_id', 'recintos'),
+    'ciclo': ('ciclo_id', 'ciclos'),
+    'institucion': ('institucion_id', 'instituciones'),
+}
+VERDADEROS = {'1', 'si', 'sí', 's', 'true', 'x', 'yes'}
+
+# Columnas ENUM: un valor fuera de la lista haría fallar el bloque completo en MySQL
+COLUMNAS_ENUM = {
+    'paciente_doc_tipo': Caso.__table__.c.paciente_doc_tipo.type.enums,
+    'acomp_doc_tipo': Caso.__table__.c.acompanante_doc_tipo.type.enums,
+    'acomp_tel_tipo': Caso.__table__.c.acompanante_telefono_tipo.type.enums,
+}
+
+COLUMNAS_DE_MAS = '_columnas_de_mas'     # Marca de filas CSV con más celdas que el encabezado
+
+class ErrorImportacion(Exception):
+    """El archivo completo no se puede leer (formato, encabezados, tamaño)."""
+
+# ---------------------------------------------------------
+# 1) LECTURA DE ARCHIVOS -> lista de dicts (mismos nombres del formulario)
+# ---------------------------------------------------------
+
+def _celda(valor):
+    """Celdas de planilla a texto del formulario (fechas AAAA-MM-DD, horas HH:MM)."""
+    if isinstance(valor, (datetime, date)):
+        return valor.strftime('%Y-%m-%d')
+    if isinstance(valor, time):
+        return valor.strftime('%H:%M')
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return valor
+
+def _encabezado(valor):
+    return (clean(valor) or '').lower().replace(' ', '_')
+
+def _leer_csv(contenido):
+    texto = contenido.decode('utf-8-sig', errors='replace')
+    # Excel en español exporta con ';': el separador se deduce del encabezado
+    # (csv.Sniffer falla si alguna fila trae columnas de más)
+    encabezado = texto.split('\n', 1)[0]
+    separador = max(';,\t', key=encabezado.count)
+    lector = csv.reader(io.StringIO(texto), delimiter=separador)
+    encabezados = [_encabezado(h) for h in next(lector, [])]
+    filas = []
+    for fila in lector:
+        if not any(c.strip() for c in fila):
+            continue
+        datos = dict(zip(encabezados, fila))
+        if len(fila) > len(encabezados):
+            datos[COLUMNAS_DE_MAS] = len(fila) - len(encabezados)
+        filas.append(datos)
+    return filas
+
+def _leer_xlsx(contenido):
+    from openpyxl import load_workbook
+    libro = load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezados = [_encabezado(h) for h in next(filas, ())]
+        return [
+            {h: _celda(v) for h, v in zip(encabezados, fila) if h}
+            for fila in filas if any(v not in (None, '') for v in fila)
+        ]
+    finally:
+        libro.close()
+
+def _leer_json(contenido):
+    try:
+        datos = json.loads(contenido.decode('utf-8-sig'))
+    except ValueError as e:
+        raise ErrorImportacion(f"JSON inválido: {e}")
+    if not isinstance(datos, list) or not all(isinstance(d, dict) for d in datos):
+        raise ErrorImportacion("El JSON debe ser un arreglo de objetos.")
+    return [{_encabezado(k): v for k, v in d.items()} for d in datos]
+
+def leer_filas(contenido, nombre_archivo):
+    """Bytes de un CSV/XLSX/JSON -> lista de dicts con encabezados normalizados."""
+    extension = os.path.splitext(nombre_archivo or '')[1].lower()
+    if extension not in EXTENSIONES:
+        raise ErrorImportacion("Formato no soportado (use .csv, .xlsx o .json).")
+
+    try:
+        if extension == '.csv':
+            filas = _leer_csv(contenido)
+        elif extension == '.xlsx':
+            filas = _leer_xlsx(contenido)
+        else:
+            filas = _leer_json(contenido)
+    except ErrorImportacion:
+        raise
+    except Exception as e:
+        raise ErrorImportacion(f"No se pudo leer el archivo: {e}")
+
+    if len(filas) > MAX_FILAS:
+        raise ErrorImportacion(f"El archivo supera el máximo de {MAX_FILAS} filas por carga.")
+    return filas
+
+# ---------------------------------------------------------
+# 2) RESOLUCIÓN DE CATÁLOGOS POR NOMBRE (en memoria, una vez por carga)
+# ---------------------------------------------------------
+
+def _indice_nombres(catalogo):
+    return {normalizar_texto(i.nombre): i.id for i in catalogo.todos}
+
+def _resolver(valor, indice):
+    """Id numérico tal cual, o nombre (sin tildes/mayúsculas) -> id. None si no existe."""
+    if isinstance(valor, int):
+        return valor
+    v = clean(valor)
+    if v is None:
+        return None
+    if v.isdigit():
+        return int(v)
+    return indice.get(normalizar_texto(v))
+
+def _bandera(valor):
+    if isinstance(valor, bool):
+        return '1' if valor else '0'
+    return '1' if (clean(valor) or '').lower() in VERDADEROS else '0'
+
+def _normalizar_fila(fila, catalogos, indices):
+    """Fila cruda -> (datos con nombres del formulario, vulneraciones_ids, errores de catálogo)."""
+    datos = {k: _celda(v) for k, v in fila.items()}
+    errores = []
+
+    if datos.pop(COLUMNAS_DE_MAS, None):
+        errores.append("La fila tiene más columnas que el encabezado (¿un ';' dentro de un texto sin comillas?).")
+
+    for columna, (campo_id, nombre_catalogo) in COLUMNAS_CATALOGO.items():
+        if clean(datos.get(campo_id)) is None and clean(datos.get(columna)) is not None:
+            resuelto = _resolver(datos[columna], indices[nombre_catalogo])
+            if resuelto is None:
+                errores.append(f"{columna.capitalize()} '{datos[columna]}' no existe en el catálogo.")
+            datos[campo_id] = resuelto
+
+    # Vulneraciones: lista (JSON) o texto separado por ';' / '|' (nombres o ids)
+    crudas = datos.get('vulneraciones') or []
+    if not isinstance(crudas, (list, tuple)):
+        crudas = str(crudas).replace('|', ';').split(';')
+    vulneraciones_ids = []
+    for v in crudas:
+        if clean(v) is None:
+            continue
+        resuelto = _resolver(v, indices['vulneraciones'])
+        if resuelto is None or resuelto not in catalogos.vulneraciones:
+            errores.append(f"Vulneración '{v}' no existe en el catálogo.")
+        else:
+            vulneraciones_ids.append(resuelto)
+
+    for campo in ('denuncia_realizada', 'acompanante_presente'):
+        datos[campo] = _bandera(datos.get(campo))
+    for campo, permitidos in COLUMNAS_ENUM.items():
+        valor = clean(datos.get(campo))
+        if valor is None:
+            continue
+        datos[campo] = valor.upper()
+        if datos[campo] not in permitidos:
+            errores.append(f"{campo}: '{valor}' no es válido ({', '.join(permitidos)}).")
+
+    return datos, vulneraciones_ids, errores
+
+def validar_filas(filas, catalogos=None, primera_fila=2):
+    """
+    Valida todas las filas con las mismas reglas del formulario.
+    Retorna (validas, errores): validas = [(n_fila, campos, vulneraciones_ids)],
+    errores = [{'fila': n, 'folio': ..., 'errores': [...]}].
+    'primera_fila' = número de la primera fila de datos (2 en planillas con encabezado).
+    """
+    catalogos = catalogos or obtener_catalogos()
+    indices = {
+        'recintos': _indice_nombres(catalogos.recintos),
+        'ciclos': _indice_nombres(catalogos.ciclos),
+        'instituciones': _indice_nombres(catalogos.instituciones),
+        'vulneraciones': _indice_nombres(catalogos.vulneraciones),
+    }
+
+    validas, errores = [], []
+    for n, fila in enumerate(filas, start=primera_fila):
+        datos, vulneraciones_ids, errores_catalogo = _normalizar_fila(fila, catalogos, indices)
+        campos, vulneraciones_ids, errores_fila = preparar_caso(datos, vulneraciones_ids, catalogos)
+        errores_fila = errores_catalogo + errores_fila
+        if errores_fila:
+            errores.append({'fila': n, 'folio': clean(datos.get('folio_atencion')), 'errores': errores_fila})
+        else:
+            validas.append((n, campos, vulneraciones_ids))
+    return validas, errores
+
+def marcar_duplicados(validas, errores, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Separa de 'validas' las filas que repiten un caso vigente o una fila anterior del mismo
+    archivo y las agrega a 'errores'. Solo cuentan las huellas fuertes (documento+día,
+    folio+recinto): sin un usuario que confirme, la coincidencia por nombre no basta.
+    Consulta la BD por bloques de huellas (índice tipo+clave), no una vez por fila.
+    Retorna (validas, errores).
+    """
+    huellas_por_fila = [
+        [h for h in huellas_de_campos(campos) if h[0] in TIPOS_FUERTES]
+        for _, campos, _ in validas
+    ]
+
+    todas = list(dict.fromkeys(h for huellas in huellas_por_fila for h in huellas))
+    en_bd = {}
+    for inicio in range(0, len(todas), tamano_bloque):
+        en_bd.update(buscar_por_huellas(todas[inicio:inicio + tamano_bloque]))
+
+    etiquetas = {'doc': 'documento y fecha de atención', 'folio': 'folio y recinto'}
+    vistas = {}     # huella -> primera fila del archivo que la trae
+    depuradas = []
+    for (n, campos, vulneraciones_ids), huellas in zip(validas, huellas_por_fila):
+        mensajes = []
+        for h in huellas:
+            if h in en_bd:
+                ids = ", ".join(f"#{i}" for i in en_bd[h])
+                mensajes.append(f"Posible duplicado ({etiquetas[h[0]]}) del caso {ids}.")
+            elif h in vistas:
+                mensajes.append(f"Posible duplicado ({etiquetas[h[0]]}) de la fila {vistas[h]}.")
+        if mensajes:
+            errores.append({'fila': n, 'folio': campos['folio_atencion'], 'errores': mensajes})
+            continue
+        for h in huellas:
+            vistas.setdefault(h, n)
+        depuradas.append((n, campos, vulneraciones_ids))
+
+    errores.sort(key=lambda e: e['fila'])
+    return depuradas, errores
+
+# ---------------------------------------------------------
+# 3) INSERCIÓN MASIVA (executemany por bloques)
+# ---------------------------------------------------------
+
+def _insertar_bloque(conn, bloque):
+    """
+    Inserta un bloque de casos y retorna sus ids en el mismo orden.
+    Con RETURNING ordenado (SQLite, MariaDB, PostgreSQL) es un único executemany;
+    MySQL no lo soporta, así que ahí cada INSERT devuelve su lastrowid (misma transacción).
+    """
+    tabla = Caso.__table__
+    filas = [campos for _, campos, _ in bloque]
+    if conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+        stmt = insert(tabla).returning(tabla.c.id, sort_by_parameter_order=True)
+        return list(conn.execute(stmt, filas).scalars())
+    return [conn.execute(insert(tabla), fila).inserted_primary_key[0] for fila in filas]
+
+def insertar_casos(validas, tamano_bloque=TAMANO_BLOQUE):
+    """
+    Persiste las filas validadas: casos + caso_vulneraciones + busqueda_casos + huellas_casos +
+    pacientes_casos + resumen del dashboard + caché de indicadores (los INSERT de Core no pasan
+    por los listeners del ORM). Commit por bloque.
+    Retorna [(n_fila, caso_id, campos)].
+    """
+    insertados = []
+    for inicio in range(0, len(validas), tamano_bloque):
+        bloque = validas[inicio:inicio + tamano_bloque]
+        ahora = obtener_hora_chile()
+        for _, campos, _ in bloque:
+            campos.setdefault('fecha_ingreso', ahora)
+            campos.setdefault('updated_at', ahora)
+
+        try:
+            conn = db.session.connection()
+            ids = _insertar_bloque(conn, bloque)
+
+            enlaces = [
+                {'caso_id': caso_id, 'vulneracion_id': v_id}
+                for caso_id, (_, _, vulneraciones_ids) in zip(ids, bloque)
+                for v_id in vulneraciones_ids
+            ]
+            if enlaces:
+                conn.execute(insert(caso_vulneraciones), enlaces)
+
+            conn.execute(insert(CasoBusqueda), [
+                {'caso_id': caso_id, **valores_de_campos(c)}
+                for caso_id, (_, c, _) in zip(ids, bloque)
+            ])
+
+            huellas = [
+                {'caso_id': caso_id, 'tipo': tipo, 'clave': clave}
+                for caso_id, (_, c, _) in zip(ids, bloque)
+                for tipo, clave in huellas_de_campos(c)
+            ]
+            if huellas:
+                conn.execute(insert(CasoHuella), huellas)
+
+            vincular_pacientes(conn, [(caso_id, datos_de_campos(c)) for caso_id, (_, c, _) in zip(ids, bloque)])
+
+            sumar_al_resumen(conn, [c for _, c, _ in bloque])
+            marcar_casos_cambiados(db.session, {c['ciclo_vital_id'] for _, c, _ in bloque}, ())
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        insertados.extend((n, caso_id, campos) for caso_id, (n, campos, _) in zip(ids, bloque))
+    return insertados
+
+# ---------------------------------------------------------
+# 4) FLUJO COMPLETO (lo usan la ruta y el comando CLI)
+# ---------------------------------------------------------
+
+def importar_filas(filas, usuario, simular=False, primera_fila=2, permitir_duplicados=False):
+    """
+    Valida, inserta y notifica (un resumen por destinatario, no un correo por caso).
+    Las filas con error (o posibles duplicados, salvo 'permitir_duplicados') se informan
+    y no se insertan; las válidas sí.
+    Retorna {'total', 'validas', 'insertados', 'ids', 'errores', 'simulado'}.
+    """
+    from utils.email import enviar_resumen_ingreso_masivo
+    from utils.helpers import registrar_log
+
+    catalogos = obtener_catalogos()
+    validas, errores = validar_filas(filas, catalogos, primera_fila=primera_fila)
+    if not permitir_duplicados:
+        validas, errores = marcar_duplicados(validas, errores)
+
+    resultado = {'total': len(filas), 'validas': len(validas), 'insertados': 0, 'ids': [],
+                 'errores': errores, 'simulado': simular}
+    if simular or not validas:
+        return resultado
+
+    insertados = insertar_casos(validas)
+    resultado['insertados'] = len(insertados)
+    resultado['ids'] = [caso_id for _, caso_id, _ in insertados]
+
+    registrar_log("Ingreso Masivo", f"{len(insertados)} casos ingresados por {usuario.email} "
+                                    f"({len(errores)} filas con error)", usuario=usuario)
+
+    enviar_resumen_ingreso_masivo([
+        {'id': caso_id, 'folio': campos['folio_atencion'], 'ciclo_id': campos['ciclo_vital_id'],
+         'fecha_atencion': campos['fecha_atencion']}
+        for _, caso_id, campos in insertados
+    ], usuario, catalogos)
+
+    return resultado
+
+def reporte_errores_csv(errores):
+    """Reporte de filas rechazadas (fila;folio;error) para devolver al remitente."""
+    salida = io.StringIO()
+    escritor = csv.writer(salida, delimiter=';')
+    escritor.writerow(['fila', 'folio', 'error'])
+    for e in errores:
+        for mensaje in e['errores']:
+            escritor.writerow([e['fila'], e['folio'] or '', mensaje])
+    return salida.getvalue()
@@ -0,0 +1,179 @@
+# utils/indicadores.py
+# Indicadores del dashboard de la bandeja (KPIs y gráficos), cada uno por separado y
+# cacheado unos segundos por alcance (extensions.cache): paginar o buscar en la tabla no los recalcula.
+import os
+from itertools import chain
+from sqlalchemy import case, event, func, inspect
+from extensions import cache
+from models import db, Caso, CatalogoRecinto, CatalogoEstablecimiento
+from utils.alcance import etiquetas_caso
+from utils.dashboard import resumen_por_estado, resumen_recintos_notificacion, resumen_recintos_inscritos, serie_ingresos, forzar_historial
+from utils.series import serie_temporal, etiqueta, VENTANAS
+
+TTL_INDICADORES = int(os.getenv('DASHBOARD_TTL', '30'))    # Segundos que se reutiliza un indicador
+
+# Campos de Caso que definen quién lo ve (Alcance.etiquetas()): si cambian, se invalida el caché
+CAMPOS_CICLO = ('ciclo_vital_id',)
+CAMPOS_ASIGNACION = ('asignado_ts_id', 'asignado_a_usuario_id', 'asignado_coord_id')
+
+# Colores fijos de la leyenda de recintos de notificación (cíclicos)
+COLORES_RECINTOS = ['#3B82F6', '#FBBF24', '#22C55E', '#A855F7', '#EC4899', '#6B7280']  # Azul, Amarillo, Verde, Morado, Rosa, Gris
+
+# ---------------------------------------------------------
+# 1) CACHÉ POR ALCANCE
+# ---------------------------------------------------------
+
+def _cacheado(alcance, clave, calcular, ttl=None):
+    """
+    Resultado de calcular() reutilizado durante 'ttl' segundos para la misma 'clave'
+    (que incluye Alcance.clave(): todos los Admin comparten la vista global).
+    Se invalida antes si cambia un caso de ese alcance (ver _casos_cambiados).
+    """
+    ttl = TTL_INDICADORES if ttl is None else ttl
+    return cache.obtener_o_calcular('indicadores', clave, calcular, ttl, alcance.etiquetas())
+
+def _ciclos(alcance):
+    return sorted(alcance.ciclo_ids)
+
+def _filtros(alcance):
+    """TS / Coordinador Ciclo: el filtro es por asignación (no existe en el resumen), universo acotado."""
+    return [*alcance.filtros(), Caso.estado != 'ANULADO']
+
+def _porcentaje(parte, total):
+    return round((parte / total * 100), 1) if total > 0 else 0
+
+# ---------------------------------------------------------
+# 2) INDICADORES (dicts serializables a JSON)
+# ---------------------------------------------------------
+
+def kpis(alcance):
+    """Totales por estado (sin anulados) y sus porcentajes."""
+    def calcular():
+        if alcance.usa_resumen:
+            por_estado = resumen_por_estado(_ciclos(alcance))
+            pendientes = por_estado.get('PENDIENTE_RESCATAR', 0)
+            seguimiento = por_estado.get('EN_SEGUIMIENTO', 0)
+            cerrados = por_estado.get('CERRADO', 0)
+        else:
+            r = db.session.query(
+                func.sum(case((Caso.estado == 'PENDIENTE_RESCATAR', 1), else_=0)),
+                func.sum(case((Caso.estado == 'EN_SEGUIMIENTO', 1), else_=0)),
+                func.sum(case((Caso.estado == 'CERRADO', 1), else_=0))
+            ).filter(*_filtros(alcance)).first()
+            pendientes, seguimiento, cerrados = (int(v or 0) for v in r)
+
+        total = pendientes + seguimiento + cerrados
+        return {
+            'total': total,
+            'pendientes': pendientes,
+            'seguimiento': seguimiento,
+            'cerrados': cerrados,
+            'pct_pendientes': _porcentaje(pendientes, total),
+            'pct_seguimiento': _porcentaje(seguimiento, total),
+            'pct_cerrados': _porcentaje(cerrados, total),
+        }
+    return _cacheado(alcance, ('kpis', alcance.clave()), calcular)
+
+def grafico_ingresos(alcance, ventana, granularidad):
+    """Ingresos por periodo (7/30/90/365 días), ya completados con 0."""
+    def calcular():
+        if alcance.usa_resumen:
+            serie = serie_ingresos(_ciclos(alcance), ventana, granularidad)
+        else:
+            serie = serie_temporal(Caso.fecha_ingreso, _filtros(alcance), dias=ventana, granularidad=granularidad)
+        return {
+            'ventana': ventana,
+            'ventanas': list(VENTANAS),
+            'titulo': 'Rendimiento Semanal' if ventana == 7 else 'Ingresos de Casos',
+            # Etiquetas para Chart.js (Ej: "Lun", "05/03", "Mar 2025")
+            'labels': [etiqueta(p.inicio, granularidad, ventana) for p in serie],
+            'values': [p.total for p in serie],
+        }
+    return _cacheado(alcance, ('ingresos', alcance.clave(), ventana, granularidad), calcular)
+
+def grafico_notificacion(alcance):
+    """Casos por recinto de notificación (dona) con leyenda: nombre, total, % y color."""
+    def calcular():
+        if alcance.usa_resumen:
+            filas = resumen_recintos_notificacion(_ciclos(alcance))
+        else:
+            filas = db.session.query(
+                CatalogoRecinto.nombre,
+                func.count(Caso.id).label('count')
+            ).join(Caso.recinto_notifica)\
+             .filter(*_filtros(alcance))\
+             .group_by(CatalogoRecinto.nombre)\
+             .order_by(func.count(Caso.id).desc()).all()
+
+        total = sum(row.count for row in filas)
+        leyenda = [{
+            'nombre': row.nombre,
+            'count': row.count,
+            'pct': _porcentaje(row.count, total),
+            'color': COLORES_RECINTOS[idx % len(COLORES_RECINTOS)],
+        } for idx, row in enumerate(filas)]
+        return {
+            'labels': [row.nombre for row in filas],
+            'values': [row.count for row in filas],
+            'total': total,
+            'leyenda': leyenda,
+        }
+    return _cacheado(alcance, ('notificacion', alcance.clave()), calcular)
+
+def grafico_inscritos(alcance):
+    """Top 5 de recintos de inscripción (barras horizontales)."""
+    def calcular():
+        if alcance.usa_resumen:
+            filas = resumen_recintos_inscritos(_ciclos(alcance))
+        else:
+            filas = db.session.query(
+                CatalogoEstablecimiento.nombre,
+                func.count(Caso.id).label('count')
+            ).join(Caso.recinto_inscrito)\
+             .filter(*_filtros(alcance))\
+             .group_by(CatalogoEstablecimiento.nombre)\
+             .order_by(func.count(Caso.id).desc())\
+             .limit(5).all()
+        return {
+            'labels': [row.nombre for row in filas],
+            'values': [row.count for row in filas],
+        }
+    return _cacheado(alcance, ('inscritos', alcance.clave()), calcular)
+
+# ---------------------------------------------------------
+# 3) INVALIDACIÓN (tras el commit que cambió casos)
+# ---------------------------------------------------------
+
+def marcar_casos_cambiados(session, ciclos, usuarios):
+    """Etiquetas que el commit de 'session' invalidará (un rollback las descarta)."""
+    session.info.setdefault('cache_etiquetas', set()).update(etiquetas_caso(ciclos, usuarios))
+
+@event.listens_for(db.session, 'before_flush')
+def _casos_cambiados(session, flush_context, instances):
+    """
+    Etiquetas de los casos de este flush (ciclo y asignados, antes y después del cambio):
+    el commit descarta indicadores y totales de esos alcances en vez de esperar el TTL.
+    """
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Caso) or (obj in session.dirty and not session.is_modified(obj)):
+            continue
+        estado = inspect(obj)
+        # Valor actual + el anterior si cambió (un caso reasignado afecta a ambos alcances)
+        ciclos, usuarios = (
+            [v for c in campos for v in (getattr(obj, c), *estado.attrs[c].history.deleted)]
+            for campos in (CAMPOS_CICLO, CAMPOS_ASIGNACION)
+        )
+        marcar_casos_cambiados(session, ciclos, usuarios)
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidar_tras_commit(session):
+    etiquetas = session.info.pop('cache_etiquetas', None)
+    if etiquetas:
+        cache.invalidar(*etiquetas)
+
+@event.listens_for(db.session, 'after_rollback')
+def _descartar_etiquetas(session):
+    session.info.pop('cache_etiquetas', None)
+
+# Al reasignar un caso "expirado" se invalida también el alcance del que sale
+forzar_historial(*CAMPOS_CICLO, *CAMPOS_ASIGNACION)
@@ -0,0 +1,211 @@
+from datetime import datetime, date, time
+from utils.helpers import safe_int
+from utils.rut import es_rut_valido, clean_rut, rut_excede_largo
+
+# ---------------------------------------------------------
+# 1) NORMALIZACIÓN DE CAMPOS
+# ---------------------------------------------------------
+
+def clean(value):
+    """Convierte espacios vacios a None para guardar NULL en BD."""
+    if value is None:
+        return None
+    v = str(value).strip()
+    return v if v else None
+
+def _fecha(valor):
+    """'AAAA-MM-DD' (o date/datetime de una planilla) -> date. None si viene vacío."""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    v = clean(valor)
+    return datetime.strptime(v[:10], '%Y-%m-%d').date() if v else None
+
+def _hora(valor):
+    """'HH:MM' (o time/datetime de una planilla) -> time. None si viene vacío."""
+    if isinstance(valor, datetime):
+        return valor.time()
+    if isinstance(valor, time):
+        return valor
+    v = clean(valor)
+    return datetime.strptime(v[:5], '%H:%M').time() if v else None
+
+# ---------------------------------------------------------
+# 2) VALIDACIÓN DE UNA SOLICITUD (formulario e ingreso masivo)
+# ---------------------------------------------------------
+
+def preparar_caso(f, vulneraciones_ids, catalogos):
+    """
+    Valida y normaliza una solicitud con los mismos nombres de campo del formulario.
+    'f' es request.form o un dict (fila de planilla), 'vulneraciones_ids' lista de ints
+    y 'catalogos' el resultado de obtener_catalogos().
+
+    Retorna (campos, vulneraciones_ids, errores):
+    - campos: dict listo para Caso(**campos) o un INSERT masivo
+    - vulneraciones_ids: ids existentes, sin duplicados
+    - errores: lista de mensajes (si no está vacía, 'campos' es None)
+    """
+    errores = []
+
+    # Normalización de IDs
+    recinto_id_int = safe_int(f.get('recinto_id'))
+    ciclo_id_int = safe_int(f.get('ciclo_id'))
+    institucion_id_int = safe_int(f.get('institucion_id'))
+    vulneraciones_ids = [v for v in dict.fromkeys(vulneraciones_ids) if v in catalogos.vulneraciones]
+
+    # Campos obligatorios
+    # Nota: Nombres y Apellidos del paciente YA NO son obligatorios (pueden venir vacíos)
+    if not clean(f.get('fecha_atencion')) or not clean(f.get('folio_atencion')):
+        errores.append("Faltan datos de fecha o folio de atención.")
+
+    if not recinto_id_int:
+        errores.append("Debe seleccionar un Recinto de Notificación.")
+    elif recinto_id_int not in catalogos.recintos:
+        errores.append("El Recinto de Notificación seleccionado no existe.")
+
+    if not ciclo_id_int:
+        errores.append("Debe seleccionar un Ciclo Vital.")
+    elif ciclo_id_int not in catalogos.ciclos:
+        errores.append("El Ciclo Vital seleccionado no existe.")
+
+    if not vulneraciones_ids:
+        errores.append("Debe seleccionar al menos un Tipo de Vulneración.")
+
+    relato = clean(f.get('relato_caso'))
+    if not relato:
+        errores.append("El relato del caso es obligatorio.")
+
+    # Fechas (formato del formulario: AAAA-MM-DD y HH:MM)
+    try:
+        fecha_atencion_dt = _fecha(f.get('fecha_atencion'))
+        hora_atencion_dt = _hora(f.get('hora_atencion'))
+        fecha_nac_dt = _fecha(f.get('paciente_fecha_nac'))
+    except ValueError:
+        errores.append("Formato de fecha u hora inválido (use AAAA-MM-DD y HH:MM).")
+
+    # RUT paciente: validar SOLO si tipo=RUT y viene valor
+    paciente_doc_tipo = clean(f.get('paciente_doc_tipo'))
+    paciente_doc_num_raw = f.get('paciente_doc_numero')
+    paciente_doc_num = clean_rut(paciente_doc_num_raw) if paciente_doc_tipo == 'RUT' else clean(paciente_doc_num_raw)
+
+    if paciente_doc_tipo == 'RUT' and paciente_doc_num:
+        if rut_excede_largo(paciente_doc_num):
+            errores.append("El RUT del paciente excede el largo permitido.")
+        elif not es_rut_valido(paciente_doc_num):
+            errores.append("El RUT del paciente ingresado no es válido.")
+
+    # RUT acompañante: validar SOLO si tipo=RUT y viene valor
+    acomp_doc_tipo = clean(f.get('acomp_doc_tipo'))
+    acomp_doc_num_raw = f.get('acomp_doc_numero')
+    acomp_doc_num = clean_rut(acomp_doc_num_raw) if acomp_doc_tipo == 'RUT' else clean(acomp_doc_num_raw)
+
+    if acomp_doc_tipo == 'RUT' and acomp_doc_num:
+        if rut_excede_largo(acomp_doc_num):
+            errores.append("El RUT del acompañante excede el largo permitido.")
+        elif not es_rut_valido(acomp_doc_num):
+            errores.append("El RUT del acompañante ingresado no es válido.")
+
+    # Denuncia: si marcó "Sí", institución y profesional son obligatorios
+    denuncia_flag = (f.get('denuncia_realizada') == '1')
+    if denuncia_flag:
+        if not institucion_id_int:
+            errores.append("Si se realizó denuncia, debe seleccionar la Institución.")
+        elif institucion_id_int not in catalogos.instituciones:
+            errores.append("La Institución de la denuncia no existe.")
+        if not clean(f.get('denuncia_nombre')):
+            errores.append("Si se realizó denuncia, debe indicar el Nombre del Profesional.")
+
+    # Acompañante: si viene acompañado, el teléfono es obligatorio
+    acompanante_presente = (f.get('acompanante_presente') == '1')
+    if acompanante_presente and not clean(f.get('acomp_telefono')):
+        errores.append("Si el paciente viene acompañado, el teléfono del acompañante es obligatorio.")
+
+    if errores:
+        return None, vulneraciones_ids, errores
+
+    # Campos "Otro"
+    recinto_texto = f.get('recinto_otro') if catalogos.recintos.es_otro(recinto_id_int) else None
+    flag_vuln_otro = any(catalogos.vulneraciones.es_otro(v) for v in vulneraciones_ids)
+    vulneracion_texto = clean(f.get('vulneracion_otro_txt')) if flag_vuln_otro else None
+
+    # Si NO hubo denuncia, todos los campos relacionados quedan en None (NULL en DB)
+    denuncia_inst_id = denuncia_inst_otro = denuncia_prof_nombre = denuncia_prof_cargo = None
+    if denuncia_flag:
+        denuncia_inst_id = institucion_id_int
+        if catalogos.instituciones.es_otro(denuncia_inst_id):
+            denuncia_inst_otro = clean(f.get('institucion_otro'))
+        denuncia_prof_nombre = clean(f.get('denuncia_nombre'))
+        denuncia_prof_cargo = clean(f.get('denuncia_cargo'))
+
+    # Si NO viene acompañado, todos los campos del acompañante quedan en None
+    acomp_nombre = acomp_parentesco = acomp_telefono = acomp_tel_tipo = None
+    acomp_doc_otro_desc = a_calle = a_num = a_dom = None
+    if acompanante_presente:
+        acomp_nombre = clean(f.get('acomp_nombre'))
+        acomp_parentesco = clean(f.get('acomp_parentesco'))
+        acomp_telefono = clean(f.get('acomp_telefono'))
+        acomp_tel_tipo = clean(f.get('acomp_tel_tipo'))
+        acomp_doc_otro_desc = clean(f.get('acomp_doc_otro_desc')) if acomp_doc_tipo == 'OTRO' else None
+        a_calle = clean(f.get('acomp_calle'))
+        a_num = clean(f.get('acomp_numero'))
+        a_dom = f"{a_calle} #{a_num}".strip(" #") if (a_calle or a_num) else None
+    else:
+        acomp_doc_tipo = None
+        acomp_doc_num = None
+
+    # Direcciones (vacío => NULL)
+    p_calle = clean(f.get('paciente_calle'))
+    p_num = clean(f.get('paciente_numero'))
+    p_dom = f"{p_calle} #{p_num}".strip(" #") if (p_calle or p_num) else None
+
+    campos = dict(
+        # Antecedentes
+        fecha_atencion=fecha_atencion_dt,
+        hora_atencion=hora_atencion_dt,
+        recinto_notifica_id=recinto_id_int,
+        recinto_otro_texto=recinto_texto,
+        folio_atencion=clean(f.get('folio_atencion')),
+        ingresado_por_nombre=clean(f.get('funcionario_nombre')),
+        ingresado_por_cargo=clean(f.get('funcionario_cargo')),
+        ciclo_vital_id=ciclo_id_int,
+
+        # Paciente (Permite Nulos)
+        origen_nombres=clean(f.get('paciente_nombres')),
+        origen_apellidos=clean(f.get('paciente_apellidos')),
+        origen_rut=clean(paciente_doc_num_raw) if paciente_doc_tipo == 'RUT' else None,  # Llenamos legacy
+        origen_fecha_nacimiento=fecha_nac_dt,  # Llenamos legacy
+        origen_relato=relato,
+
+        paciente_doc_tipo=paciente_doc_tipo,
+        paciente_doc_numero=paciente_doc_num,  # normalizado si es RUT, clean si no
+        paciente_doc_otro_descripcion=clean(f.get('paciente_doc_otro_desc')) if paciente_doc_tipo == 'OTRO' else None,
+        paciente_fecha_nacimiento=fecha_nac_dt,
+        paciente_direccion_calle=p_calle,
+        paciente_direccion_numero=p_num,
+        paciente_domicilio=p_dom,
+
+        # Acompañante
+        acompanante_presente=acompanante_presente,
+        acompanante_nombre=acomp_nombre,
+        acompanante_parentesco=acomp_parentesco,
+        acompanante_telefono=acomp_telefono,
+        acompanante_telefono_tipo=acomp_tel_tipo,
+        acompanante_doc_tipo=acomp_doc_tipo,
+        acompanante_doc_numero=acomp_doc_num,
+        acompanante_doc_otro_descripcion=acomp_doc_otro_desc,
+        acompanante_direccion_calle=a_calle,
+        acompanante_direccion_numero=a_num,
+        acompanante_domicilio=a_dom,
+
+        # Denuncia
+        denuncia_realizada=denuncia_flag,
+        denuncia_institucion_id=denuncia_inst_id,
+        denuncia_institucion_otro=denuncia_inst_otro,
+        denuncia_profesional_nombre=denuncia_prof_nombre,
+        denuncia_profesional_cargo=denuncia_prof_cargo,
+
+        vulneracion_otro_texto=vulneracion_texto,
+        estado='PENDIENTE_RESCATAR'
+    )
+    return campos, vulneraciones_ids, errores
@@ -0,0 +1,406 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from flask import g, request, has_request_context, before_render_template, template_rendered, Response, abort
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from reloj import ZONA_CHILE
+
+PREFIJO = 'redprotege'
+
+# Límites de los histogramas (segundos / cantidad de consultas)
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Petición más lenta que esto (ms) se informa en consola con su desglose
+UMBRAL_LENTO_MS = int(os.getenv('METRICAS_UMBRAL_LENTO_MS', '1000'))
+
+# Token para el endpoint Prometheus (Authorization: Bearer <token>); sin token solo Admin
+TOKEN_METRICAS = os.getenv('METRICAS_TOKEN')
+
+DESCRIPCIONES = {
+    'peticion_segundos': 'Duración de la petición por endpoint',
+    'peticion_sql_consultas': 'Consultas SQL por petición',
+    'peticion_sql_segundos': 'Tiempo en la BD por petición',
+    'fase_segundos': 'Duración de sub-fases marcadas en una vista',
+    'plantilla_segundos': 'Render de plantillas Jinja',
+    'sql_segundos': 'Consultas SQL (peticiones, workers y CLI)',
+    'smtp_segundos': 'Envío SMTP de un correo',
+    'pdf_segundos': 'Generación de un acta PDF (ReportLab, medida en el proceso hijo)',
+}
+
+_lock = threading.Lock()
+_histogramas = {}           # (nombre, etiquetas) -> Histograma
+_contadores = {}            # (nombre, etiquetas) -> int
+_inicio_proceso = time.time()
+
+# ---------------------------------------------------------
+# 1) REGISTRO (en memoria, por proceso)
+# ---------------------------------------------------------
+
+class Histograma:
+    """Histograma acumulado al estilo Prometheus (conteo por límite + suma + máximo)."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.conteos = [0] * len(buckets)
+        self.total = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, valor):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.conteos[i] += 1
+                break
+        self.total += 1
+        self.suma += valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def percentil(self, p):
+        """Estimación por interpolación dentro del bucket (como histogram_quantile)."""
+        if not self.total:
+            return 0.0
+        objetivo = self.total * p
+        acumulado = 0
+        anterior = 0.0
+        for limite, conteo in zip(self.buckets, self.conteos):
+            if conteo and acumulado + conteo >= objetivo:
+                return anterior + (limite - anterior) * (objetivo - acumulado) / conteo
+            acumulado += conteo
+            anterior = limite
+        return self.maximo       # Sobre el último límite
+
+    @property
+    def promedio(self):
+        return self.suma / self.total if self.total else 0.0
+
+def _clave(nombre, etiquetas):
+    return nombre, tuple(sorted(etiquetas.items()))
+
+def observar(nombre, valor, buckets=BUCKETS_SEGUNDOS, **etiquetas):
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        hist = _histogramas.get(clave)
+        if hist is None:
+            hist = _histogramas[clave] = Histograma(buckets)
+        hist.observar(valor)
+
+def incrementar(nombre, cantidad=1, **etiquetas):
+    clave = _clave(nombre, etiquetas)
+    with _lock:
+        _contadores[clave] = _contadores.get(clave, 0) + cantidad
+
+def reiniciar_metricas():
+    """Vacía el registro (ej: antes de una medición controlada)."""
+    global _inicio_proceso
+    with _lock:
+        _histogramas.clear()
+        _contadores.clear()
+        _inicio_proceso = time.time()
+
+# ---------------------------------------------------------
+# 2) MEDICIÓN (peticiones, fases, bloques)
+# ---------------------------------------------------------
+
+def _endpoint():
+    return request.endpoint or 'sin_ruta'
+
+@contextmanager
+def medir(nombre, **etiquetas):
+    """
+    Mide un bloque y lo registra en el histograma '<nombre>_segundos'.
+    Funciona dentro y fuera de peticiones (workers de correo/actas, CLI).
+    Uso: with medir('smtp'): conn.send_message(...)
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        observar(f'{nombre}_segundos', duracion, **etiquetas)
+        if has_request_context() and 'metricas_inicio' in g:
+            g.metricas_bloques[nombre] = g.metricas_bloques.get(nombre, 0.0) + duracion
+
+def iniciar_fase(nombre):
+    """
+    Marca el comienzo de una sub-fase de la vista (ej: 'kpis', 'grafico', 'tabla').
+    La fase anterior se cierra aquí; la última, al renderizar la plantilla o al terminar.
+    Se registra en 'fase_segundos' por endpoint y aparece en el log de peticiones lentas.
+    """
+    if not has_request_context() or 'metricas_inicio' not in g:
+        return
+    _cerrar_fase()
+    g.metricas_fase = (nombre, time.perf_counter())
+
+def _cerrar_fase():
+    actual = g.get('metricas_fase')
+    if actual is None:
+        return
+    nombre, inicio = actual
+    duracion = time.perf_counter() - inicio
+    g.metricas_fase = None
+    g.metricas_fases.append((nombre, duracion))
+    observar('fase_segundos', duracion, endpoint=_endpoint(), fase=nombre)
+
+def _iniciar_peticion():
+    g.metricas_inicio = time.perf_counter()
+    g.metricas_sql = [0, 0.0]           # [consultas, segundos]
+    g.metricas_fases = []
+    g.metricas_fase = None
+    g.metricas_bloques = {}
+    g.metricas_plantillas = []
+
+def _registrar_estado(response):
+    g.metricas_estado = response.status_code
+    return response
+
+def _terminar_peticion(exc=None):
+    inicio = g.pop('metricas_inicio', None)
+    if inicio is None:
+        return
+    _cerrar_fase()
+    duracion = time.perf_counter() - inicio
+    endpoint = _endpoint()
+    estado = g.pop('metricas_estado', 500 if exc else 200)
+    consultas, tiempo_sql = g.metricas_sql
+
+    observar('peticion_segundos', duracion, endpoint=endpoint, metodo=request.method)
+    observar('peticion_sql_consultas', consultas, buckets=BUCKETS_CONSULTAS, endpoint=endpoint)
+    observar('peticion_sql_segundos', tiempo_sql, endpoint=endpoint)
+    incrementar('respuestas_total', endpoint=endpoint, estado=str(estado))
+
+    if duracion * 1000 >= UMBRAL_LENTO_MS:
+        incrementar('peticiones_lentas_total', endpoint=endpoint)
+        _informar_lenta(endpoint, estado, duracion, consultas, tiempo_sql)
+
+def _informar_lenta(endpoint, estado, duracion, consultas, tiempo_sql):
+    partes = [f"SQL {consultas} consultas / {tiempo_sql * 1000:.0f} ms"]
+    if g.metricas_fases:
+        partes.append("fases " + ", ".join(f"{n}={d * 1000:.0f}ms" for n, d in g.metricas_fases))
+    if g.metricas_plantillas:
+        partes.append("plantillas " + ", ".join(f"{n}={d * 1000:.0f}ms" for n, d in g.metricas_plantillas))
+    for nombre, total in g.metricas_bloques.items():
+        partes.append(f"{nombre} {total * 1000:.0f} ms")
+    usuario = current_user.get_id() if current_user else None
+    print(f"⚠️ Petición lenta: {request.method} {request.full_path.rstrip('?')} [{endpoint}] -> {estado} "
+          f"en {duracion * 1000:.0f} ms (usuario {usuario or '-'}) | " + " | ".join(partes))
+
+# ---------------------------------------------------------
+# 3) GANCHOS: SQLAlchemy y Jinja
+# ---------------------------------------------------------
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metricas_sql', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _despues_sql(conn, cursor, statement, parameters, context, executemany):
+    pila = conn.info.get('metricas_sql')
+    if not pila:
+        return
+    duracion = time.perf_counter() - pila.pop()
+    observar('sql_segundos', duracion)
+    if has_request_context() and 'metricas_sql' in g:
+        g.metricas_sql[0] += 1
+        g.metricas_sql[1] += duracion
+
+@event.listens_for(Engine, 'handle_error')
+def _error_sql(contexto):
+    # Sin after_cursor_execute: se descarta el inicio pendiente
+    conexion = contexto.connection
+    if conexion is not None and conexion.info.get('metricas_sql'):
+        conexion.info['metricas_sql'].pop()
+
+def _antes_plantilla(app, template, context, **extra):
+    if 'metricas_inicio' not in g:
+        return
+    _cerrar_fase()          # El render no se cuenta dentro de la última fase
+    g.setdefault('metricas_render', []).append(time.perf_counter())
+
+def _plantilla_lista(app, template, context, **extra):
+    pila = g.get('metricas_render')
+    if not pila:
+        return
+    duracion = time.perf_counter() - pila.pop()
+    nombre = template.name or 'sin_nombre'
+    g.metricas_plantillas.append((nombre, duracion))
+    observar('plantilla_segundos', duracion, plantilla=nombre)
+
+# ---------------------------------------------------------
+# 4) EXPOSICIÓN (panel Admin y formato Prometheus)
+# ---------------------------------------------------------
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _etiquetas_texto(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+def _copia():
+    with _lock:
+        histogramas = {
+            clave: (h.buckets, list(h.conteos), h.total, h.suma, h.maximo)
+            for clave, h in _histogramas.items()
+        }
+        return histogramas, dict(_contadores)
+
+def exportar_prometheus():
+    """Registro completo en formato de texto de Prometheus (0.0.4)."""
+    histogramas, contadores = _copia()
+    lineas = []
+
+    por_nombre = {}
+    for (nombre, etiquetas), datos in sorted(histogramas.items()):
+        por_nombre.setdefault(nombre, []).append((etiquetas, datos))
+
+    for nombre, series in por_nombre.items():
+        metrica = f'{PREFIJO}_{nombre}'
+        lineas.append(f'# HELP {metrica} {DESCRIPCIONES.get(nombre, nombre)}')
+        lineas.append(f'# TYPE {metrica} histogram')
+        for etiquetas, (buckets, conteos, total, suma, _) in series:
+            acumulado = 0
+            for limite, conteo in zip(buckets, conteos):
+                acumulado += conteo
+                lineas.append(f'{metrica}_bucket{_etiquetas_texto(etiquetas, [("le", limite)])} {acumulado}')
+            lineas.append(f'{metrica}_bucket{_etiquetas_texto(etiquetas, [("le", "+Inf")])} {total}')
+            lineas.append(f'{metrica}_sum{_etiquetas_texto(etiquetas)} {suma:.6f}')
+            lineas.append(f'{metrica}_count{_etiquetas_texto(etiquetas)} {total}')
+
+    nombres_contadores = sorted({nombre for nombre, _ in contadores})
+    for nombre in nombres_contadores:
+        metrica = f'{PREFIJO}_{nombre}'
+        lineas.append(f'# TYPE {metrica} counter')
+        for (n, etiquetas), valor in sorted(contadores.items()):
+            if n == nombre:
+                lineas.append(f'{metrica}{_etiquetas_texto(etiquetas)} {valor}')
+
+    lineas.append(f'# TYPE {PREFIJO}_proceso_inicio_segundos gauge')
+    lineas.append(f'{PREFIJO}_proceso_inicio_segundos {_inicio_proceso:.0f}')
+    return "\n".join(lineas) + "\n"
+
+def _backend_cache():
+    from extensions import cache
+    return cache.backend.nombre
+
+def resumen_metricas():
+    """
+    Tablas para el panel Admin: una fila por endpoint (latencias, SQL, errores),
+    más fases, plantillas y bloques (SMTP / PDF / SQL total).
+    """
+    histogramas, contadores = _copia()
+
+    def fila(datos):
+        buckets, conteos, total, suma, maximo = datos
+        h = Histograma(buckets)
+        h.conteos, h.total, h.suma, h.maximo = conteos, total, suma, maximo
+        return {
+            'total': total,
+            'promedio_ms': h.promedio * 1000,
+            'p50_ms': h.percentil(0.50) * 1000,
+            'p95_ms': h.percentil(0.95) * 1000,
+            'p99_ms': h.percentil(0.99) * 1000,
+            'max_ms': maximo * 1000,
+            'suma': suma,
+        }
+
+    endpoints = {}
+    fases, plantillas, bloques = [], [], []
+    for (nombre, etiquetas), datos in histogramas.items():
+        e = dict(etiquetas)
+        if nombre == 'peticion_segundos':
+            endpoints.setdefault(e['endpoint'], {'endpoint': e['endpoint'], 'metodos': []})
+            endpoints[e['endpoint']]['metodos'].append((e['metodo'], fila(datos)))
+        elif nombre == 'fase_segundos':
+            fases.append({'endpoint': e['endpoint'], 'fase': e['fase'], **fila(datos)})
+        elif nombre == 'plantilla_segundos':
+            plantillas.append({'plantilla': e['plantilla'], **fila(datos)})
+        elif not e:
+            bloques.append({'nombre': nombre.replace('_segundos', ''), **fila(datos)})
+
+    filas = []
+    for endpoint, info in endpoints.items():
+        for metodo, datos in info['metodos']:
+            sql_n = histogramas.get(_clave('peticion_sql_consultas', {'endpoint': endpoint}))
+            sql_t = histogramas.get(_clave('peticion_sql_segundos', {'endpoint': endpoint}))
+            errores = sum(v for (n, et), v in contadores.items()
+                          if n == 'respuestas_total' and dict(et)['endpoint'] == endpoint and int(dict(et)['estado']) >= 500)
+            lentas = contadores.get(_clave('peticiones_lentas_total', {'endpoint': endpoint}), 0)
+            filas.append({
+                'endpoint': endpoint, 'metodo': metodo, **datos,
+                'sql_consultas': (sql_n[3] / sql_n[2]) if sql_n and sql_n[2] else 0,
+                'sql_ms': (sql_t[3] / sql_t[2] * 1000) if sql_t and sql_t[2] else 0,
+                'errores': errores,
+                'lentas': lentas,
+            })
+
+    # Caché HTTP (utils/cache_http.py): estáticos que cada página no vuelve a descargar y 304
+    cache = {}
+    for (nombre, etiquetas), valor in contadores.items():
+        if nombre.startswith('cache_'):
+            endpoint = dict(etiquetas)['endpoint']
+            cache.setdefault(endpoint, {'endpoint': endpoint, 'paginas': 0, 'bytes_estaticos': 0,
+                                        'respuestas_304': 0, 'bytes_304': 0})
+            campo = {'cache_paginas_total': 'paginas', 'cache_bytes_estaticos_total': 'bytes_estaticos',
+                     'cache_304_total': 'respuestas_304', 'cache_bytes_304_total': 'bytes_304'}[nombre]
+            cache[endpoint][campo] = valor
+    for f in cache.values():
+        f['kb_por_pagina'] = f['bytes_estaticos'] / f['paginas'] / 1024 if f['paginas'] else 0
+        f['kb_ahorrados'] = (f['bytes_estaticos'] + f['bytes_304']) / 1024
+
+    # Caché de datos (cache_datos.py): aciertos / fallos / desalojos / invalidaciones por espacio
+    datos_cache = {}
+    for (nombre, etiquetas), valor in contadores.items():
+        if nombre.startswith('datos_cache_'):
+            espacio = dict(etiquetas)['espacio']
+            datos_cache.setdefault(espacio, {'espacio': espacio, 'aciertos': 0, 'fallos': 0,
+                                             'desalojos': 0, 'invalidadas': 0})
+            datos_cache[espacio][nombre[len('datos_cache_'):-len('_total')]] = valor
+    for f in datos_cache.values():
+        consultas = f['aciertos'] + f['fallos']
+        f['pct_aciertos'] = f['aciertos'] / consultas * 100 if consultas else 0
+
+    # Lo que más tiempo total consume primero
+    ordenar = lambda lista: sorted(lista, key=lambda f: f['suma'], reverse=True)
+    return {
+        'cache': sorted(cache.values(), key=lambda f: f['kb_ahorrados'], reverse=True),
+        'datos_cache': sorted(datos_cache.values(), key=lambda f: f['espacio']),
+        'backend_cache': _backend_cache(),
+        'endpoints': ordenar(filas),
+        'fases': sorted(fases, key=lambda f: (f['endpoint'], -f['suma'])),
+        'plantillas': ordenar(plantillas),
+        'bloques': ordenar(bloques),
+        'desde': datetime.fromtimestamp(_inicio_proceso, ZONA_CHILE),
+        'pid': os.getpid(),
+        'umbral_lento_ms': UMBRAL_LENTO_MS,
+    }
+
+def _vista_prometheus():
+    """GET /metrics: Bearer METRICAS_TOKEN (scraper) o sesión de Admin."""
+    autorizado = False
+    if TOKEN_METRICAS:
+        autorizado = request.headers.get('Authorization') == f'Bearer {TOKEN_METRICAS}'
+    if not autorizado:
+        autorizado = current_user.is_authenticated and current_user.rol.nombre == 'Admin'
+    if not autorizado:
+        abort(403)
+    return Response(exportar_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+def iniciar_metricas(app):
+    """
+    Registra los ganchos de medición. Va antes de los demás before_request para que
+    la duración incluya login, reloj y bitácora.
+    """
+    app.before_request(_iniciar_peticion)
+    app.after_request(_registrar_estado)
+    app.teardown_request(_terminar_peticion)
+    before_render_template.connect(_antes_plantilla, app)
+    template_rendered.connect(_plantilla_lista, app)
+    app.add_url_rule('/metrics', 'metricas_prometheus', _vista_prometheus)
@@ -0,0 +1,185 @@
+from sqlalchemy import event, inspect, select, insert, delete, func, and_, case
+from models import db, Caso, Paciente, CasoPaciente
+from utils.busqueda import normalizar_documento
+from utils.duplicados import LARGO_MINIMO_DOC
+
+# Campos de Caso que definen la identidad del paciente (si cambian, se re-vincula)
+CAMPOS_IDENTIDAD = ('paciente_doc_numero', 'origen_rut', 'paciente_doc_tipo')
+MAX_OTROS_CASOS = 20        # Filas del panel "Otros casos del paciente"
+
+# ---------------------------------------------------------
+# 1) IDENTIDAD
+# ---------------------------------------------------------
+
+def documento_paciente(doc_numero, origen_rut):
+    """Documento normalizado del paciente ('12.345.678-5' -> '123456785'); None si no identifica a nadie."""
+    documento = normalizar_documento(doc_numero or origen_rut)[:50]
+    return documento if len(documento) >= LARGO_MINIMO_DOC else None
+
+def _datos_paciente(doc_tipo, doc_numero, origen_rut, nombres, apellidos, fecha_nacimiento):
+    return {
+        'documento': documento_paciente(doc_numero, origen_rut),
+        'doc_tipo': doc_tipo if doc_numero else ('RUT' if origen_rut else None),
+        'nombres': nombres,
+        'apellidos': apellidos,
+        'fecha_nacimiento': fecha_nacimiento,
+    }
+
+def datos_de_campos(campos):
+    """Datos del paciente a partir de un dict de columnas de Caso (ingreso masivo)."""
+    return _datos_paciente(campos.get('paciente_doc_tipo'), campos.get('paciente_doc_numero'), campos.get('origen_rut'),
+                           campos.get('origen_nombres'), campos.get('origen_apellidos'),
+                           campos.get('paciente_fecha_nacimiento'))
+
+def _datos_caso(caso):
+    return _datos_paciente(caso.paciente_doc_tipo, caso.paciente_doc_numero, caso.origen_rut,
+                           caso.origen_nombres, caso.origen_apellidos, caso.paciente_fecha_nacimiento)
+
+def _completar(paciente, datos):
+    """Completa los datos que le falten al paciente (no pisa lo ya registrado)."""
+    for campo in ('doc_tipo', 'nombres', 'apellidos', 'fecha_nacimiento'):
+        if getattr(paciente, campo) is None and datos[campo] is not None:
+            setattr(paciente, campo, datos[campo])
+
+# ---------------------------------------------------------
+# 2) SINCRONÍA (misma transacción que el INSERT/UPDATE del caso)
+# ---------------------------------------------------------
+
+@event.listens_for(db.session, 'before_flush')
+def _sincronizar_paciente(session, flush_context, instances):
+    """Vincula el caso con su paciente al ingresarlo o cuando cambia el documento."""
+    pendientes = [obj for obj in session.new if isinstance(obj, Caso)]
+    for obj in session.dirty:
+        if isinstance(obj, Caso):
+            estado = inspect(obj)
+            if any(estado.attrs[c].history.has_changes() for c in CAMPOS_IDENTIDAD):
+                pendientes.append(obj)
+    if not pendientes:
+        return
+
+    datos = {id(caso): _datos_caso(caso) for caso in pendientes}
+    documentos = {d['documento'] for d in datos.values() if d['documento']}
+
+    with session.no_autoflush:
+        # Un solo SELECT por flush (aunque se ingresen varios casos a la vez)
+        pacientes = {}
+        if documentos:
+            pacientes = {p.documento: p for p in session.query(Paciente).filter(Paciente.documento.in_(sorted(documentos)))}
+
+        for caso in pendientes:
+            d = datos[id(caso)]
+            if not d['documento']:
+                caso.vinculo_paciente = None
+                continue
+
+            paciente = pacientes.get(d['documento'])
+            if paciente is None:
+                paciente = pacientes[d['documento']] = Paciente(**d)
+            else:
+                _completar(paciente, d)
+
+            if caso.vinculo_paciente is None:
+                caso.vinculo_paciente = CasoPaciente(paciente=paciente)
+            elif caso.vinculo_paciente.paciente is not paciente:
+                caso.vinculo_paciente.paciente = paciente
+
+# ---------------------------------------------------------
+# 3) VINCULACIÓN POR LOTES (ingreso masivo, reconstrucción)
+# ---------------------------------------------------------
+
+def _ids_pacientes(conn, documentos):
+    if not documentos:
+        return {}
+    return dict(conn.execute(
+        select(Paciente.documento, Paciente.id).where(Paciente.documento.in_(sorted(documentos)))
+    ).all())
+
+def vincular_pacientes(conn, casos):
+    """
+    Crea los pacientes que falten y vincula los casos con INSERT de Core (sin pasar por el ORM).
+    'casos' = [(caso_id, datos)] con datos de datos_de_campos(). Consultas por bloque, no por caso.
+    Retorna cuántos casos quedaron vinculados.
+    """
+    por_documento = {}
+    for _, d in casos:
+        if d['documento']:
+            por_documento.setdefault(d['documento'], d)     # Primer caso del bloque define el paciente
+    if not por_documento:
+        return 0
+
+    ids = _ids_pacientes(conn, por_documento)
+    nuevos = [d for documento, d in por_documento.items() if documento not in ids]
+    if nuevos:
+        # Sin RETURNING en MySQL: se insertan y se vuelven a leer sus ids (1 SELECT por bloque)
+        conn.execute(insert(Paciente), nuevos)
+        ids.update(_ids_pacientes(conn, [d['documento'] for d in nuevos]))
+
+    vinculos = [
+        {'caso_id': caso_id, 'paciente_id': ids[d['documento']]}
+        for caso_id, d in casos if d['documento']
+    ]
+    conn.execute(insert(CasoPaciente), vinculos)
+    return len(vinculos)
+
+def reconstruir_pacientes(lote=1000):
+    """
+    Regenera 'pacientes' y 'pacientes_casos' desde 'casos' (en orden de ingreso, así los
+    datos del paciente son los de su primer caso). Retorna (casos, pacientes).
+    """
+    columnas = (Caso.id, Caso.paciente_doc_tipo, Caso.paciente_doc_numero, Caso.origen_rut,
+                Caso.origen_nombres, Caso.origen_apellidos, Caso.paciente_fecha_nacimiento)
+
+    conn = db.session.connection()
+    conn.execute(delete(CasoPaciente))
+    conn.execute(delete(Paciente))
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        filas = conn.execute(
+            select(*columnas).where(Caso.id > ultimo_id).order_by(Caso.id).limit(lote)
+        ).all()
+        if not filas:
+            break
+        vincular_pacientes(conn, [(fila[0], _datos_paciente(*fila[1:])) for fila in filas])
+        total += len(filas)
+        ultimo_id = filas[-1][0]
+
+    db.session.commit()
+    return total, db.session.query(Paciente).count()
+
+# ---------------------------------------------------------
+# 4) LÍNEA DE TIEMPO (panel "Otros casos del paciente")
+# ---------------------------------------------------------
+
+def otros_casos_paciente(caso, filtros=(), limite=MAX_OTROS_CASOS):
+    """
+    Otras derivaciones del mismo paciente dentro del alcance (filtros = Alcance.filtros()),
+    de la más reciente a la más antigua, y cuántas quedan fuera de ese alcance.
+    Un SELECT por el índice (paciente_id, caso_id); sin buscar por nombre. Con filtros, un COUNT
+    más para el total: de los casos fuera del alcance solo se informa la cantidad.
+    """
+    paciente_id = (
+        select(CasoPaciente.paciente_id)
+        .where(CasoPaciente.caso_id == caso.id)
+        .scalar_subquery()
+    )
+    del_paciente = (CasoPaciente.paciente_id == paciente_id, Caso.id != caso.id)
+    filas = db.session.execute(
+        select(Caso.id, Caso.folio_atencion, Caso.fecha_atencion, Caso.estado, Caso.ciclo_vital_id,
+               Caso.recinto_notifica_id)
+        .join(CasoPaciente, CasoPaciente.caso_id == Caso.id)
+        .where(*del_paciente, *filtros)
+        .order_by(Caso.fecha_atencion.desc(), Caso.id.desc())
+        .limit(limite)
+    ).all()
+    if not filtros:
+        return filas, 0
+
+    visibles, total = db.session.execute(
+        select(func.count(case((and_(*filtros), Caso.id))), func.count())
+        .select_from(Caso)
+        .join(CasoPaciente, CasoPaciente.caso_id == Caso.id)
+        .where(*del_paciente)
+    ).one()
+    return filas, total - visibles
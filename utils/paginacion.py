@@ -0,0 +1,145 @@
+from datetime import datetime
+from flask import current_app
+from itsdangerous import URLSafeSerializer, BadSignature
+from sqlalchemy import or_, and_
+from extensions import cache
+
+TTL_CONTEO = 60             # Segundos que se reutiliza un total ya contado
+
+# ---------------------------------------------------------
+# 1) TOKEN OPACO (firmado con SECRET_KEY)
+# ---------------------------------------------------------
+
+def _serializador():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='cursor-paginacion')
+
+def codificar_cursor(tramo, fecha, id_, direccion):
+    """(tramo, fecha, id, 'n'|'p') -> string URL-safe. El cliente no puede fabricarlo ni leer su orden."""
+    return _serializador().dumps([tramo, fecha.isoformat() if fecha else None, id_, direccion])
+
+def decodificar_cursor(token):
+    """Retorna (tramo, fecha, id, direccion) o None si el token falta o fue alterado (-> primera página)."""
+    if not token:
+        return None
+    try:
+        tramo, fecha, id_, direccion = _serializador().loads(token)
+        return int(tramo), datetime.fromisoformat(fecha) if fecha else None, int(id_), direccion
+    except (BadSignature, ValueError, TypeError):
+        return None
+
+# ---------------------------------------------------------
+# 2) PÁGINA POR CURSOR (keyset)
+# ---------------------------------------------------------
+
+class PaginaCursor:
+    """Resultado de paginar_por_cursor; reemplaza al objeto Pagination de Flask-SQLAlchemy en las plantillas."""
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def _posterior(columna_fecha, columna_id, fecha, id_):
+    """Filas que van DESPUÉS del cursor en orden (fecha DESC, id DESC). NULL queda al final (MySQL y SQLite)."""
+    if fecha is None:
+        return and_(columna_fecha.is_(None), columna_id < id_)
+    return or_(
+        columna_fecha < fecha,
+        and_(columna_fecha == fecha, columna_id < id_),
+        columna_fecha.is_(None)
+    )
+
+def _anterior(columna_fecha, columna_id, fecha, id_):
+    """Filas que van ANTES del cursor en orden (fecha DESC, id DESC)."""
+    if fecha is None:
+        return or_(columna_fecha.isnot(None), columna_id > id_)
+    return or_(
+        columna_fecha > fecha,
+        and_(columna_fecha == fecha, columna_id > id_)
+    )
+
+def paginar_por_cursor(query, columna_fecha, columna_id, cursor=None, per_page=15, tramos=None, total=None):
+    """
+    Paginación keyset ordenada por (tramo, fecha DESC, id DESC).
+
+    'tramos' es una lista ordenada de condiciones (ej: una por estado del caso). Cada tramo se
+    consulta por separado con LIMIT y la condición del cursor, así MySQL recorre el índice
+    (estado, fecha, id) desde la posición exacta: la página 500 cuesta lo mismo que la 1.
+    Sin tramos, es un único orden (fecha DESC, id DESC).
+    """
+    tramos = tramos or [None]
+    posicion = decodificar_cursor(cursor)
+    if posicion and not 0 <= posicion[0] < len(tramos):
+        posicion = None
+
+    hacia_atras = bool(posicion) and posicion[3] == 'p'
+    if hacia_atras:
+        recorrido = range(posicion[0], -1, -1)
+    else:
+        recorrido = range(posicion[0] if posicion else 0, len(tramos))
+
+    # Pedimos una fila extra para saber si hay más allá de esta página
+    filas = []
+    for indice in recorrido:
+        q = query
+        if tramos[indice] is not None:
+            q = q.filter(tramos[indice])
+
+        if posicion and indice == posicion[0]:
+            _, fecha, id_, _ = posicion
+            limite = _anterior if hacia_atras else _posterior
+            q = q.filter(limite(columna_fecha, columna_id, fecha, id_))
+
+        if hacia_atras:
+            q = q.order_by(columna_fecha.asc(), columna_id.asc())
+        else:
+            q = q.order_by(columna_fecha.desc(), columna_id.desc())
+
+        filas.extend((indice, obj) for obj in q.limit(per_page + 1 - len(filas)).all())
+        if len(filas) > per_page:
+            break
+
+    hay_mas = len(filas) > per_page
+    filas = filas[:per_page]
+    if hacia_atras:
+        filas.reverse()
+
+    def _token(fila, direccion):
+        indice, obj = fila
+        return codificar_cursor(indice, getattr(obj, columna_fecha.key), getattr(obj, columna_id.key), direccion)
+
+    if hacia_atras:
+        # Volviendo: siempre hay "siguiente" (la página de donde venimos)
+        hay_siguiente, hay_anterior = bool(filas), hay_mas
+    else:
+        hay_siguiente, hay_anterior = hay_mas, bool(posicion) and bool(filas)
+
+    return PaginaCursor(
+        items=[obj for _, obj in filas],
+        per_page=per_page,
+        next_cursor=_token(filas[-1], 'n') if hay_siguiente else None,
+        prev_cursor=_token(filas[0], 'p') if hay_anterior else None,
+        total=total
+    )
+
+# ---------------------------------------------------------
+# 3) TOTAL CACHEADO
+# ---------------------------------------------------------
+
+def contar_con_cache(clave, query, ttl=TTL_CONTEO, etiquetas=()):
+    """
+    COUNT(*) de 'query' reutilizado durante 'ttl' segundos para la misma 'clave'
+    (que debe incluir usuario y filtros). Al navegar entre páginas no se vuelve a contar.
+    'etiquetas' (ej: Alcance.etiquetas()) lo descartan antes si cambian los datos contados.
+    """
+    return cache.obtener_o_calcular('conteos', clave, lambda: query.order_by(None).count(), ttl, etiquetas)
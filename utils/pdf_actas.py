@@ -1,4 +1,7 @@
+import io
 import os
+import threading
+from PIL import Image as PILImage
 from reportlab.lib.pagesizes import LETTER
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -24,8 +27,127 @@ def pretty(valor):
     """Devuelve el texto bonito del ENUM o el valor original si no existe."""
     return LABELS.get(valor, valor or '-')
 
+# ---------------------------------------------------------
+# Caché de assets (logos pre-escalados, estilos y TableStyles)
+# Se arma una vez por proceso y se invalida solo si cambian los logos (mtime/tamaño).
+# ---------------------------------------------------------
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+LOGOS = (
+    os.path.join(BASE_DIR, 'static', 'img', 'Logo_Red_APS_2.png'),
+    os.path.join(BASE_DIR, 'static', 'img', 'logoMaho.png'),
+)
+LOGO_ANCHO, LOGO_ALTO = 120, 50   # Tamaño en el PDF (puntos)
+ESCALA_LOGO = 3                   # Pixeles por punto (~216 dpi): nítido al imprimir y liviano
+
+_cache_assets = {'firma': None, 'assets': None}
+_lock_assets = threading.Lock()
+
+def _firma_logos():
+    """(mtime, tamaño) de cada logo; None si no existe."""
+    firma = []
+    for path in LOGOS:
+        try:
+            st = os.stat(path)
+            firma.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            firma.append(None)
+    return tuple(firma)
+
+def _preescalar_logo(path):
+    """Decodifica el PNG original (miles de px) y lo deja al tamaño de impresión, en bytes PNG."""
+    with PILImage.open(path) as im:
+        im = im.convert('RGBA').resize((LOGO_ANCHO * ESCALA_LOGO, LOGO_ALTO * ESCALA_LOGO), PILImage.LANCZOS)
+        buffer = io.BytesIO()
+        im.save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+def _construir_assets(logos):
+    """'logos': tupla de bytes PNG (o rutas, sin caché) o None si falta alguno."""
+    styles = getSampleStyleSheet()
+    return {
+        'logos': logos,
+        'styles': styles,
+        'titulo': ParagraphStyle(
+            'TituloActa',
+            parent=styles['Heading1'],
+            alignment=TA_CENTER,
+            fontSize=16,
+            spaceAfter=20,
+            textColor=colors.HexColor('#275c80')
+        ),
+        'subtitulo': ParagraphStyle(
+            'Subtitulo',
+            parent=styles['Heading2'],
+            fontSize=12,
+            spaceBefore=15,
+            spaceAfter=10,
+            textColor=colors.HexColor('#444444')
+        ),
+        'tabla_logos': TableStyle([
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (2, 0), (2, 0), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            # Eliminamos padding extra de la tabla de logos para que pegue bien arriba
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+        ]),
+        'tabla_general': TableStyle([
+            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f0f0')),
+            ('TEXTCOLOR', (0, 0), (0, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ]),
+        # Paciente y Gestión comparten formato
+        'tabla_ficha': TableStyle([
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ]),
+        'tabla_historial': TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#EFF6FF')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#275c80')),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]),
+    }
 
-def generar_acta_cierre_pdf(caso, output_filename, usuario_cierre):
+def obtener_assets(usar_cache=True):
+    """
+    Assets listos para armar el acta.
+    usar_cache=False reproduce el costo original (logos completos desde disco); útil para el benchmark.
+    """
+    if not usar_cache:
+        existen = all(os.path.exists(p) for p in LOGOS)
+        return _construir_assets(LOGOS if existen else None)
+
+    firma = _firma_logos()
+    if _cache_assets['assets'] is None or _cache_assets['firma'] != firma:
+        with _lock_assets:
+            if _cache_assets['assets'] is None or _cache_assets['firma'] != firma:
+                logos = None
+                if all(firma):
+                    try:
+                        logos = tuple(_preescalar_logo(p) for p in LOGOS)
+                    except Exception as e:
+                        print(f"Error preparando logos del acta: {e}")
+                _cache_assets['assets'] = _construir_assets(logos)
+                _cache_assets['firma'] = firma
+    return _cache_assets['assets']
+
+def _logo(fuente):
+    """Flowable de logo desde bytes pre-escalados (caché) o desde la ruta original."""
+    origen = io.BytesIO(fuente) if isinstance(fuente, bytes) else fuente
+    return Image(origen, width=LOGO_ANCHO, height=LOGO_ALTO)
+
+def generar_acta_cierre_pdf(caso, output_filename, usuario_cierre, usar_cache=True):
     """
     Genera un PDF con el Acta de Cierre del caso usando ReportLab.
     Guarda el archivo en la ruta especificada.
@@ -51,35 +173,25 @@ def generar_acta_cierre_pdf(caso, output_filename, usuario_cierre):
         bottomMargin=30
     )
     elements = []
-    styles = getSampleStyleSheet()
+    assets = obtener_assets(usar_cache)
+    styles = assets['styles']
 
     # ---------------------------------------------------------
     # --- LOGOS (CABECERA) ---
-    # Calculamos ruta absoluta a static/img
-    # Asumiendo estructura: /utils/pdf_actas.py -> subir -> /static/img
+    # Vienen de la caché de assets (static/img, pre-escalados)
     # ---------------------------------------------------------
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-    logo1_path = os.path.join(base_dir, 'static', 'img', 'Logo_Red_APS_2.png')
-    logo2_path = os.path.join(base_dir, 'static', 'img', 'logoMaho.png')
 
     # Tabla invisible para logos
-    if os.path.exists(logo1_path) and os.path.exists(logo2_path):
-        img1 = Image(logo1_path, width=120, height=50)  # Ajusta tamaño según necesidad
-        img2 = Image(logo2_path, width=120, height=50)
+    if assets['logos']:
+        img1 = _logo(assets['logos'][0])
+        img2 = _logo(assets['logos'][1])
 
         img1.hAlign = 'LEFT'
         img2.hAlign = 'RIGHT'
 
         data_logos = [[img1, '', img2]]
         t_logos = Table(data_logos, colWidths=[200, 140, 200])
-        t_logos.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (2, 0), (2, 0), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            # Eliminamos padding extra de la tabla de logos para que pegue bien arriba
-            ('TOPPADDING', (0, 0), (-1, -1), 0),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-        ]))
+        t_logos.setStyle(assets['tabla_logos'])
         elements.append(t_logos)
         elements.append(Spacer(1, 10))
     else:
@@ -87,24 +199,10 @@ def generar_acta_cierre_pdf(caso, output_filename, usuario_cierre):
         elements.append(Paragraph("Red de Atención Primaria de Salud Municipal - Alto Hospicio", styles['Normal']))
 
     # ---------------------------------------------------------
-    # Estilos Personalizados
+    # Estilos Personalizados (desde la caché)
     # ---------------------------------------------------------
-    estilo_titulo = ParagraphStyle(
-        'TituloActa',
-        parent=styles['Heading1'],
-        alignment=TA_CENTER,
-        fontSize=16,
-        spaceAfter=20,
-        textColor=colors.HexColor('#275c80')
-    )
-    estilo_subtitulo = ParagraphStyle(
-        'Subtitulo',
-        parent=styles['Heading2'],
-        fontSize=12,
-        spaceBefore=15,
-        spaceAfter=10,
-        textColor=colors.HexColor('#444444')
-    )
+    estilo_titulo = assets['titulo']
+    estilo_subtitulo = assets['subtitulo']
     estilo_normal = styles['Normal']
 
     # ---------------------------------------------------------
@@ -130,15 +228,7 @@ def generar_acta_cierre_pdf(caso, output_filename, usuario_cierre):
     ]
 
     t_general = Table(data_general, colWidths=[120, 300])
-    t_general.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f0f0f0')),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-    ]))
+    t_general.setStyle(assets['tabla_general'])
     elements.append(t_general)
     elements.append(Spacer(1, 15))
 
@@ -158,10 +248,7 @@ def generar_acta_cierre_pdf(caso, output_filename, usuario_cierre):
         ['Domicilio:', caso.paciente_domicilio or '-']
     ]
     t_paciente = Table(data_paciente, colWidths=[120, 300])
-    t_paciente.setStyle(TableStyle([
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-    ]))
+    t_paciente.setStyle(assets['tabla_ficha'])
     elements.append(t_paciente)
 
     # ---------------------------------------------------------
@@ -208,10 +295,7 @@ def generar_acta_cierre_pdf(caso, output_filename, usuario_cierre):
         data_gestion.append(['ESTADO:', f'FALLECIDO (Fecha: {fecha_def})'])
 
     t_gestion = Table(data_gestion, colWidths=[120, 300])
-    t_gestion.setStyle(TableStyle([
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-    ]))
+    t_gestion.setStyle(assets['tabla_ficha'])
     elements.append(t_gestion)
 
     # ---------------------------------------------------------
@@ -265,18 +349,7 @@ def generar_acta_cierre_pdf(caso, output_filename, usuario_cierre):
         )
 
         
-        t_hist.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#EFF6FF')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.HexColor('#275c80')),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.lightgrey),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ]))
+        t_hist.setStyle(assets['tabla_historial'])
         # Nota: NO usamos KeepTogether aquí porque si la tabla crece, igual debe paginar.
         elements.append(t_hist)
 
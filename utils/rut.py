@@ -0,0 +1,125 @@
+import re
+
+try:
+    # Opcional: acelera la validación por lotes (pip install numpy). Sin NumPy se usa el camino Python.
+    import numpy as np
+except ImportError:
+    np = None
+
+# Cuerpo de 7 u 8 dígitos + DV (0-9 o K), ya sin puntos ni guion
+RE_RUT_COMPACTO = re.compile(r"[0-9]{7,8}[0-9K]")
+_SIN_SEPARADORES = str.maketrans("", "", ".-")
+
+# Módulo 11: pesos 2,3,4,5,6,7,2,3 desde el dígito de la derecha
+PESOS = (2, 3, 4, 5, 6, 7, 2, 3)
+DIGITOS_VERIFICADORES = "0123456789K"   # índice = (-suma) % 11
+
+LARGO_MAXIMO = 10   # 12345678-9: lo que cabe en las columnas de documento
+
+# ---------------------------------------------------------
+# 1) UN RUT (formularios, búsqueda)
+# ---------------------------------------------------------
+
+def calcular_dv(cuerpo: str) -> str:
+    """Dígito verificador ('0'-'9' o 'K') de un cuerpo numérico ('12345678')."""
+    suma = 0
+    for digito, peso in zip(reversed(cuerpo), PESOS):
+        suma += (ord(digito) - 48) * peso
+    return DIGITOS_VERIFICADORES[-suma % 11]
+
+def es_rut_valido(rut: str) -> bool:
+    """
+    Valida un RUT chileno usando el algoritmo Módulo 11.
+    Acepta formatos: 12.345.678-9, 12345678-9, 123456789 (sin guion también).
+    """
+    if not rut:
+        return False
+    compacto = rut.translate(_SIN_SEPARADORES).upper().strip()
+    if not RE_RUT_COMPACTO.fullmatch(compacto):
+        return False
+    return calcular_dv(compacto[:-1]) == compacto[-1]
+
+def clean_rut(value):
+    """
+    Normaliza RUT para persistencia: sin puntos y con guion.
+    Retorna None si viene vacío.
+    Ej: 12.345.678-9 -> 12345678-9
+    """
+    if value is None:
+        return None
+    v = str(value).strip().replace(".", "").replace(" ", "").upper()
+    if not v:
+        return None
+    # Si viene con guion, lo respetamos; si no, el último caracter es el DV
+    if "-" in v:
+        cuerpo, dv = v.split("-", 1)
+    else:
+        cuerpo, dv = v[:-1], v[-1]
+    cuerpo = "".join(ch for ch in cuerpo if ch.isdigit())
+    dv = dv[:1]
+    return f"{cuerpo}-{dv}" if cuerpo and dv else None
+
+def rut_excede_largo(rut_normalizado):
+    """
+    Evita Data too long.
+    Persistimos como 12345678-9 => largo máx 10 (8 + 1 + 1).
+    """
+    return bool(rut_normalizado) and len(rut_normalizado) > LARGO_MAXIMO
+
+# ---------------------------------------------------------
+# 2) LOTES (ingreso masivo, auditorías de calidad, migraciones)
+# ---------------------------------------------------------
+
+if np is not None:
+    # Cuerpo rellenado a 8 dígitos por la izquierda (los ceros no suman): peso por columna
+    _PESOS_COLUMNAS = np.array(PESOS[::-1], dtype=np.int32)
+
+def _validar_numpy(valores):
+    """
+    Cada RUT se compacta a 9 caracteres ASCII (ceros a la izquierda) y el lote completo
+    se vuelve una matriz n x 9 de bytes: formato y Módulo 11 se resuelven en operaciones
+    sobre columnas (producto punto dígitos x pesos), sin bucle Python por dígito.
+    """
+    textos = [v if isinstance(v, str) else "" for v in valores]
+    # Limpieza del lote en una sola pasada (translate/upper sobre un único string)
+    compactos = "\0".join(textos).translate(_SIN_SEPARADORES).upper().split("\0")
+    if len(compactos) != len(textos):
+        # Algún valor traía el separador: limpieza uno a uno
+        compactos = [t.translate(_SIN_SEPARADORES).upper() for t in textos]
+
+    # Largo fuera de 8-9 => fila de relleno que nunca pasa el formato
+    fijos = "".join(
+        c.rjust(9, "0") if 7 < len(c) < 10 else "?????????"
+        for c in (c.strip() if c[:1].isspace() or c[-1:].isspace() else c for c in compactos)
+    )
+    matriz = np.frombuffer(fijos.encode("ascii", "replace"), dtype=np.uint8).reshape(-1, 9)
+
+    digitos = matriz[:, :8].astype(np.int32) - 48
+    dv = matriz[:, 8]
+    formato = ((digitos >= 0) & (digitos <= 9)).all(axis=1) & (((dv >= 48) & (dv <= 57)) | (dv == 75))
+
+    resto = -(digitos @ _PESOS_COLUMNAS) % 11
+    esperado = np.where(resto == 10, 75, resto + 48)
+    return (formato & (esperado == dv)).tolist()
+
+def validar_ruts(valores, usar_numpy=True):
+    """
+    Valida una columna completa de RUTs (cualquier formato aceptado por es_rut_valido).
+    Retorna una lista de bool en el mismo orden. Usa NumPy si está instalado.
+    """
+    valores = list(valores)
+    if not valores:
+        return []
+    if usar_numpy and np is not None:
+        return _validar_numpy(valores)
+    return [es_rut_valido(v) if isinstance(v, str) else False for v in valores]
+
+def normalizar_ruts(valores):
+    """
+    Normaliza y valida una columna de RUTs.
+    Retorna (normalizados, validos): listas paralelas con clean_rut(v) y su validez
+    (False también si el normalizado excede el largo de la columna).
+    """
+    normalizados = [clean_rut(v) for v in valores]
+    validos = validar_ruts([n or "" for n in normalizados])
+    return normalizados, [ok and not rut_excede_largo(n) for n, ok in zip(normalizados, validos)]
@@ -0,0 +1,126 @@
+from collections import namedtuple
+from datetime import date, timedelta
+from sqlalchemy import func, select, literal_column, cast, Date
+from models import db
+from utils.helpers import obtener_hora_chile
+
+# Ventanas del dashboard (días hacia atrás, contando hoy) y su granularidad por defecto
+VENTANAS = {7: 'dia', 30: 'dia', 90: 'semana', 365: 'mes'}
+VENTANA_DEFECTO = 7
+GRANULARIDADES = ('dia', 'semana', 'mes')
+
+NOMBRES_DIAS = ('Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom')
+NOMBRES_MESES = ('Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic')
+
+# Un punto de la serie: inicio del periodo (date) y total
+Punto = namedtuple('Punto', ['inicio', 'total'])
+
+# ---------------------------------------------------------
+# 1) PERIODOS (en Python, hora de Santiago)
+# ---------------------------------------------------------
+
+def inicio_periodo(dia, granularidad):
+    """Primer día del periodo que contiene 'dia' (la semana parte el lunes)."""
+    if granularidad == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    if granularidad == 'mes':
+        return dia.replace(day=1)
+    return dia
+
+def _siguiente(inicio, granularidad):
+    if granularidad == 'semana':
+        return inicio + timedelta(days=7)
+    if granularidad == 'mes':
+        return date(inicio.year + inicio.month // 12, inicio.month % 12 + 1, 1)
+    return inicio + timedelta(days=1)
+
+def periodos(dias, granularidad, hoy=None):
+    """
+    Inicios de todos los periodos de una ventana de 'dias' que termina hoy (hora de Santiago).
+    El primer periodo se alinea a su inicio (semana completa / mes completo).
+    """
+    hoy = hoy or obtener_hora_chile().date()
+    actual = inicio_periodo(hoy - timedelta(days=dias - 1), granularidad)
+    inicios = []
+    while actual <= hoy:
+        inicios.append(actual)
+        actual = _siguiente(actual, granularidad)
+    return inicios
+
+def normalizar_ventana(valor):
+    """Ventana pedida por querystring -> (dias, granularidad). Valores desconocidos = 7 días."""
+    try:
+        dias = int(valor)
+    except (TypeError, ValueError):
+        dias = VENTANA_DEFECTO
+    if dias not in VENTANAS:
+        dias = VENTANA_DEFECTO
+    return dias, VENTANAS[dias]
+
+def etiqueta(inicio, granularidad, dias=VENTANA_DEFECTO):
+    """Etiqueta corta para el eje X: 'Lun' (7 días), '05/03' (días/semanas) o 'Mar 2025' (meses)."""
+    if granularidad == 'mes':
+        return f"{NOMBRES_MESES[inicio.month - 1]} {inicio.year}"
+    if granularidad == 'dia' and dias <= 7:
+        return NOMBRES_DIAS[inicio.weekday()]
+    return inicio.strftime('%d/%m')
+
+# ---------------------------------------------------------
+# 2) AGRUPACIÓN EN LA BD (GROUP BY del periodo, sin traer filas)
+# ---------------------------------------------------------
+
+def _expresion_periodo(columna, granularidad, dialecto):
+    """
+    Inicio del periodo calculado por el motor. Los formatos van como literales (no como
+    parámetros) para que el SELECT y el GROUP BY sean la misma expresión (ONLY_FULL_GROUP_BY).
+    Las fechas se guardan en hora local de Santiago (obtener_hora_chile), así que DATE()
+    ya es el día chileno: no hace falta CONVERT_TZ (ni las tablas de zonas de MySQL).
+    """
+    if granularidad == 'dia':
+        return func.date(columna)
+
+    if dialecto == 'mysql':
+        if granularidad == 'semana':
+            return func.subdate(func.date(columna), func.weekday(columna))
+        return func.date_format(columna, literal_column("'%Y-%m-01'"))
+
+    if dialecto == 'sqlite':
+        if granularidad == 'semana':
+            # Retrocede 6 días y avanza al lunes: el mismo lunes si ya lo era
+            return func.date(columna, '-6 days', 'weekday 1')
+        return func.date(columna, 'start of month')
+
+    # PostgreSQL y otros con date_trunc
+    unidad = "'week'" if granularidad == 'semana' else "'month'"
+    return cast(func.date_trunc(literal_column(unidad), columna), Date)
+
+def _a_fecha(valor):
+    """El motor devuelve date, datetime o 'AAAA-MM-DD' según dialecto/función."""
+    if isinstance(valor, str):
+        return date.fromisoformat(valor[:10])
+    return valor.date() if hasattr(valor, 'date') else valor
+
+def serie_temporal(columna_fecha, filtros=(), dias=VENTANA_DEFECTO, granularidad='dia', valor=None, hoy=None):
+    """
+    Totales por periodo de una columna de fecha, agrupados en la BD y completados con 0.
+    - columna_fecha: ej. Caso.fecha_ingreso o ResumenDashboard.dia
+    - filtros: condiciones extra (alcance, estado...)
+    - valor: agregado a sumar (por defecto COUNT(*); en la tabla resumen, SUM(total))
+    Retorna [Punto(inicio, total)] en orden cronológico, uno por periodo de la ventana.
+    """
+    if granularidad not in GRANULARIDADES:
+        raise ValueError(f"Granularidad desconocida: {granularidad}")
+
+    inicios = periodos(dias, granularidad, hoy)
+    dialecto = db.session.get_bind().dialect.name
+    periodo = _expresion_periodo(columna_fecha, granularidad, dialecto).label('periodo')
+    agregado = valor if valor is not None else func.count()
+
+    filas = db.session.execute(
+        select(periodo, agregado)
+        .where(columna_fecha >= inicios[0], *filtros)
+        .group_by(periodo)
+    ).all()
+
+    totales = {_a_fecha(p): int(n or 0) for p, n in filas if p is not None}
+    return [Punto(inicio, totales.get(inicio, 0)) for inicio in inicios]
@@ -0,0 +1,178 @@
+import time
+from flask import g
+from flask_login import UserMixin
+from sqlalchemy import select, update, insert
+from extensions import cache
+from models import db, Usuario, Rol, CatalogoCiclo, usuario_ciclos, VersionCache, obtener_hora_chile
+
+TTL_SESION = 300            # Segundos de vida de una foto de usuario (respaldo entre procesos)
+CLAVE_VERSION = 'sesiones'  # Contador global: sube con cada invalidación
+PREFIJO_USUARIO = 'sesion:'  # Una fila por usuario invalidado ('sesion:12'), con el contador de ese momento
+INTERVALO_VERIFICACION = 5  # Segundos entre consultas al sello (lo que tarda otro worker en ver un cambio de rol)
+
+_estado = {'version': 0, 'verificado': float('-inf')}
+_invalidados = {}           # usuario_id -> contador de su última invalidación conocida por este proceso
+
+# ---------------------------------------------------------
+# 1) FOTO COMPACTA DEL USUARIO
+# ---------------------------------------------------------
+
+def _leer_datos(usuario_id):
+    """Usuario + rol en un SELECT y ciclos (propios y del titular subrogado) en otro."""
+    fila = db.session.execute(
+        select(Usuario.id, Usuario.nombre_completo, Usuario.email, Usuario.activo,
+               Usuario.cambio_clave_requerido, Usuario.subrogante_de_usuario_id, Rol.nombre)
+        .outerjoin(Rol, Rol.id == Usuario.rol_id)
+        .where(Usuario.id == usuario_id)
+    ).first()
+    if fila is None:
+        return None
+
+    titular_id = fila.subrogante_de_usuario_id
+    duenos = [fila.id] + ([titular_id] if titular_id else [])
+    ciclos = db.session.execute(
+        select(usuario_ciclos.c.usuario_id, CatalogoCiclo.id, CatalogoCiclo.nombre)
+        .join(CatalogoCiclo, CatalogoCiclo.id == usuario_ciclos.c.ciclo_id)
+        .where(usuario_ciclos.c.usuario_id.in_(duenos))
+        .order_by(CatalogoCiclo.id)
+    ).all()
+
+    return {
+        'id': fila.id,
+        'nombre_completo': fila.nombre_completo,
+        'email': fila.email,
+        'activo': bool(fila.activo),
+        'cambio_clave_requerido': bool(fila.cambio_clave_requerido),
+        'rol': fila.nombre,
+        'titular_id': titular_id,
+        'ciclos_propios': [[c_id, nombre] for dueno, c_id, nombre in ciclos if dueno == fila.id],
+        'ciclos_subrogados': [[c_id, nombre] for dueno, c_id, nombre in ciclos if dueno == titular_id],
+    }
+
+class RolSesion:
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+class UsuarioSesion(UserMixin):
+    """
+    current_user sin ir a la BD: id, nombre, email, rol y ciclos vienen del caché.
+    Cualquier otro atributo (relaciones, set_password...) se delega al Usuario ORM,
+    que se carga una sola vez por petición y solo si se necesita (ver .usuario).
+    """
+
+    def __init__(self, datos):
+        self._datos = datos
+        self.id = datos['id']
+        self.nombre_completo = datos['nombre_completo']
+        self.email = datos['email']
+        self.activo = datos['activo']
+        self.cambio_clave_requerido = datos['cambio_clave_requerido']
+        self.rol = RolSesion(datos['rol']) if datos['rol'] else None
+        self.ciclos_propios = [tuple(c) for c in datos['ciclos_propios']]
+        self.ciclos_subrogados = [tuple(c) for c in datos['ciclos_subrogados']]
+        self.ciclo_ids = frozenset(c_id for c_id, _ in self.ciclos_propios + self.ciclos_subrogados)
+
+    @property
+    def usuario(self):
+        """Usuario ORM de esta petición (para escribir o navegar relaciones)."""
+        cargados = g.setdefault('usuarios_orm', {})
+        if self.id not in cargados:
+            cargados[self.id] = db.session.get(Usuario, self.id)
+        return cargados[self.id]
+
+    def __getattr__(self, nombre):
+        # Solo se llama si el atributo no está en la foto
+        if nombre.startswith('_'):
+            raise AttributeError(nombre)
+        return getattr(self.usuario, nombre)
+
+# ---------------------------------------------------------
+# 2) CARGA E INVALIDACIÓN
+# ---------------------------------------------------------
+
+def _sincronizar():
+    """
+    Cada INTERVALO_VERIFICACION s lee el contador global; si subió, trae solo las filas
+    'sesion:<id>' más nuevas que lo ya visto. Una invalidación afecta a su usuario, no a todos.
+    """
+    ahora = time.monotonic()
+    if ahora - _estado['verificado'] < INTERVALO_VERIFICACION:
+        return
+    version = db.session.execute(
+        select(VersionCache.version).where(VersionCache.clave == CLAVE_VERSION)
+    ).scalar() or 0
+    if version > _estado['version']:
+        filas = db.session.execute(
+            select(VersionCache.clave, VersionCache.version)
+            .where(VersionCache.clave.like(f'{PREFIJO_USUARIO}%'), VersionCache.version > _estado['version'])
+        ).all()
+        for clave, version_usuario in filas:
+            usuario_id = int(clave[len(PREFIJO_USUARIO):])
+            _invalidados[usuario_id] = max(_invalidados.get(usuario_id, 0), version_usuario)
+        _estado['version'] = version
+    _estado['verificado'] = ahora
+
+def datos_sesion(usuario_id):
+    """
+    Foto del usuario (dict serializable) desde extensions.cache o la BD. None si no existe.
+    La foto guarda el sello de su usuario con que se leyó: si otro proceso invalidó a ese usuario
+    (cambio de rol, estado, ciclos...), se vuelve a leer aunque el caché local no se haya enterado.
+    """
+    usuario_id = int(usuario_id)
+    _sincronizar()
+    sello = _invalidados.get(usuario_id, 0)
+    datos = cache.obtener('sesion', usuario_id)
+    if datos is None or datos.get('version', -1) < sello:
+        datos = _leer_datos(usuario_id)
+        if datos is not None:
+            datos['version'] = sello
+            cache.guardar('sesion', usuario_id, datos, TTL_SESION)
+    return datos
+
+def cargar_usuario_sesion(usuario_id):
+    """user_loader de Flask-Login: 0 consultas si la foto está en caché."""
+    try:
+        datos = datos_sesion(int(usuario_id))
+    except (TypeError, ValueError):
+        return None
+    return UsuarioSesion(datos) if datos else None
+
+def invalidar_sesion_usuario(*usuario_ids):
+    """
+    Descarta la foto de estos usuarios y de quienes los subrogan (guardan los ciclos del titular).
+    Llamar después del commit que cambió rol, estado, clave, ciclos o subrogancia.
+    Sube el sello de cada uno para que los demás workers también las descarten.
+    """
+    ids = {int(i) for i in usuario_ids if i}
+    if not ids:
+        return
+    subrogantes = db.session.execute(
+        select(Usuario.id).where(Usuario.subrogante_de_usuario_id.in_(ids))
+    ).scalars().all()
+    ids |= set(subrogantes)
+    cache.borrar('sesion', *ids)
+    _subir_version(ids)
+
+def _subir_version(ids):
+    # Conexión propia (como utils/bitacora.py): no confirma ni descarta nada pendiente de la petición
+    ahora = obtener_hora_chile()
+    with db.engine.begin() as conn:
+        actualizadas = conn.execute(
+            update(VersionCache).where(VersionCache.clave == CLAVE_VERSION)
+            .values(version=VersionCache.version + 1, fecha_actualizacion=ahora)
+        ).rowcount
+        if not actualizadas:
+            conn.execute(insert(VersionCache).values(clave=CLAVE_VERSION, version=1, fecha_actualizacion=ahora))
+        version = conn.execute(
+            select(VersionCache.version).where(VersionCache.clave == CLAVE_VERSION)
+        ).scalar()
+        for usuario_id in ids:
+            clave = f'{PREFIJO_USUARIO}{usuario_id}'
+            actualizadas = conn.execute(
+                update(VersionCache).where(VersionCache.clave == clave)
+                .values(version=version, fecha_actualizacion=ahora)
+            ).rowcount
+            if not actualizadas:
+                conn.execute(insert(VersionCache).values(clave=clave, version=version, fecha_actualizacion=ahora))
+    for usuario_id in ids:      # Este proceso lo ve sin esperar la próxima sincronización
+        _invalidados[usuario_id] = version
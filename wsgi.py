@@ -0,0 +1,54 @@
+# wsgi.py
+# Punto de entrada de producción.
+#   Linux:   gunicorn -c gunicorn.conf.py wsgi:app   (o simplemente: python wsgi.py)
+#   Windows: python wsgi.py                          (waitress, solo hilos)
+import os
+import sys
+from app import create_app
+from models import db
+
+app = create_app()
+
+def precargar(app):
+    """
+    Deja listo en el proceso maestro lo que todos los workers comparten tras el fork:
+    catálogos en memoria y plantillas principales compiladas. Luego suelta las conexiones
+    (un socket de MySQL no puede compartirse entre procesos).
+    """
+    from utils.catalogos import obtener_catalogos
+
+    with app.app_context():
+        try:
+            obtener_catalogos()
+        except Exception as e:
+            # Sin BD al arrancar: cada worker los cargará con su primera petición
+            print(f"⚠️ No se pudieron precargar los catálogos: {e}")
+        for plantilla in ('base.html', 'auth/login.html', 'casos/index.html', 'casos/ver.html', 'solicitudes/formulario.html'):
+            app.jinja_env.get_template(plantilla)
+        db.engine.dispose()
+
+precargar(app)
+
+if __name__ == '__main__':
+    if sys.platform == 'win32':
+        from waitress import serve
+        hilos = int(os.getenv('WEB_THREADS', '4'))
+        host, _, puerto = os.getenv('WEB_BIND', '127.0.0.1:8000').rpartition(':')
+        print(f"✅ RedProtege (waitress) en http://{host}:{puerto} con {hilos} hilos")
+        serve(app, host=host, port=int(puerto), threads=hilos)
+    else:
+        from gunicorn.app.base import Application
+
+        class ServidorGunicorn(Application):
+            """
+            gunicorn con la app ya creada y precargada en este proceso (aquí el módulo es __main__:
+            pasarle 'wsgi:app' lo importaría de nuevo y repetiría create_app() y precargar()).
+            """
+
+            def load_config(self):
+                self.load_config_from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py'))
+
+            def load(self):
+                return app
+
+        ServidorGunicorn().run()